@@ -0,0 +1,80 @@
+import base64
+import io
+import os
+from functools import lru_cache
+
+from PIL import Image
+
+
+# ======================== UI 이미지 ========================
+# local: 컨테이너에 포함된 image/ 파일을 축소해 data URI로 인라인 (외부 요청 없음)
+# remote: 예전처럼 GitHub raw URL 사용
+ASSET_MODE = os.getenv("ASSET_MODE", "local").lower()
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image")
+REMOTE_BASE_URL = "https://github.com/jssoleey/goodrich-chatbot-complaint/blob/main/image"
+
+# 이름 -> (파일명, 최대 크기 px). 화면 표시 크기의 약 2배(고해상도 화면)로 축소
+ASSETS = {
+    "page_icon": ("logo.png", 64),
+    "top_image": ("top_box.png", 2000),
+    "bottom_image": ("bottom_box.png", 2000),
+    "logo": ("logo.png", 100),
+    "user_avatar": ("user_avatar.png", 100),
+    "ai_avatar": ("ai_avatar.png", 100),
+}
+
+
+def remote_url(name):
+    return f"{REMOTE_BASE_URL}/{ASSETS[name][0]}?raw=true"
+
+
+@lru_cache(maxsize=None)
+def load_thumbnail(filename, max_size):
+    image = Image.open(os.path.join(ASSET_DIR, filename))
+    image.load()
+    image.thumbnail((max_size, max_size))
+    return image
+
+
+@lru_cache(maxsize=None)
+def data_uri(filename, max_size):
+    # 한 번만 변환해서 프로세스가 살아 있는 동안 재사용
+    buffer = io.BytesIO()
+    load_thumbnail(filename, max_size).save(buffer, "WEBP", quality=85, method=6)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def asset_url(name):
+    if ASSET_MODE != "remote":
+        try:
+            return data_uri(*ASSETS[name])
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 로컬 이미지를 불러오지 못해 원격 URL을 사용합니다 ({name}):", e)
+    return remote_url(name)
+
+
+def page_icon():
+    # st.set_page_config는 PIL 이미지도 받으므로 로컬 파일을 그대로 사용
+    if ASSET_MODE != "remote":
+        try:
+            return load_thumbnail(*ASSETS["page_icon"])
+        except OSError as e:
+            print("⚠️ 로컬 아이콘을 불러오지 못해 원격 URL을 사용합니다:", e)
+    return remote_url("page_icon")
+
+
+# ======================== 아바타 ========================
+# 아바타는 메시지마다 반복되므로 이미지는 CSS에 한 번만 넣고, 메시지에는 클래스만 사용
+AVATAR_CLASSES = {"user_avatar": "avatar-user", "ai_avatar": "avatar-ai"}
+
+
+def avatar_css():
+    rules = [
+        f'.{css_class} {{ background-image: url("{asset_url(name)}"); }}'
+        for name, css_class in AVATAR_CLASSES.items()
+    ]
+    return "\n".join(rules)
+
+
+def avatar_html(name):
+    return f'<div class="avatar {AVATAR_CLASSES[name]}"></div>'
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+import llm_comp
+from concurrency import TokenBucket
+from metrics import STREAM_METRICS, call_summary
+from scenario_schema import coerce_text, validate_scenario
+
+# ======================== 입력 ========================
+CONSULTANT_KEYS = ("consultant", "consultant_name", "상담원", "상담원 이름")
+ID_KEYS = ("id", "case_id", "민원 번호")
+
+
+def read_rows(path, input_format=None):
+    # JSONL(한 줄에 민원 하나) 또는 CSV(첫 줄 헤더). 엑셀에서 저장한 CSV의 BOM도 처리
+    input_format = input_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if input_format == "csv":
+            yield from csv.DictReader(f)
+            return
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ {line_no}번째 줄을 읽지 못해 건너뜁니다:", e)
+
+
+def first_value(row, keys):
+    for key in keys:
+        value = coerce_text(row.get(key))
+        if value:
+            return value
+    return ""
+
+
+def normalize_row(index, row, default_consultant):
+    # (민원 id, 보정한 입력 또는 None). 이름/민원 내용이 없으면 None
+    case_id = first_value(row, ID_KEYS) or f"row-{index}"
+    scenario, _ = validate_scenario(row)
+    if scenario is None:
+        return case_id, None
+    scenario["consultant"] = first_value(row, CONSULTANT_KEYS) or default_consultant
+    return case_id, scenario
+
+
+# ======================== 체크포인트 ========================
+# 처리한 민원 id를 한 줄씩 덧붙이는 파일. 재실행 시 성공(ok/invalid)한 id는 건너뛰고 실패한 건은 다시 시도
+# 결과 파일과 체크포인트 사이에서 중단되면 같은 id가 결과에 두 번 남을 수 있으므로, 결과는 id별 마지막 줄을 사용
+DONE_STATUS = {"ok", "invalid"}
+
+
+def load_checkpoint(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue   # 중단 시 잘린 마지막 줄
+            if entry.get("status") in DONE_STATUS:
+                done.add(entry["id"])
+    return done
+
+
+class BatchWriter:
+    # 결과는 끝난 순서대로 바로 기록 (중간에 멈춰도 이미 끝난 결과는 남음)
+    def __init__(self, output_path, checkpoint_path, append):
+        mode = "a" if append else "w"
+        self.output = open(output_path, mode, encoding="utf-8")
+        self.checkpoint = open(checkpoint_path, mode, encoding="utf-8")
+        self.counts = {}
+
+    def write(self, record):
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.checkpoint.write(json.dumps({"id": record["id"], "status": record["status"]}, ensure_ascii=False) + "\n")
+        self.checkpoint.flush()
+        self.counts[record["status"]] = self.counts.get(record["status"], 0) + 1
+
+    def close(self):
+        self.output.close()
+        self.checkpoint.close()
+
+
+# ======================== 실행 ========================
+async def generate_one(case_id, scenario, args):
+    # UI와 같은 프롬프트/캐시/제한기를 그대로 사용. 세션은 민원마다 따로 두고 끝나면 정리
+    session_id = f"batch-{case_id}"
+    started_at = time.perf_counter()
+    try:
+        parts = [chunk async for chunk in llm_comp.aget_script_response(
+            scenario["name"], scenario["situation"], scenario["emotion"],
+            regenerate=args.no_cache,
+            session_id=session_id,
+            consultant_name=scenario["consultant"],
+            extra_info=scenario["extra_info"],
+        )]
+    finally:
+        del llm_comp.store[session_id]
+    script = "".join(parts)
+    return {
+        "id": case_id,
+        **scenario,
+        "status": llm_comp.response_status(script),
+        "script": script,
+        "latency": round(time.perf_counter() - started_at, 3),
+    }
+
+
+async def run_batch(cases, args, writer):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    bucket = TokenBucket(args.rate, args.burst) if args.rate > 0 else None
+    total = len(cases)
+    finished = 0
+
+    async def worker(case_id, scenario):
+        nonlocal finished
+        async with semaphore:
+            if bucket is not None:
+                await bucket.aacquire()
+            try:
+                record = await generate_one(case_id, scenario, args)
+            except Exception as e:
+                print(f"🔥 [{case_id}] 예외:", e)
+                record = {"id": case_id, **scenario, "status": "error", "script": "", "error": repr(e)}
+        writer.write(record)
+        finished += 1
+        if finished % args.progress_every == 0 or finished == total:
+            print(f"📦 {finished}/{total}건 완료 (최근: {case_id} {record['status']})")
+
+    await asyncio.gather(*(worker(case_id, scenario) for case_id, scenario in cases))
+
+
+# ======================== 리포트 ========================
+def print_report(args, elapsed, started_ts, writer, skipped):
+    processed = sum(writer.counts.values())
+    print(f"\n📊 배치 결과 ({args.input} → {args.output})")
+    print(f"- 처리 {processed}건 / 이전 실행에서 완료되어 건너뜀 {skipped}건")
+    print(f"- 상태별: {writer.counts}")
+    print(f"- 소요 {elapsed:.1f}s / 처리량 {processed / elapsed if elapsed else 0:.2f}건/s "
+          f"(동시 {args.concurrency}, 속도 제한 {args.rate or '-'}건/s)")
+
+    cached = sum(1 for m in list(STREAM_METRICS) if m["call_type"] == "script_cached" and m["timestamp"] >= started_ts)
+    totals = {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+    for item in call_summary(since=started_ts):
+        if item["call_type"] != "script":
+            continue
+        for key in totals:
+            totals[key] += item[key]
+    print(f"- LLM 호출 {totals['calls']}회 (스크립트 캐시 적중 {cached}건)")
+    print(f"- 토큰: 입력 {totals['input_tokens']} (캐시 {totals['cached_tokens']}) / 출력 {totals['output_tokens']}")
+    print(f"- 예상 비용: ${totals['cost_usd']:.4f}")
+
+
+# 사용법: python batch_cli.py complaints.jsonl -o scripts.jsonl --concurrency 4 --rate 2
+#        python batch_cli.py complaints.csv -o scripts.jsonl   (중단 후 같은 명령으로 이어서 실행)
+def main():
+    parser = argparse.ArgumentParser(description="민원 목록(JSONL/CSV)으로 응대 스크립트를 일괄 생성")
+    parser.add_argument("input", help="name, situation, emotion, extra_info, consultant 필드를 가진 JSONL 또는 CSV")
+    parser.add_argument("-o", "--output", required=True, help="결과 JSONL (민원당 한 줄)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="입력 형식 (기본: 확장자로 판단)")
+    parser.add_argument("--checkpoint", help="체크포인트 파일 (기본: <output>.ckpt)")
+    parser.add_argument("--restart", action="store_true", help="체크포인트를 무시하고 처음부터 다시 실행")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 생성할 민원 수")
+    parser.add_argument("--rate", type=float, default=0.0, help="초당 최대 요청 수 (0이면 제한 없음)")
+    parser.add_argument("--burst", type=int, default=1, help="속도 제한에서 한 번에 몰아서 보낼 수 있는 요청 수")
+    parser.add_argument("--consultant", default="상담원", help="consultant 필드가 없을 때 사용할 상담원 이름")
+    parser.add_argument("--no-cache", action="store_true", help="스크립트 캐시를 쓰지 않고 새로 생성")
+    parser.add_argument("--progress-every", type=int, default=10, help="진행 상황 출력 간격(건)")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f"{args.output}.ckpt"
+    resume = not args.restart and os.path.exists(checkpoint_path)
+    done = load_checkpoint(checkpoint_path) if resume else set()
+
+    cases, invalid, seen = [], [], set()
+    for index, row in enumerate(read_rows(args.input, args.format), 1):
+        case_id, scenario = normalize_row(index, row, args.consultant)
+        if case_id in seen:
+            print(f"⚠️ 중복 id는 건너뜁니다: {case_id}")
+            continue
+        seen.add(case_id)
+        if case_id in done:
+            continue
+        if scenario is None:
+            invalid.append(case_id)
+        else:
+            cases.append((case_id, scenario))
+    skipped = len(seen & done)
+    print(f"📥 입력 {len(seen)}건 / 생성 대상 {len(cases)}건 / 형식 오류 {len(invalid)}건"
+          + (f" / 이어서 실행 (완료 {skipped}건 건너뜀)" if resume else ""))
+
+    writer = BatchWriter(args.output, checkpoint_path, append=resume)
+    for case_id in invalid:
+        writer.write({"id": case_id, "status": "invalid", "script": "", "error": "name/situation 누락"})
+
+    started_ts = time.time()
+    started_at = time.perf_counter()
+    try:
+        asyncio.run(run_batch(cases, args, writer))
+    except KeyboardInterrupt:
+        print("\n⏸️ 중단됨. 같은 명령으로 다시 실행하면 남은 민원부터 이어서 처리합니다.")
+        sys.exit(130)
+    finally:
+        writer.close()
+        print_report(args, time.perf_counter() - started_at, started_ts, writer, skipped)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import re
+import time
+
+from markdown_format import format_markdown, format_markdown_cached, render_message_parts
+
+
+# ======================== 이전 구현 (비교 기준) ========================
+def legacy_format_markdown(text: str) -> str:
+    lines = text.strip().splitlines()
+    formatted_lines = []
+    indent_next = False
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            formatted_lines.append("")
+            indent_next = False
+            continue
+
+        if re.match(r"^(▶️|✅|📌|❗|📝|📍)\s*[^:：]+[:：]?", line):
+            title = re.sub(r"[:：]\s*$", "", line.strip())
+            formatted_lines.append(f"**{title}**\n")
+            indent_next = False
+            continue
+
+        if re.match(r"^[-•]\s*\*\*.*\*\*", line):
+            formatted_lines.append(re.sub(r"^[-•]\s*", "- ", line))
+            indent_next = True
+            continue
+
+        if re.match(r"^[-•]\s*", line):
+            if indent_next:
+                formatted_lines.append("    " + re.sub(r"^[-•]\s*", "- ", line))
+            else:
+                formatted_lines.append(re.sub(r"^[-•]\s*", "- ", line))
+            continue
+
+        formatted_lines.append(line)
+        indent_next = False
+
+    return "\n".join(formatted_lines).strip() + "\n"
+
+
+def legacy_display_message(sink, role, content, avatar_html):
+    if role == "user":
+        sink(f"""
+        <div class="message-container user">
+            <div class="user-message">{content}</div>
+            {avatar_html}
+        </div>
+        """)
+    else:
+        sink(f"""
+        <div class="message-container ai">
+            {avatar_html}
+            <div class="ai-message">
+        """)
+        sink(legacy_format_markdown(content))
+        sink("</div></div>")
+
+
+def cached_display_message(sink, role, content, avatar_html):
+    display_html, body_markdown, closing_html = render_message_parts(role, content, avatar_html)
+    sink(display_html)
+    if body_markdown is not None:
+        sink(body_markdown)
+        sink(closing_html)
+
+
+# ======================== 테스트 데이터 ========================
+def make_script(sections=12):
+    # 실제 응대 스크립트와 비슷한 형태 (제목 + 굵은 항목 + 하위 항목 + 본문)
+    parts = []
+    for i in range(sections):
+        parts.append(f"▶️ {i + 1}단계 응대 포인트:")
+        parts.append(f"- **핵심 멘트 {i}**: 고객님, 불편을 드려 정말 죄송합니다.")
+        parts.append("• 약관 제3조에 따라 전자서명은 본인 인증 후에만 진행됩니다.")
+        parts.append("- 처리 절차와 소요 기간을 안내해 드리겠습니다.")
+        parts.append("고객님의 말씀을 충분히 이해하며, 빠르게 확인해 드리겠습니다.")
+        parts.append("")
+    return "\n".join(parts)
+
+
+def make_session(messages=200):
+    session = [{"role": "ai", "content": make_script(20)}]
+    for i in range(messages - 1):
+        if i % 2 == 0:
+            session.append({"role": "user", "content": f"고객이 {i}번째로 이렇게 말하는데 어떻게 답할까요?"})
+        else:
+            session.append({"role": "ai", "content": make_script(3)})
+    return session
+
+
+def timeit(fn, repeat):
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started_at) / repeat
+
+
+# ======================== 벤치마크 ========================
+# 사용법: python bench_render.py --sections 40 --messages 200 --reruns 20
+def main():
+    parser = argparse.ArgumentParser(description="format_markdown / 메시지 렌더링 벤치마크")
+    parser.add_argument("--sections", type=int, default=40, help="긴 스크립트의 단계 수")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=200, help="세션당 메시지 수")
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    script = make_script(args.sections)
+    assert legacy_format_markdown(script) == format_markdown(script)
+
+    legacy = timeit(lambda: legacy_format_markdown(script), args.repeat)
+    compiled = timeit(lambda: format_markdown(script), args.repeat)
+    format_markdown_cached(script)
+    cached = timeit(lambda: format_markdown_cached(script), args.repeat)
+
+    print(f"\n📊 format_markdown ({len(script.splitlines())}줄, {len(script)}자)")
+    print(f"- 이전 구현 (re.match 매번 컴파일 조회): {legacy * 1000:.3f} ms")
+    print(f"- 사전 컴파일 패턴: {compiled * 1000:.3f} ms")
+    print(f"- 캐시 적중: {cached * 1000:.4f} ms")
+
+    # Streamlit 출력 비용은 같으므로 출력은 버리고 Python 쪽 rerun 비용만 비교
+    session = make_session(args.messages)
+    avatar = '<div class="avatar avatar-ai"></div>'
+    sink = lambda _: None
+
+    def rerun(display):
+        for message in session:
+            display(sink, message["role"], message["content"], avatar)
+
+    before = timeit(lambda: rerun(legacy_display_message), args.reruns)
+    rerun(cached_display_message)   # 첫 rerun에서 캐시 채움
+    after = timeit(lambda: rerun(cached_display_message), args.reruns)
+
+    print(f"\n📊 {args.messages}개 메시지 세션 rerun 1회")
+    print(f"- 변경 전: {before * 1000:.2f} ms")
+    print(f"- 변경 후 (캐시 적중): {after * 1000:.2f} ms ({before / after:.1f}배)")
+
+
+if __name__ == "__main__":
+    main()
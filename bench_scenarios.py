@@ -0,0 +1,100 @@
+import argparse
+import time
+
+import llm_comp
+from metrics import USAGE_METRICS, estimate_cost
+from model_router import route_for
+
+
+# ======================== 랜덤 시나리오 생성 벤치마크 ========================
+# 1건씩 생성(기존 방식)과 N건 묶음 생성(JSON)의 처리량/시나리오당 토큰을 비교
+# 사용법: python bench_scenarios.py --scenarios 20 --batch-size 5
+def usage_since(index, call_type, prices=None):
+    # 비용은 라우팅된 모델(model_router) 가격으로 계산. prices=(입력, 출력)을 주면 그 가격(1M 토큰당 $) 사용
+    entries = [e for e in list(USAGE_METRICS)[index:] if e["call_type"] == call_type]
+    model = route_for(call_type)["model"]
+    if prices is None:
+        cost = sum(estimate_cost(model, e) for e in entries)
+    else:
+        cost = sum(e["input_tokens"] * prices[0] + e["output_tokens"] * prices[1] for e in entries) / 1_000_000
+    return {
+        "model": model,
+        "calls": len(entries),
+        "input_tokens": sum(e["input_tokens"] for e in entries),
+        "output_tokens": sum(e["output_tokens"] for e in entries),
+        "cost_usd": cost,
+    }
+
+
+def run_single(total):
+    scenarios = []
+    for _ in range(total):
+        info = llm_comp.generate_random_customer_info()
+        if info:
+            scenarios.append(info)
+    return scenarios
+
+
+def run_batched(total, batch_size):
+    scenarios = []
+    calls = 0
+    # 폐기된 항목 때문에 모자라면 조금 더 호출하되, 무한 반복은 막음
+    while len(scenarios) < total and calls < (total // batch_size + 1) * 2:
+        scenarios.extend(llm_comp.generate_random_customer_batch(min(batch_size, total - len(scenarios))))
+        calls += 1
+    return scenarios
+
+
+def measure(label, call_type, fn, prices=None):
+    start_index = len(USAGE_METRICS)
+    started_at = time.perf_counter()
+    scenarios = fn()
+    elapsed = time.perf_counter() - started_at
+    usage = usage_since(start_index, call_type, prices)
+    count = max(len(scenarios), 1)
+    return {
+        "label": label,
+        "model": usage["model"],
+        "scenarios": len(scenarios),
+        "elapsed": elapsed,
+        "per_second": len(scenarios) / elapsed if elapsed > 0 else 0.0,
+        "calls": usage["calls"],
+        "input_per_scenario": usage["input_tokens"] / count,
+        "output_per_scenario": usage["output_tokens"] / count,
+        "cost_per_scenario": usage["cost_usd"] / count,
+    }
+
+
+def print_report(results):
+    print(f"\n📊 랜덤 시나리오 생성 비교 (모델: {results[0]['model']})")
+    print(f"{'방식':<14}{'건수':>6}{'호출':>6}{'소요(s)':>10}{'건/초':>8}{'입력/건':>10}{'출력/건':>10}{'비용/건($)':>12}")
+    for r in results:
+        print(
+            f"{r['label']:<14}{r['scenarios']:>6}{r['calls']:>6}{r['elapsed']:>10.2f}{r['per_second']:>8.2f}"
+            f"{r['input_per_scenario']:>10.1f}{r['output_per_scenario']:>10.1f}{r['cost_per_scenario']:>12.6f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="랜덤 시나리오 1건씩 생성 vs 묶음 생성 비교")
+    parser.add_argument("--scenarios", type=int, default=20, help="방식별로 생성할 시나리오 수")
+    parser.add_argument("--batch-size", type=int, default=llm_comp.SCENARIO_BATCH_SIZE)
+    parser.add_argument("--input-price", type=float, help="입력 토큰 1M당 가격($). 생략 시 라우팅된 모델 가격")
+    parser.add_argument("--output-price", type=float, help="출력 토큰 1M당 가격($). 생략 시 라우팅된 모델 가격")
+    args = parser.parse_args()
+    prices = None
+    if args.input_price is not None or args.output_price is not None:
+        if args.input_price is None or args.output_price is None:
+            parser.error("--input-price와 --output-price는 함께 지정해야 합니다.")
+        prices = (args.input_price, args.output_price)
+
+    results = [
+        measure("1건씩", "random_scenario", lambda: run_single(args.scenarios), prices),
+        measure(f"{args.batch_size}건 묶음", "random_scenario_batch",
+                lambda: run_batched(args.scenarios, args.batch_size), prices),
+    ]
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
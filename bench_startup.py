@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+# ======================== 설정 ========================
+# 콜드 스타트 비용 측정: 모듈 가져오기 시간(-X importtime)과 첫 요청/두 번째 요청의 준비 시간
+# 매번 새 프로세스에서 측정하므로 이미 가져온 모듈의 영향 없이 컨테이너 첫 시작과 같은 조건
+# llm_comp 가져오기에서 미루는 것: langchain_openai/openai SDK, 체인용 langchain_core(prompts, output_parsers,
+# runnables.history) → 체인을 처음 구성할 때(워밍업 또는 첫 요청) 비용으로 잡힘
+# 그대로 가져오는 것: metrics/history_store가 쓰는 langchain_core(callbacks, chat_history, messages)와 dotenv
+SAMPLE_SCENARIO = ("김민지", "어린이보험 입원비 청구 후 2주째 지급이 지연되고 있습니다.", 4)
+
+
+def bench_env(backend):
+    # 캐시/풀/기록 파일은 임시 폴더에 두고, 지표 로그는 끔 (측정값에 섞이지 않도록)
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKEND": backend,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "bench-startup",
+        "SCRIPT_CACHE_DIR": os.path.join(workdir, "scripts"),
+        "SEMANTIC_CACHE_PATH": os.path.join(workdir, "semantic"),
+        "SCENARIO_POOL_PATH": os.path.join(workdir, "scenario_pool.sqlite"),
+        "GENERATION_JOBS_PATH": os.path.join(workdir, "generation_jobs.sqlite"),
+        "HISTORY_BACKEND": "memory",
+        "LLM_METRICS_LOG": "off",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    env.pop("METRICS_PORT", None)
+    env.pop("LLM_SERVICE_URL", None)
+    return env
+
+
+# ======================== 가져오기 시간 ========================
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package" 줄을 (self, cumulative, 이름, 깊이)로 변환
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), name.strip(), depth))
+    return rows
+
+
+def measure_import(module, env):
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    wall = time.perf_counter() - started_at
+    if result.returncode != 0:
+        raise RuntimeError(f"{module} 가져오기 실패:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    total = next((cumulative for _, cumulative, name, _ in reversed(rows) if name == module), 0)
+    # 최상위 패키지별 self 시간 합계 (어떤 의존성이 무거운지)
+    packages = defaultdict(int)
+    for self_us, _, name, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    return {"module": module, "import_s": total / 1e6, "process_s": wall,
+            "modules": len(rows), "packages": dict(packages)}
+
+
+# ======================== 첫 요청 지연 ========================
+def child_main(args):
+    # 새 프로세스 안에서 실행: llm_comp 가져오기 → (워밍업) → 스크립트 요청 2회
+    started_at = time.perf_counter()
+    import llm_comp
+    result = {"import_s": time.perf_counter() - started_at, "warmup_s": None, "requests": []}
+    if args.warmup:
+        result["warmup_s"] = llm_comp.warm_up()
+
+    name, situation, emotion = SAMPLE_SCENARIO
+    for index in range(2):
+        # 캐시를 건너뛰어 매번 체인을 통한 실제 호출 경로를 탐
+        started_at = time.perf_counter()
+        call = llm_comp.prepare_script_call(name, situation, emotion, regenerate=True,
+                                            session_id=f"bench-startup-{index}")
+        request = {"prepare_s": time.perf_counter() - started_at, "ttft_s": None, "total_s": None}
+        if args.stream:
+            first_chunk_at = None
+            for _ in llm_comp.coalesced_stream(call):
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+            request["ttft_s"] = first_chunk_at - started_at if first_chunk_at else None
+            request["total_s"] = time.perf_counter() - started_at
+        result["requests"].append(request)
+    print("BENCH_RESULT " + json.dumps(result))
+
+
+def measure_first_request(env, warmup, stream):
+    command = [sys.executable, os.path.abspath(__file__), "--child"]
+    if warmup:
+        command.append("--warmup")
+    if stream:
+        command.append("--stream")
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    raise RuntimeError(f"첫 요청 측정 실패:\n{result.stdout[-1000:]}\n{result.stderr[-2000:]}")
+
+
+def ms(value):
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+# 사용법: python bench_startup.py                          (openai 백엔드: 네트워크 없이 준비 시간만 측정)
+#        python bench_startup.py --backend fake --stream   (가짜 모델로 첫 조각까지의 시간 포함)
+#        python bench_startup.py --save startup.jsonl      (결과를 한 줄씩 덧붙여 회귀 추적)
+def main():
+    parser = argparse.ArgumentParser(description="콜드 스타트(가져오기 시간 / 첫 요청 지연) 측정")
+    parser.add_argument("--modules", nargs="+", default=["llm_comp", "service_server", "batch_cli"],
+                        help="가져오기 시간을 잴 모듈")
+    parser.add_argument("--backend", choices=["openai", "fake"], default="openai")
+    parser.add_argument("--stream", action="store_true", help="응답까지 받아 첫 조각 시간(TTFT) 측정")
+    parser.add_argument("--repeat", type=int, default=3, help="측정 반복 횟수 (중앙값 사용)")
+    parser.add_argument("--top", type=int, default=8, help="출력할 무거운 패키지 수")
+    parser.add_argument("--save", help="결과를 덧붙일 JSONL 파일")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args)
+        return
+    if args.stream and args.backend == "openai" and not os.getenv("OPENAI_API_KEY"):
+        parser.error("--backend openai --stream 은 OPENAI_API_KEY가 필요합니다.")
+
+    env = bench_env(args.backend)
+    median = lambda values: sorted(values)[len(values) // 2]
+    report = {"timestamp": time.time(), "python": sys.version.split()[0], "backend": args.backend,
+              "imports": {}, "first_request": {}}
+
+    print(f"\n📊 가져오기 시간 (-X importtime, {args.repeat}회 중앙값)")
+    for module in args.modules:
+        runs = [measure_import(module, env) for _ in range(args.repeat)]
+        run = sorted(runs, key=lambda r: r["import_s"])[len(runs) // 2]
+        heavy = sorted(run["packages"].items(), key=lambda item: -item[1])[:args.top]
+        print(f"- {module}: {ms(run['import_s'])} ms (프로세스 전체 {ms(run['process_s'])} ms, 모듈 {run['modules']}개)")
+        print("  무거운 패키지: " + ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in heavy))
+        report["imports"][module] = {"import_s": run["import_s"], "process_s": run["process_s"],
+                                     "modules": run["modules"], "heavy": dict(heavy)}
+
+    print(f"\n📊 첫 요청 지연 (스크립트 생성, backend={args.backend}, {args.repeat}회 중앙값)")
+    print(f"{'모드':<10}{'가져오기':>10}{'워밍업':>10}{'첫 요청 준비':>14}{'첫 TTFT':>10}{'두 번째 준비':>14}{'두 번째 TTFT':>14}")
+    for mode, warmup in (("lazy", False), ("warmup", True)):
+        runs = [measure_first_request(env, warmup, args.stream) for _ in range(args.repeat)]
+        summary = {
+            "import_s": median([r["import_s"] for r in runs]),
+            "warmup_s": median([r["warmup_s"] for r in runs]) if warmup else None,
+        }
+        for index, label in enumerate(("first", "second")):
+            for key in ("prepare_s", "ttft_s"):
+                values = [r["requests"][index][key] for r in runs if r["requests"][index][key] is not None]
+                summary[f"{label}_{key}"] = median(values) if values else None
+        print(f"{mode:<10}{ms(summary['import_s']):>10}{ms(summary['warmup_s']):>10}"
+              f"{ms(summary['first_prepare_s']):>14}{ms(summary['first_ttft_s']):>10}"
+              f"{ms(summary['second_prepare_s']):>14}{ms(summary['second_ttft_s']):>14}  (ms)")
+        report["first_request"][mode] = summary
+
+    if args.save:
+        with open(args.save, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+        print(f"\n💾 결과 저장: {args.save}")
+
+
+if __name__ == "__main__":
+    main()
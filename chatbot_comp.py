@@ -1,30 +1,42 @@
 import streamlit as st
-from llm_comp import get_chatbot_response, get_script_response, get_kakao_response, get_random_customer_info
-import re
-import os, json
+from llm_client import get_random_customer_info, kakao_style_titles, script_payload, chat_payload, kakao_payload
+from llm_client import submit_job, get_job, pending_jobs, mark_job_attached, job_queue_stats
+from llm_client import job_text_chunks, job_variant_events
+from llm_client import load_session, bind_session_source, reset_session, delete_session
+import os
+import json
 from datetime import datetime, timedelta, timezone
 import uuid
-from langchain_community.chat_message_histories import ChatMessageHistory
-from llm_comp import store
+from history_index import get_history_index, user_history_path, EMOTION_LEVELS
+from assets import asset_url, avatar_css, avatar_html, page_icon
+from markdown_format import format_markdown, render_message_parts
+from conversation_store import conversation_store, conversation_writer, read_conversation
+from conversation_store import read_conversation_tail, read_messages, CONVERSATION_TAIL_MESSAGES
 
 # ----------------- 전역 변수 -------------------
 CHATBOT_TYPE = "complaint"
-URLS = {
-    "page_icon":"https://github.com/jssoleey/goodrich-chatbot-complaint/blob/main/image/logo.png?raw=true",
-    "top_image": "https://github.com/jssoleey/goodrich-chatbot-complaint/blob/main/image/top_box.png?raw=true",
-    "bottom_image": "https://github.com/jssoleey/goodrich-chatbot-complaint/blob/main/image/bottom_box.png?raw=true",
-    "logo": "https://github.com/jssoleey/goodrich-chatbot-complaint/blob/main/image/logo.png?raw=true",
-    "user_avatar": "https://github.com/jssoleey/goodrich-chatbot-complaint/blob/main/image/user_avatar.png?raw=true",
-    "ai_avatar": "https://github.com/jssoleey/goodrich-chatbot-complaint/blob/main/image/ai_avatar.png?raw=true"
+HISTORY_PAGE_SIZE = 20   # 사이드바 검색 결과 페이지당 건수
+# 이미지는 기본적으로 image/ 폴더에서 인라인 (ASSET_MODE=remote면 GitHub URL)
+URLS = {name: asset_url(name) for name in ("top_image", "bottom_image", "logo")}
+AVATARS = {"user": avatar_html("user_avatar"), "ai": avatar_html("ai_avatar")}
+EMOTION_LABELS = {
+    1: "😊 평온",
+    2: "🙂 다소 불만",
+    3: "😐 불만",
+    4: "😠 화남",
+    5: "😡 매우 화남"
 }
 
 # ----------------- config -------------------
 st.set_page_config( 
     page_title="응대닥터 CARE+",
-    page_icon=URLS["page_icon"]
+    page_icon=page_icon()
 )
 
 # ----------------- CSS -------------------
+# 아바타 이미지는 여기서 한 번만 내려보내고 메시지마다 클래스로 참조
+st.markdown(f"<style>\n{avatar_css()}\n</style>", unsafe_allow_html=True)
+
 st.markdown(
     """
     <style>
@@ -69,6 +81,10 @@ st.markdown(
         height: 50px;
         border-radius: 0%;
         margin: 0 10px;
+        flex-shrink: 0;
+        background-size: contain;
+        background-repeat: no-repeat;
+        background-position: center;
     }
     .input-box {
         background: #ff9c01;
@@ -132,42 +148,6 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# ----------------- 마크다운 자동 정리 함수 -------------------
-def format_markdown(text: str) -> str:
-    lines = text.strip().splitlines()
-    formatted_lines = []
-    indent_next = False
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            formatted_lines.append("")
-            indent_next = False
-            continue
-
-        if re.match(r"^(▶️|✅|📌|❗|📝|📍)\s*[^:：]+[:：]?", line):
-            title = re.sub(r"[:：]\s*$", "", line.strip())
-            formatted_lines.append(f"**{title}**\n")
-            indent_next = False
-            continue
-
-        if re.match(r"^[-•]\s*\*\*.*\*\*", line):
-            formatted_lines.append(re.sub(r"^[-•]\s*", "- ", line))
-            indent_next = True
-            continue
-
-        if re.match(r"^[-•]\s*", line):
-            if indent_next:
-                formatted_lines.append("    " + re.sub(r"^[-•]\s*", "- ", line))
-            else:
-                formatted_lines.append(re.sub(r"^[-•]\s*", "- ", line))
-            continue
-
-        formatted_lines.append(line)
-        indent_next = False
-
-    return "\n".join(formatted_lines).strip() + "\n"
-
 # ----------------- 사이드바 설정 -------------------
 def render_sidebar():
     # 현재 날짜 표시
@@ -183,31 +163,69 @@ def render_sidebar():
         st.sidebar.title(f"😊 {user_name}님, 반갑습니다!")
         st.sidebar.markdown("오늘도 멋진 상담 화이팅입니다! 💪")
 
+        # 생성 작업 큐가 밀려 있으면 대기/진행 건수와 워커 사용률 표시
+        queue_stats = job_queue_stats()
+        if queue_stats["queued"] or queue_stats["running"]:
+            st.sidebar.caption(
+                f"🧵 생성 대기 {queue_stats['queued']}건 · 진행 {queue_stats['running']}건 · "
+                f"워커 사용률 {queue_stats['utilization']:.0%}"
+            )
+
         st.sidebar.markdown("<hr style='margin-top:20px; margin-bottom:34px;'>", unsafe_allow_html=True)
 
-        user_path = f"/data/{CHATBOT_TYPE}/history/{st.session_state['user_folder']}"
+        user_path = user_history_path(st.session_state['user_folder'])
         if not os.path.exists(user_path):
             os.makedirs(user_path)
 
-        history_files = os.listdir(user_path)
-
-        if history_files:
-            search_keyword = st.sidebar.text_input("🔎 고객명으로 검색", placeholder="고객명 입력 후 ENTER", key="search_input")        
-            filtered_files = [f for f in history_files if search_keyword.lower() in f.lower()]
-            selected_chat = st.sidebar.selectbox("📂 저장된 대화 기록", filtered_files, key="chat_file_selector")
+        history_index = get_history_index(st.session_state['user_folder'])
+
+        if history_index.count():
+            search_keyword = st.sidebar.text_input("🔎 고객명·민원 내용으로 검색", placeholder="검색어 입력 후 ENTER", key="search_input")
+            emotion_options = [None] + sorted(set(EMOTION_LEVELS.values()))
+            emotion_filter = st.sidebar.selectbox(
+                "감정 상태",
+                emotion_options,
+                format_func=lambda level: "전체" if level is None else next(k for k, v in EMOTION_LEVELS.items() if v == level),
+                key="search_emotion"
+            )
+
+            # 검색 조건이 바뀌면 첫 페이지부터
+            if st.session_state.get('history_query') != (search_keyword, emotion_filter):
+                st.session_state['history_query'] = (search_keyword, emotion_filter)
+                st.session_state['history_page'] = 0
+            page = st.session_state.get('history_page', 0)
+
+            filtered_files, total = history_index.search(search_keyword, emotion_filter, page, HISTORY_PAGE_SIZE)
+            last_page = max((total - 1) // HISTORY_PAGE_SIZE, 0)
+            selected_chat = st.sidebar.selectbox(
+                f"📂 저장된 대화 기록 ({total}건)", filtered_files, key="chat_file_selector"
+            )
+
+            if total > HISTORY_PAGE_SIZE:
+                prev_col, page_col, next_col = st.sidebar.columns([1, 1, 1])
+                with prev_col:
+                    if st.button("◀", use_container_width=True, disabled=page == 0, key="history_prev"):
+                        st.session_state['history_page'] = page - 1
+                        st.experimental_rerun()
+                with page_col:
+                    st.markdown(f"<div style='text-align:center; padding-top:6px;'>{page + 1} / {last_page + 1}</div>", unsafe_allow_html=True)
+                with next_col:
+                    if st.button("▶", use_container_width=True, disabled=page >= last_page, key="history_next"):
+                        st.session_state['history_page'] = page + 1
+                        st.experimental_rerun()
 
             col1, col2 = st.sidebar.columns(2)
 
             with col1:
-                if st.button("불러오기", use_container_width=True):
+                if st.button("불러오기", use_container_width=True, disabled=not selected_chat):
                     st.session_state['selected_chat_temp'] = selected_chat
                     load_chat_history(user_path, st.session_state['selected_chat_temp'])
 
             with col2:
-                if st.button("🗑️ 삭제하기", use_container_width=True):
+                if st.button("🗑️ 삭제하기", use_container_width=True, disabled=not selected_chat):
                     delete_chat_history(user_path, selected_chat)
 
-            if not filtered_files and search_keyword:
+            if not filtered_files and (search_keyword or emotion_filter):
                 st.sidebar.markdown(
                     "<div style='padding:6px; background-color:#f0f0f0; border-radius:5px;'>🔍 검색 결과가 없습니다.</div>",
                     unsafe_allow_html=True
@@ -225,6 +243,8 @@ def render_sidebar():
             reset_session_for_new_case()
 
         if st.sidebar.button("로그아웃", use_container_width=True):
+            # 로그아웃한 세션의 대화 기록은 바로 정리하고 진행 중인 생성도 취소
+            delete_session()
             st.session_state.page = "login"
             st.session_state.message_list = []
             st.experimental_rerun()
@@ -234,34 +254,36 @@ def render_sidebar():
 
 # ----------------- 대화 불러오기 -------------------        
 def load_chat_history(user_path, selected_chat):
-    with open(f"{user_path}/{selected_chat}", "r", encoding="utf-8") as f:
-        loaded_data = json.load(f)
-        if isinstance(loaded_data, list):
-            st.session_state['script_context'] = ""
-            st.session_state.message_list = loaded_data
-            st.session_state['customer_name'] = "고객명미입력"
-        elif isinstance(loaded_data, dict):
-            st.session_state['script_context'] = loaded_data.get("script_context", "")
-            st.session_state.message_list = loaded_data.get("message_list", [])
-            st.session_state['customer_name'] = loaded_data.get("customer_name", selected_chat.split('_')[0])
-            st.session_state['customer_emotion_label'] = loaded_data.get("customer_emotion_label", "")
-            st.session_state['customer_situation'] = loaded_data.get("customer_situation", "")
-            st.session_state['extra_info'] = loaded_data.get("extra_info", "")
-        else:
-            st.error("❌ 불러온 파일 형식이 잘못되었습니다.")
-            st.stop()
-
-    # ⭐ chat_history 복원
-    chat_history = ChatMessageHistory()
-    for msg in st.session_state.message_list:
-        if isinstance(msg, dict) and 'role' in msg and 'content' in msg:
-            if msg['role'] == 'user':
-                chat_history.add_user_message(msg['content'])
-            elif msg['role'] == 'ai':
-                chat_history.add_ai_message(msg['content'])
-    store[st.session_state.session_id] = chat_history
-
+    if not os.path.exists(f"{user_path}/{selected_chat}"):
+        # 다른 곳에서 지워진 파일이면 색인에서도 정리
+        get_history_index(st.session_state['user_folder']).remove(selected_chat)
+        st.sidebar.warning("이미 삭제된 파일입니다.")
+        return
+    # 예전 list/dict 형식 파일과 저널에 덧붙은 메시지까지 합쳐서 읽되, 화면에는 최근 메시지만
+    try:
+        loaded_data = read_conversation_tail(f"{user_path}/{selected_chat}", CONVERSATION_TAIL_MESSAGES)
+    except ValueError:
+        st.error("❌ 불러온 파일 형식이 잘못되었습니다.")
+        st.stop()
+
+    st.session_state['script_context'] = loaded_data.get("script_context", "")
+    st.session_state.message_list = loaded_data.get("message_list", [])
+    st.session_state['customer_name'] = loaded_data.get("customer_name", selected_chat.split('_')[0])
+    st.session_state['customer_emotion_label'] = loaded_data.get("customer_emotion_label", "")
+    st.session_state['customer_situation'] = loaded_data.get("customer_situation", "")
+    st.session_state['extra_info'] = loaded_data.get("extra_info", "")
+    st.session_state['message_offset'] = loaded_data["message_offset"]
+    st.session_state['saved_count'] = loaded_data["total_messages"]
     st.session_state['current_file'] = selected_chat
+
+    # 새로고침 등으로 화면이 끊긴 사이 끝난 이 상담 건의 생성 결과를 붙이고 파일에도 저장
+    finished_jobs = [job for job in pending_jobs(case_key=selected_chat) if job["state"] == "done"]
+    if sum(attach_job(job, include_question=True) for job in finished_jobs):
+        autosave_conversation()
+
+    # ⭐ chat_history 복원 (스크립트 + 불러온 최근 메시지만). 이전 상담에서 진행 중이던 생성은 취소
+    load_session(current_conversation(), source=f"{user_path}/{selected_chat}")
+
     st.session_state.page = "chatbot"
     st.experimental_rerun()
     
@@ -270,7 +292,8 @@ def delete_chat_history(user_path, selected_chat):
     file_path = f"{user_path}/{selected_chat}"
     if os.path.exists(file_path):
         try:
-            os.remove(file_path)
+            conversation_store.delete(file_path)
+            get_history_index(st.session_state['user_folder']).remove(selected_chat)
             st.sidebar.success(f"{selected_chat} 삭제 완료!")
             st.experimental_rerun()
         except Exception as e:
@@ -278,6 +301,103 @@ def delete_chat_history(user_path, selected_chat):
     else:
         st.sidebar.warning("이미 삭제된 파일입니다.")
 
+# ----------------- 백그라운드 생성 결과 반영 -------------------
+def current_conversation():
+    return {
+        "script_context": st.session_state.get('script_context', ''),
+        "message_list": st.session_state.message_list,
+        "message_offset": st.session_state.get('message_offset', 0),
+    }
+
+def attach_job(job, include_question=False):
+    # 끝난 생성 작업의 결과를 현재 상담 건에 한 번만 반영 (rerun/새로고침 뒤에도 작업 큐에 남은 결과로 반영)
+    # include_question: 질문이 화면에 없는 경우(다른 화면 세션에서 보낸 질문) 질문도 함께 붙임
+    if job is None or job["state"] != "done" or not mark_job_attached(job["id"]):
+        return False
+    payload = job["payload"]
+    result = job["progress"]
+
+    if job["kind"] == "script":
+        st.session_state.kakao_text = ""
+        st.session_state['kakao_variants'] = {}
+        st.session_state['current_file'] = ""
+        st.session_state['saved_count'] = 0
+        st.session_state['customer_name'] = payload["name"]
+        st.session_state['customer_emotion_label'] = EMOTION_LABELS.get(payload["emotion"], "")
+        st.session_state['extra_info'] = payload.get("extra_info", "")
+        st.session_state['customer_situation'] = payload["situation"]
+        # 스크립트를 첫 메시지로 저장하고 챗봇 화면으로 전환
+        st.session_state['script_context'] = result
+        st.session_state.message_list = [{"role": "ai", "content": result}]
+        st.session_state['message_offset'] = 0
+        st.session_state.page = "chatbot"
+        if job["session_id"] != st.session_state.session_id:
+            # 이전 화면 세션에서 만든 스크립트면 LLM 대화 기록도 현재 세션으로 옮김
+            load_session(current_conversation())
+    elif job["kind"] == "chat":
+        if include_question:
+            st.session_state.message_list.append({"role": "user", "content": payload["message"]})
+        st.session_state.message_list.append({"role": "ai", "content": format_markdown(result)})
+        autosave_conversation()
+    elif job["kind"] == "kakao":
+        st.session_state['kakao_text'] = result
+    elif job["kind"] == "kakao_variants":
+        st.session_state.setdefault('kakao_variants', {}).update(json.loads(result or "{}"))
+    return True
+
+def follow_script_job(job_id):
+    # 생성 중이면 진행 결과를 스트리밍으로 보여주고, 끝나면 반영 후 챗봇 화면으로
+    display_streaming_message(job_text_chunks(job_id), AVATARS["ai"])
+    attach_job(get_job(job_id))
+    st.experimental_rerun()
+
+def follow_chat_job(job_id, avatar):
+    display_streaming_message(job_text_chunks(job_id), avatar)
+    attach_job(get_job(job_id))
+
+def current_case_jobs(jobs):
+    # 같은 화면 세션이라도 다른 상담 건(불러오기 전 대화)에서 요청한 작업은 그 대화를 불러올 때 붙임
+    current_file = st.session_state.get('current_file', '')
+    return [job for job in jobs if job["case_key"] in ("", current_file)]
+
+def latest_kakao_job():
+    # 이 화면에서 요청한 카카오톡 생성 중 아직 반영하지 않은 마지막 작업 (그 전 작업은 끝났으면 결과만 반영)
+    jobs = current_case_jobs(pending_jobs(session_id=st.session_state.session_id, kinds=("kakao", "kakao_variants")))
+    for job in jobs[:-1]:
+        attach_job(job)
+    return jobs[-1] if jobs else None
+
+# ----------------- 대화 자동 저장 -------------------
+def autosave_conversation():
+    # 이미 저장된 대화라면 새 메시지만 저널에 덧붙임 (백그라운드 처리, 화면은 기다리지 않음)
+    current_file = st.session_state.get('current_file')
+    saved_count = st.session_state.get('saved_count', 0)
+    offset = st.session_state.get('message_offset', 0)
+    new_messages = st.session_state.message_list[saved_count - offset:]
+    if not current_file or not new_messages:
+        return
+
+    user_folder = st.session_state['user_folder']
+    file_path = os.path.join(user_history_path(user_folder), current_file)
+    st.session_state['saved_count'] = offset + len(st.session_state.message_list)
+    conversation_writer.submit(append_conversation, user_folder, current_file, file_path, list(new_messages), saved_count)
+
+def append_conversation(user_folder, filename, file_path, messages, start_index):
+    # 저널이 압축되어 본 파일이 갱신되면 검색 색인도 함께 갱신
+    if conversation_store.append(file_path, messages, start_index):
+        get_history_index(user_folder).upsert(filename, read_conversation(file_path))
+
+# ----------------- 이전 대화 더 불러오기 -------------------
+def load_earlier_messages():
+    # 화면에 없는 앞부분 메시지를 K개씩 저장 파일에서 가져와 앞에 붙임
+    offset = st.session_state.get('message_offset', 0)
+    if offset <= 0 or not st.session_state.get('current_file'):
+        return
+    file_path = os.path.join(user_history_path(st.session_state['user_folder']), st.session_state['current_file'])
+    start = max(offset - CONVERSATION_TAIL_MESSAGES, 0)
+    st.session_state.message_list = read_messages(file_path, start, offset) + st.session_state.message_list
+    st.session_state['message_offset'] = start
+
 # ----------------- 체크리스트 랜더링 -------------------
 def render_checklist_sidebar():
     st.sidebar.title("📝 민원응대 체크리스트")
@@ -305,7 +425,10 @@ def reset_session_for_new_case():
     st.session_state.message_list = []
     st.session_state.script_context = ""
     st.session_state.kakao_text = ""
+    st.session_state['kakao_variants'] = {}
     st.session_state['current_file'] = ""
+    st.session_state['saved_count'] = 0
+    st.session_state['message_offset'] = 0
     st.session_state['customer_name'] = ""
 
     # 👉 입력 값 초기화
@@ -314,35 +437,92 @@ def reset_session_for_new_case():
     st.session_state['extra_info_input'] = ''
     st.session_state['customer_emotion_input'] = 3  # 기본 감정값
     
-    store[st.session_state.session_id] = ChatMessageHistory()
+    reset_session()
     st.experimental_rerun()
     
 # ----------------- 메시지 표시 함수 -------------------
-def display_message(role, content, avatar_url):
-    if role == "user":
-        alignment = "user"
-        message_class = "user-message"
-        avatar_html = f'<img src="{avatar_url}" class="avatar">'
-        message_html = f'<div class="{message_class}">{content}</div>'
-        display_html = f"""
-        <div class="message-container {alignment}">
-            {message_html}
-            {avatar_html}
-        </div>
-        """
-        st.markdown(display_html, unsafe_allow_html=True)
-    else:
-        alignment = "ai"
-        message_class = "ai-message"
-        avatar_html = f'<img src="{avatar_url}" class="avatar">'
-        display_html = f"""
-        <div class="message-container {alignment}">
-            {avatar_html}
-            <div class="{message_class}">
-        """
-        st.markdown(display_html, unsafe_allow_html=True)
-        st.markdown(format_markdown(content), unsafe_allow_html=False)
-        st.markdown("</div></div>", unsafe_allow_html=True)
+def display_message(role, content, avatar):
+    # 같은 메시지는 rerun마다 다시 정리하지 않고 캐시된 HTML/마크다운을 그대로 출력
+    display_html, body_markdown, closing_html = render_message_parts(role, content, avatar)
+    st.markdown(display_html, unsafe_allow_html=True)
+    if body_markdown is not None:
+        st.markdown(body_markdown, unsafe_allow_html=False)
+        st.markdown(closing_html, unsafe_allow_html=True)
+
+# ----------------- 스트리밍 메시지 표시 함수 -------------------
+def display_streaming_message(chunks, avatar):
+    # 토큰이 도착하는 대로 AI 말풍선을 갱신하고, 완성된 전체 텍스트를 반환
+    st.markdown(
+        f"""
+        <div class="message-container ai">
+            {avatar}
+            <div class="ai-message">
+        """,
+        unsafe_allow_html=True
+    )
+    placeholder = st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(format_markdown(text) + " ▌", unsafe_allow_html=False)
+    placeholder.markdown(format_markdown(text), unsafe_allow_html=False)
+    st.markdown("</div></div>", unsafe_allow_html=True)
+    return text
+
+def stream_to_text_area(chunks, label, height=400, refresh_chars=40):
+    # 카카오톡 문자처럼 text_area에 표시되는 응답을 점진적으로 갱신
+    placeholder = st.empty()
+    text = ""
+    rendered = 0
+    for chunk in chunks:
+        text += chunk
+        if len(text) - rendered >= refresh_chars:
+            placeholder.text_area(label, value=text, height=height, disabled=True)
+            rendered = len(text)
+    placeholder.text_area(label, value=text, height=height)
+    return text
+
+# ----------------- 카카오톡 문자 유형별 패널 -------------------
+def render_kakao_variants(job_id=None, refresh_chars=40):
+    # 유형별 패널을 그리고, 생성 작업이 있으면 해당 패널에 스트리밍
+    # 패널마다 '다시 생성' 버튼으로 그 유형만 새로 생성
+    variants = st.session_state.setdefault('kakao_variants', {})
+    placeholders = {}
+    regenerate = []
+
+    titles = kakao_style_titles()
+    for style, title in titles.items():
+        with st.expander(title, expanded=True):
+            placeholders[style] = st.empty()
+            placeholders[style].text_area(f"{title} 문자", value=variants.get(style, ""), height=300,
+                                          key=f"kakao_{style}_view")
+            if st.button("🔄 이 유형만 다시 생성", key=f"kakao_regen_{style}", use_container_width=True):
+                regenerate.append(style)
+
+    if job_id is None and regenerate:
+        job_id = submit_job("kakao_variants", kakao_payload(
+            script_context = st.session_state['script_context'],
+            message_list = st.session_state['message_list'],
+            styles = regenerate
+        ), case_key=st.session_state.get('current_file', ''))
+    if job_id is None:
+        return
+
+    texts = {}
+    rendered = {}
+    for style, chunk in job_variant_events(job_id):
+        title = titles.get(style, style)
+        if chunk is None:
+            # 완료된 유형은 바로 편집 가능한 상태로 확정
+            variants[style] = texts.get(style, "")
+            placeholders[style].text_area(f"{title} 문자", value=variants[style], height=300,
+                                          key=f"kakao_{style}_done")
+            continue
+        texts[style] = texts.get(style, "") + chunk
+        if len(texts[style]) - rendered.get(style, 0) >= refresh_chars:
+            placeholders[style].text_area(f"{title} 문자", value=texts[style], height=300, disabled=True)
+            rendered[style] = len(texts[style])
+    attach_job(get_job(job_id))
         
 # ----------------- 고객 정보 요약 함수 -------------------
 def render_customer_info():
@@ -439,6 +619,15 @@ if st.session_state.page == "input":
     
     # 사이드바 호출
     render_sidebar()
+
+    # 이 화면에서 요청한 스크립트가 rerun으로 끊겼으면 이어서 표시하고, 새로고침 전에 요청한 스크립트는 불러오기 안내
+    for job in pending_jobs(kinds=("script",)):
+        if job["session_id"] == st.session_state.session_id:
+            follow_script_job(job["id"])
+        job_label = "생성 완료" if job["state"] == "done" else "생성 중"
+        if st.button(f"📥 이전에 요청한 {job['payload']['name']} 고객 스크립트 불러오기 ({job_label})",
+                     key=f"script_job_{job['id']}", use_container_width=True):
+            follow_script_job(job["id"])
             
     st.markdown(
         "<h4 style='margin-bottom: 20px;'>👤 민원 상황을 입력해 주세요</h4>",
@@ -473,14 +662,10 @@ if st.session_state.page == "input":
     )
 
     # 감정 상태 설명 표시
-    emotion_labels = {
-        1: "😊 평온",
-        2: "🙂 다소 불만",
-        3: "😐 불만",
-        4: "😠 화남",
-        5: "😡 매우 화남"
-    }
-    st.markdown(f"**현재 선택된 감정 상태:** {emotion_labels[emotion]}")
+    st.markdown(f"**현재 선택된 감정 상태:** {EMOTION_LABELS[emotion]}")
+
+    # 5️⃣ 같은 입력으로 만든 스크립트가 있어도 새로 생성할지 여부
+    regenerate = st.checkbox("🔄 이전에 생성된 스크립트 대신 새로 생성하기", value=False)
     st.caption("")
 
     col1, col2 = st.columns([1, 1])
@@ -495,43 +680,31 @@ if st.session_state.page == "input":
             st.session_state['extra_info_input'] = example_info['extra_info']
             st.experimental_rerun()
 
-    with col2:
-        if st.button("🚀 민원 응대 스크립트 생성하기", use_container_width=True):
-            if name and situation:
-                # 👉 세션 초기화 추가
-                st.session_state.kakao_text = ""
-                st.session_state['current_file'] = ""
-                
-                # 고객 정보 세션에 저장
-                st.session_state['customer_name'] = name
-                emotion_labels = {
-                    1: "😊 평온",
-                    2: "🙂 다소 불만",
-                    3: "😐 불만",
-                    4: "😠 화남",
-                    5: "😡 매우 화남"
-                }
-                st.session_state['customer_emotion_label'] = emotion_labels[emotion]
-                st.session_state['extra_info'] = extra_info
-                st.session_state['customer_situation'] = situation
-
-                with st.spinner("민원 응대 스크립트를 생성 중입니다..."):
-                    ai_response = get_script_response(name, situation, emotion)
-                    script_text = "".join(ai_response)
-
-                    # 스크립트 context 저장
-                    st.session_state['script_context'] = script_text
-
-                    # 생성된 스크립트를 첫 메시지로 저장
-                    st.session_state.message_list = []
-                    st.session_state.message_list.append({"role": "ai", "content": script_text})
-
-                # 챗봇 화면으로 전환
-                st.session_state.page = "chatbot"
+        # 교육용 랜덤 민원 (미리 생성된 풀에서 즉시 제공)
+        if st.button("🎲 랜덤 민원 불러오기", use_container_width=True):
+            random_info = get_random_customer_info()
+            if random_info:
+                st.session_state['customer_name_input'] = random_info.get('name', '')
+                st.session_state['customer_situation_input'] = random_info.get('situation', '')
+                st.session_state['extra_info_input'] = random_info.get('extra_info', '')
+                st.session_state['customer_emotion_input'] = random_info.get('emotion', 3)
                 st.experimental_rerun()
             else:
-                st.warning("민원인 이름과 민원 내용을 모두 입력해 주세요.")
-                
+                st.warning("⏳ 지금은 랜덤 민원을 불러오지 못했습니다. 잠시 후 다시 시도해 주세요.")
+
+    with col2:
+        generate_clicked = st.button("🚀 민원 응대 스크립트 생성하기", use_container_width=True)
+
+    if generate_clicked:
+        if name and situation:
+            # 생성은 작업 큐에서 진행 (rerun/새로고침으로 화면이 끊겨도 결과가 남고, 다시 열면 이어서 표시)
+            # 끝나면 고객 정보/스크립트를 세션에 반영하고 챗봇 화면으로 전환 (attach_job)
+            st.session_state['extra_info'] = extra_info
+            job_id = submit_job("script", script_payload(name, situation, emotion, regenerate=regenerate))
+            follow_script_job(job_id)
+        else:
+            st.warning("민원인 이름과 민원 내용을 모두 입력해 주세요.")
+            
 # ----------------- 챗봇 화면 -------------------
 elif st.session_state.page == "chatbot":
         
@@ -541,11 +714,22 @@ elif st.session_state.page == "chatbot":
     # 고객정보 호출
     render_customer_info()
         
-    user_avatar = URLS["user_avatar"]
-    ai_avatar = URLS["ai_avatar"]
+    user_avatar = AVATARS["user"]
+    ai_avatar = AVATARS["ai"]
         
     messages = st.session_state.get("message_list", [])
 
+    # 긴 대화는 최근 메시지만 불러오므로, 스크립트는 항상 맨 위에 보여주고 그 사이는 필요할 때 불러옴
+    message_offset = st.session_state.get('message_offset', 0)
+    if message_offset > 0:
+        hidden_count = message_offset
+        if st.session_state.get('script_context'):
+            display_message("ai", st.session_state['script_context'], ai_avatar)
+            hidden_count -= 1
+        if hidden_count > 0 and st.button(f"⬆️ 이전 대화 더 보기 ({hidden_count}개)", use_container_width=True):
+            load_earlier_messages()
+            st.experimental_rerun()
+
     if isinstance(messages, list):
         for message in messages:
             if isinstance(message, dict) and "role" in message and "content" in message:
@@ -558,80 +742,100 @@ elif st.session_state.page == "chatbot":
     else:
         st.error("❌ 메시지 리스트가 손상되었습니다. 다시 불러와 주세요.")
 
+    # rerun으로 표시가 끊긴 추가 질문 답변이 있으면 이어서 표시하고 대화에 반영
+    for job in current_case_jobs(pending_jobs(session_id=st.session_state.session_id, kinds=("chat",))):
+        follow_chat_job(job["id"], ai_avatar)
+
     if user_question := st.chat_input("민원 상담 관련 질문을 자유롭게 입력해 주세요."):
         st.session_state.message_list.append({"role": "user", "content": user_question})
         display_message("user", user_question, user_avatar)
 
-        with st.spinner("답변을 준비 중입니다..."):
-            ai_response = get_chatbot_response(user_question, st.session_state['script_context'])
-            formatted_response = format_markdown("".join(ai_response))
-            st.session_state.message_list.append({"role": "ai", "content": formatted_response})
-            display_message("ai", formatted_response, ai_avatar)
+        # 답변은 작업 큐에서 생성. 끝나면 대화에 붙이고 자동 저장 (attach_job)
+        job_id = submit_job("chat", chat_payload(user_question, st.session_state['script_context']),
+                            case_key=st.session_state.get('current_file', ''))
+        follow_chat_job(job_id, ai_avatar)
+
+    # 👉 카카오톡 문자 생성 방식: 세 유형을 동시에 따로 생성(기본) 또는 한 번에 생성
+    kakao_fanout = st.checkbox("⚡ 문자 유형별 동시 생성 (유형별로 다시 생성 가능)", value=True, key="kakao_fanout")
 
     # 👉 버튼 영역: 두 개의 버튼을 나란히 배치
     col1, col2 = st.columns([1, 1])
+    kakao_job = None
     
     with col1:                
         if st.button("💬 카카오톡 발송용 문자 생성하기", use_container_width=True):
             if not st.session_state.get('script_context'):
                 st.warning("⚠️ 상담 스크립트가 없습니다. 먼저 스크립트를 생성해 주세요.")
             else:
-                with st.spinner("카카오톡 문자를 생성 중입니다..."):
-                    kakao_message = get_kakao_response(
-                        script_context = st.session_state['script_context'],
-                        message_list = st.session_state['message_list']
-                    )
-                    st.session_state['kakao_text'] = "".join(kakao_message)
-                    
-            # ✅ 안내 문구 출력
-            st.info("✅ 카카오톡 문자가 생성되었습니다! 계속해서 추가 질문을 이어가실 수 있습니다.")
+                if kakao_fanout:
+                    st.session_state['kakao_variants'] = {}
+                job_id = submit_job("kakao_variants" if kakao_fanout else "kakao", kakao_payload(
+                    script_context = st.session_state['script_context'],
+                    message_list = st.session_state['message_list']
+                ), case_key=st.session_state.get('current_file', ''))
+                kakao_job = get_job(job_id)
+        if kakao_job is None:
+            # rerun으로 표시가 끊긴 카카오톡 생성이 있으면 이어서 표시
+            kakao_job = latest_kakao_job()
                             
     with col2:
         if st.button("💾 대화 저장하기", use_container_width=True):
-            user_path = f"/data/{CHATBOT_TYPE}/history/{st.session_state['user_folder']}"
+            user_path = user_history_path(st.session_state['user_folder'])
             if not os.path.exists(user_path):
                 os.makedirs(user_path)
             if st.session_state.message_list:
                 # 1️⃣ 고객 이름 확보
                 customer_name = st.session_state.get('customer_name', '고객명미입력')
 
-                # 2️⃣ 기존 파일명 여부 확인
+                # 2️⃣ 기존 파일이면 같은 파일을 원자적으로 교체, 새로운 저장이면 새 파일명
                 if st.session_state.get('current_file'):
-                    # 기존 파일명에서 고객 이름 유지, 시간만 갱신
-                    KST = timezone(timedelta(hours=9))
-                    new_filename = f"{customer_name}_{datetime.now(KST).strftime('%y%m%d-%H%M%S')}.json"
-                    
-                    # 기존 파일 삭제 (덮어쓰기 효과)
-                    old_file = f"{user_path}/{st.session_state['current_file']}"
-                    if os.path.exists(old_file):
-                        os.remove(old_file)
+                    new_filename = st.session_state['current_file']
                 else:
-                    # 새로운 저장이라면
                     KST = timezone(timedelta(hours=9))
                     new_filename = f"{customer_name}_{datetime.now(KST).strftime('%y%m%d-%H%M%S')}.json"
 
-                # 3️⃣ 데이터 저장
+                # 3️⃣ 데이터 저장 (대기 중인 자동 저장 뒤에 순서대로 처리)
                 data_to_save = {
                     "customer_name": customer_name,
                     "customer_emotion_label": st.session_state.get('customer_emotion_label', ''),
                     "customer_situation": st.session_state.get('customer_situation', ''),
                     "extra_info": st.session_state.get('extra_info', ''),
                     "script_context": st.session_state.get('script_context', ''),
-                    "message_list": st.session_state.message_list
+                    "message_list": list(st.session_state.message_list)
                 }
 
-                with open(f"{user_path}/{new_filename}", "w", encoding="utf-8") as f:
-                    json.dump(data_to_save, f, ensure_ascii=False, indent=4)
+                # 화면에 불러오지 않은 앞부분은 기존 파일에서 합쳐 저장
+                data_to_save = conversation_writer.submit(
+                    conversation_store.save, f"{user_path}/{new_filename}", data_to_save,
+                    keep_prefix=st.session_state.get('message_offset', 0)
+                ).result(timeout=30)
+                get_history_index(st.session_state['user_folder']).upsert(new_filename, data_to_save)
 
                 # 4️⃣ 파일명 업데이트
                 st.session_state['current_file'] = new_filename
+                st.session_state['saved_count'] = len(data_to_save["message_list"])
+                bind_session_source(f"{user_path}/{new_filename}")
 
                 st.success(f"대화가 저장되었습니다! ({new_filename})")
             else:
                 st.warning("저장할 대화가 없습니다.")
     
-    # 👉 생성된 카카오톡 문자 출력 (있을 때만 표시)
-    if st.session_state.get('kakao_text'):
+    # 👉 생성된 카카오톡 문자 출력 (생성 중이면 스트리밍, 있으면 표시)
+    kakao_kind = kakao_job["kind"] if kakao_job else None
+    if kakao_kind == "kakao_variants" or (kakao_kind is None and kakao_fanout and st.session_state.get('kakao_variants')):
+        st.markdown("### 📩 카카오톡 발송용 문자")
+        render_kakao_variants(kakao_job["id"] if kakao_job else None)
+
+        if kakao_job is not None:
+            st.info("✅ 카카오톡 문자가 생성되었습니다! 계속해서 추가 질문을 이어가실 수 있습니다.")
+    elif kakao_kind == "kakao":
+        st.markdown("### 📩 카카오톡 발송용 문자")
+        stream_to_text_area(job_text_chunks(kakao_job["id"]), "아래 내용을 수정 또는 복사해 사용하세요.")
+        attach_job(get_job(kakao_job["id"]))
+
+        # ✅ 안내 문구 출력
+        st.info("✅ 카카오톡 문자가 생성되었습니다! 계속해서 추가 질문을 이어가실 수 있습니다.")
+    elif st.session_state.get('kakao_text'):
         st.markdown("### 📩 카카오톡 발송용 문자")
         st.text_area("아래 내용을 수정 또는 복사해 사용하세요.", value=st.session_state['kakao_text'], height=400)
         
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager, contextmanager
+
+
+# ======================== 예외 ========================
+class LimiterQueueFull(Exception):
+    pass
+
+
+class LimiterTimeout(Exception):
+    pass
+
+
+# ======================== 공정 동시성 제한기 ========================
+class FairLimiter:
+    # 프로세스 전체의 LLM 동시 호출 수를 제한하고, 대기열은 세션별 라운드로빈으로 배분
+    # 대기자는 concurrent.futures.Future로 표현해 스레드(Streamlit)와 이벤트 루프(async) 양쪽에서 사용
+    def __init__(self, max_in_flight=8, max_queue=64, timeout=30.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._queues = OrderedDict()   # session_key -> deque[Future]
+        self._wait_times = deque(maxlen=1000)
+        self._counters = {"acquired": 0, "queued": 0, "rejected": 0, "timeouts": 0, "max_queue_depth": 0}
+
+    # ---------- 대기열 ----------
+    def _enqueue(self, session_key):
+        future = Future()
+        with self._lock:
+            if self._in_flight < self.max_in_flight and self._waiting == 0:
+                self._in_flight += 1
+                future.set_running_or_notify_cancel()
+                future.set_result(0.0)
+                return future, time.monotonic()
+
+            if self._waiting >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise LimiterQueueFull(f"LLM 대기열이 가득 찼습니다 ({self.max_queue}건)")
+
+            self._queues.setdefault(session_key, deque()).append(future)
+            self._waiting += 1
+            self._counters["queued"] += 1
+            self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], self._waiting)
+        return future, time.monotonic()
+
+    def _cancel(self, session_key, future):
+        # 시간 초과된 대기자를 대기열에서 제거. 이미 슬롯을 받았다면 False
+        with self._lock:
+            if not future.cancel():
+                return False
+            queue = self._queues.get(session_key)
+            if queue is not None and future in queue:
+                queue.remove(future)
+                self._waiting -= 1
+                if not queue:
+                    del self._queues[session_key]
+            self._counters["timeouts"] += 1
+            return True
+
+    def _granted(self, started_at):
+        waited = time.monotonic() - started_at
+        with self._lock:
+            self._counters["acquired"] += 1
+            self._wait_times.append(waited)
+        return waited
+
+    # ---------- 획득/반환 ----------
+    def acquire(self, session_key, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        future, started_at = self._enqueue(session_key)
+        try:
+            future.result(timeout=timeout)
+        except BaseException as e:
+            timed_out = isinstance(e, FutureTimeout)
+            if self._cancel(session_key, future):
+                if timed_out:
+                    raise LimiterTimeout(f"LLM 호출 대기 시간 초과 ({timeout:g}초)")
+                raise
+            if not timed_out:
+                # 슬롯을 받은 직후 스크립트가 중단된 경우(Streamlit rerun 등) 슬롯을 돌려줌
+                self.release()
+                raise
+        return self._granted(started_at)
+
+    async def aacquire(self, session_key, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        future, started_at = self._enqueue(session_key)
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except BaseException as e:
+            if self._cancel(session_key, future):
+                if isinstance(e, asyncio.TimeoutError):
+                    raise LimiterTimeout(f"LLM 호출 대기 시간 초과 ({timeout:g}초)")
+                raise
+            if not isinstance(e, asyncio.TimeoutError):
+                # 슬롯을 받은 직후 작업이 취소된 경우 슬롯을 돌려줌
+                self.release()
+                raise
+        return self._granted(started_at)
+
+    def release(self):
+        with self._lock:
+            while self._queues:
+                session_key, queue = next(iter(self._queues.items()))
+                future = queue.popleft()
+                self._waiting -= 1
+                # 다음 세션에게 차례를 넘기기 위해 남은 대기자가 있으면 맨 뒤로 보냄
+                del self._queues[session_key]
+                if queue:
+                    self._queues[session_key] = queue
+                if future.set_running_or_notify_cancel():
+                    future.set_result(time.monotonic())
+                    return
+            self._in_flight -= 1
+
+    @contextmanager
+    def slot(self, session_key, timeout=None):
+        waited = self.acquire(session_key, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, session_key, timeout=None):
+        waited = await self.aacquire(session_key, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    # ---------- 통계 ----------
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._wait_times)
+            stats = {
+                **self._counters,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "waiting_sessions": len(self._queues),
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+            }
+        if waits:
+            stats["wait_avg"] = sum(waits) / len(waits)
+            stats["wait_p95"] = waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+            stats["wait_max"] = waits[-1]
+        return stats
+
+
+# ======================== 요청 속도 제한 ========================
+class TokenBucket:
+    # 초당 rate건, 최대 burst건까지 몰아서 허용 (배치 처리가 API 분당 요청 한도를 넘지 않도록)
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # 토큰 하나를 가져가고 0을 반환. 부족하면 기다려야 할 시간(초)을 반환
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while (wait := self._take()) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
@@ -0,0 +1,117 @@
+from functools import lru_cache
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from response_cache import normalize_text
+
+
+# ======================== 토큰 추정 ========================
+@lru_cache(maxsize=1)
+def _get_encoding():
+    # tiktoken 인코딩을 불러올 수 없는 환경(오프라인 등)에서는 근사치 사용
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 한글 등 비 ASCII 문자는 글자당 1토큰, ASCII는 4글자당 1토큰으로 근사
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+# ======================== 스크립트 중복 제거 ========================
+LEGACY_SCRIPT_HEADER = "[현재 상담 스크립트]"
+LEGACY_QUESTION_HEADER = "[상담원의 질문]"
+
+
+def strip_script(message, script_context):
+    # 이전 방식처럼 질문마다 스크립트를 통째로 붙여 저장된 메시지에서 스크립트 블록을 제거
+    content = message.content if isinstance(message.content, str) else str(message.content)
+
+    if LEGACY_SCRIPT_HEADER in content and LEGACY_QUESTION_HEADER in content:
+        content = content.split(LEGACY_QUESTION_HEADER, 1)[1].strip()
+
+    normalized = normalize_text(content)
+    script = normalize_text(script_context)
+    if script and (normalized == script or (len(normalized) >= len(script) and script in normalized)):
+        return None
+    return message.__class__(content=content)
+
+
+# ======================== 대화 맥락 구성 ========================
+def compress_message(message, max_chars):
+    content = normalize_text(message.content)
+    if len(content) > max_chars:
+        content = content[:max_chars] + "…"
+    speaker = "상담원" if isinstance(message, HumanMessage) else "AI"
+    return f"- {speaker}: {content}"
+
+
+def group_turns(messages):
+    # 상담원 질문부터 다음 질문 직전까지를 한 턴으로 묶음
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def build_followup_context(history_messages, script_context, user_message,
+                           budget_tokens=6000, keep_turns=3, compress_chars=200):
+    # 스크립트는 한 번만, 최근 N턴은 원문, 그 이전 턴은 요약으로 토큰 예산 안에서 구성
+    cleaned = [m for m in (strip_script(m, script_context) for m in history_messages) if m is not None]
+    cleaned = [m for m in cleaned if isinstance(m, (HumanMessage, AIMessage))]
+    turns = group_turns(cleaned)
+
+    recent = turns[-keep_turns:] if keep_turns > 0 else []
+    older = turns[:len(turns) - len(recent)]
+    summary_lines = [compress_message(m, compress_chars) for turn in older for m in turn]
+
+    fixed_tokens = estimate_tokens(script_context) + estimate_tokens(user_message)
+
+    def recent_tokens():
+        return sum(estimate_tokens(m.content) for turn in recent for m in turn)
+
+    def summary_tokens():
+        return sum(estimate_tokens(line) for line in summary_lines)
+
+    # 예산 초과 시: 오래된 요약부터 버리고, 그래도 넘치면 최근 턴을 요약으로 내림
+    while fixed_tokens + recent_tokens() + summary_tokens() > budget_tokens:
+        if summary_lines:
+            summary_lines.pop(0)
+        elif recent:
+            demoted = recent.pop(0)
+            summary_lines = [compress_message(m, compress_chars) for m in demoted]
+            if fixed_tokens + recent_tokens() + summary_tokens() > budget_tokens:
+                summary_lines = []
+        else:
+            break
+
+    messages = []
+    if summary_lines:
+        messages.append(SystemMessage(content="[이전 대화 요약]\n" + "\n".join(summary_lines)))
+    messages.extend(m for turn in recent for m in turn)
+
+    stats = {
+        "script_tokens": estimate_tokens(script_context),
+        "summary_tokens": summary_tokens(),
+        "recent_tokens": recent_tokens(),
+        "question_tokens": estimate_tokens(user_message),
+        "recent_turns": len(recent),
+        "summarized_lines": len(summary_lines),
+        "dropped_messages": len(history_messages) - len(cleaned),
+    }
+    stats["total_tokens"] = (
+        stats["script_tokens"] + stats["summary_tokens"] + stats["recent_tokens"] + stats["question_tokens"]
+    )
+    return messages, stats
@@ -0,0 +1,272 @@
+import atexit
+import json
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+
+# ======================== 원자적 파일 쓰기 ========================
+def atomic_write_json(path, data):
+    # 임시 파일에 모두 쓰고 fsync 후 rename → 중간에 죽어도 이전 파일 또는 새 파일 중 하나는 온전히 남음
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory):
+    # rename 자체도 디스크에 반영되도록 디렉터리를 fsync (지원하지 않는 OS는 무시)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# ======================== 저장 형식 ========================
+JOURNAL_DIR = ".journal"
+FORMAT_VERSION = 2
+
+
+def journal_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, JOURNAL_DIR, f"{name}l")   # 예: 홍길동_250101-101010.jsonl
+
+
+def pack_conversation(data):
+    # 첫 메시지가 스크립트와 같으면 message_list에서 빼고 표시만 남김 (스크립트 중복 저장 방지)
+    packed = dict(data)
+    packed.pop("message_offset", None)
+    packed.pop("total_messages", None)
+    messages = list(packed.get("message_list", []))
+    script = packed.get("script_context", "")
+    if script and messages and isinstance(messages[0], dict) \
+            and messages[0].get("role") == "ai" and messages[0].get("content") == script:
+        messages = messages[1:]
+        packed["script_message"] = True
+    packed["message_list"] = messages
+    packed["message_count"] = len(messages) + int(packed.get("script_message", False))
+    packed["format"] = FORMAT_VERSION
+    return packed
+
+
+def unpack_conversation(data):
+    # 예전 list 형식 / indent=4 dict 형식 / 새 형식 모두 같은 dict 형태로 변환
+    if isinstance(data, list):
+        return {"script_context": "", "message_list": data}
+    if not isinstance(data, dict):
+        raise ValueError("대화 파일 형식이 잘못되었습니다.")
+    data = dict(data)
+    messages = list(data.get("message_list", []))
+    if data.pop("script_message", False):
+        messages.insert(0, {"role": "ai", "content": data.get("script_context", "")})
+    data["message_list"] = messages
+    data.pop("message_count", None)
+    data.pop("format", None)
+    return data
+
+
+def read_journal(path):
+    # 마지막 줄이 쓰다 만 상태(크래시)라면 그 줄만 버림
+    entries = []
+    try:
+        with open(journal_path(path), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def read_conversation(path):
+    # 본 파일 + 저널을 합쳐 message_list[0]이 스크립트인 기존 형태로 반환
+    with open(path, "r", encoding="utf-8") as f:
+        data = unpack_conversation(json.load(f))
+    messages = data["message_list"]
+    # 압축 직후 저널 삭제 전에 죽었더라도 seq로 이미 반영된 메시지는 건너뜀
+    for entry in read_journal(path):
+        if entry.get("seq", -1) == len(messages):
+            messages.append({"role": entry.get("role"), "content": entry.get("content", "")})
+    return data
+
+
+def _ends_without_newline(path):
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except FileNotFoundError:
+        return False
+
+
+def read_conversation_tail(path, limit):
+    # 헤더 + 최근 limit개 메시지만 반환 (limit이 0/None이면 전체). 앞부분은 필요할 때 read_messages로
+    data = read_conversation(path)
+    messages = data["message_list"]
+    start = max(len(messages) - limit, 0) if limit else 0
+    data["message_list"] = messages[start:]
+    data["message_offset"] = start
+    data["total_messages"] = len(messages)
+    return data
+
+
+def read_messages(path, start, end):
+    return read_conversation(path)["message_list"][max(start, 0):end]
+
+
+# ======================== 대화 저장소 ========================
+class ConversationStore:
+    # 전체 저장은 원자적 교체, 이후 추가 메시지는 저널에 한 줄씩 덧붙이고 일정 개수마다 압축
+    def __init__(self, compact_every=50):
+        self.compact_every = compact_every
+        self._journal_lines = {}
+        self._lock = threading.Lock()
+        self._counters = {"saves": 0, "appended_messages": 0, "compactions": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._counters[key] += amount
+
+    def save(self, path, data, keep_prefix=0):
+        # keep_prefix: 화면에 불러오지 않은 앞부분 메시지 수. 기존 파일에서 가져와 합친 뒤 저장
+        if keep_prefix:
+            older = read_conversation(path)["message_list"][:keep_prefix]
+            data = {**data, "message_list": older + list(data.get("message_list", []))}
+        atomic_write_json(path, pack_conversation(data))
+        self._remove_journal(path)
+        self._count("saves")
+        return data
+
+    def append(self, path, messages, start_index):
+        # message_list[start_index:]에 해당하는 메시지를 저널에 기록. 압축했으면 True
+        if not messages:
+            return False
+        journal = journal_path(path)
+        os.makedirs(os.path.dirname(journal), exist_ok=True)
+        lines = "".join(
+            json.dumps({"seq": start_index + i, "role": m.get("role"), "content": m.get("content", "")},
+                       ensure_ascii=False) + "\n"
+            for i, m in enumerate(messages)
+        )
+        if _ends_without_newline(journal):
+            # 이전에 쓰다 만 줄이 있으면 새 줄에 이어 쓰지 않도록 줄을 끊음
+            lines = "\n" + lines
+        with open(journal, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._count("appended_messages", len(messages))
+
+        with self._lock:
+            if path not in self._journal_lines:
+                self._journal_lines[path] = len(read_journal(path))
+            else:
+                self._journal_lines[path] += len(messages)
+            needs_compaction = self._journal_lines[path] >= self.compact_every
+        if needs_compaction:
+            self.compact(path)
+        return needs_compaction
+
+    def compact(self, path):
+        self.save(path, read_conversation(path))
+        self._count("compactions")
+
+    def delete(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self._remove_journal(path)
+
+    def _remove_journal(self, path):
+        with self._lock:
+            self._journal_lines.pop(path, None)
+        try:
+            os.remove(journal_path(path))
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "open_journals": len(self._journal_lines)}
+
+
+# ======================== 비동기(write-behind) 저장 ========================
+class WriteBehindWriter:
+    # 저장 작업을 백그라운드 스레드 하나에서 순서대로 처리 (채팅 화면은 기다리지 않음)
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0}
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            self._counters["submitted"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                        self._count("completed")
+                    except Exception as e:
+                        print("🔥 대화 저장 실패:", e)
+                        self._count("failed")
+                        future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def flush(self, timeout=10.0):
+        # 종료 시 남은 저장 작업을 마무리 (빈 작업을 넣고 그 완료를 기다림)
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        try:
+            self.submit(lambda: None).result(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "pending": self._queue.qsize()}
+
+
+# 긴 대화를 열 때 처음에 불러올 최근 메시지 수 (0이면 전체)
+CONVERSATION_TAIL_MESSAGES = int(os.getenv("CONVERSATION_TAIL_MESSAGES", "20"))
+
+conversation_store = ConversationStore(compact_every=int(os.getenv("CONVERSATION_COMPACT_EVERY", "50")))
+conversation_writer = WriteBehindWriter()
+atexit.register(conversation_writer.flush)
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+# ======================== 가짜 응답 ========================
+class FakeLLMError(Exception):
+    pass
+
+
+SCRIPT_LINES = [
+    "▶️ 첫인사 및 공감:",
+    "- **공감 멘트**: 고객님, 많이 답답하셨을 것 같습니다. 불편을 드려 정말 죄송합니다.",
+    "- 말씀하신 내용을 정확히 확인해서 빠르게 안내해 드리겠습니다.",
+    "▶️ 상황 설명:",
+    "- **약관 안내**: 관련 규정에 따라 처리 절차를 차근차근 설명드리겠습니다.",
+    "- 접수일로부터 영업일 기준 3일 이내에 담당자가 연락드릴 예정입니다.",
+    "👉 상담 멘트 예시",
+    "> 고객님, 끝까지 책임지고 확인해 드리겠습니다.",
+    "📌 상담 TIP:",
+    "- 고객의 감정을 먼저 인정하고, 사실 관계는 그 다음에 설명하세요.",
+]
+
+FAKE_NAMES = ["김민지", "이서준", "박지우", "최하은", "정도윤", "강서연", "조예준", "윤지아"]
+FAKE_SITUATIONS = [
+    "태아보험 가입 후 출생 신고를 했는데 보험금 청구가 거절되었습니다.",
+    "어린이보험 입원비 청구 후 2주째 지급이 지연되고 있습니다.",
+    "건강보험 갱신 보험료가 예고 없이 크게 올랐다고 항의합니다.",
+    "전자서명으로 계약했는데 본인 서명이 아니라고 주장합니다.",
+]
+
+
+def fake_scenario(rng):
+    return {
+        "name": rng.choice(FAKE_NAMES),
+        "situation": f"{rng.choice(FAKE_SITUATIONS)} (사례 {rng.randint(1000, 9999)})",
+        "emotion": rng.randint(1, 5),
+        "extra_info": "보험업법 및 약관 제3조에 따른 처리 기준을 안내할 수 있습니다.",
+    }
+
+
+def fake_response(messages, rng, response_chars, **kwargs):
+    # 호출 종류를 프롬프트로 대략 구분해 형식이 맞는 응답을 만듦
+    last = messages[-1].content if messages else ""
+    last = last if isinstance(last, str) else str(last)
+
+    if kwargs.get("response_format"):
+        match = re.search(r"(\d+)\s*건", last)
+        count = int(match.group(1)) if match else 1
+        return json.dumps({"scenarios": [fake_scenario(rng) for _ in range(count)]}, ensure_ascii=False)
+
+    if "랜덤 고객 정보" in last:
+        scenario = fake_scenario(rng)
+        return (
+            f"이름: {scenario['name']}\n민원 내용: {scenario['situation']}\n"
+            f"고객 감정 상태: {scenario['emotion']}\n추가 참고 정보: {scenario['extra_info']}"
+        )
+
+    lines = [f"(응답 {rng.randint(100000, 999999)})"]
+    while sum(len(line) + 1 for line in lines) < response_chars:
+        lines.append(SCRIPT_LINES[len(lines) % len(SCRIPT_LINES)])
+    return "\n".join(lines)[:max(response_chars, 1)]
+
+
+def estimate_tokens(text):
+    # 한글은 글자당 약 1토큰으로 근사 (실제 과금 토큰 수와는 다를 수 있음)
+    return max(1, len(text))
+
+
+# ======================== 가짜 채팅 모델 ========================
+class FakeChatModel(BaseChatModel):
+    # OpenAI 호출 없이 지연 시간/속도/스트리밍 단위/오류를 흉내 내는 부하 테스트용 모델
+    model_name: str = "fake"
+    latency_ms: float = 400.0          # 첫 토큰까지 지연(중앙값)
+    latency_sigma: float = 0.5         # 로그정규분포 폭 (0이면 고정 지연)
+    tokens_per_second: float = 60.0    # 스트리밍 속도 (조각 하나 = 약 1토큰)
+    chunk_chars: int = 3               # 스트리밍 조각당 글자 수
+    response_chars: int = 600          # 일반 응답 길이
+    error_rate: float = 0.0            # 호출당 오류 확률
+    seed: Optional[int] = None
+    _rng_instance: Optional[random.Random] = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    @property
+    def _rng(self):
+        if self._rng_instance is None:
+            self._rng_instance = random.Random(self.seed)
+        return self._rng_instance
+
+    # ---------- 시뮬레이션 ----------
+    def _plan(self, messages, **kwargs):
+        # (첫 토큰 지연, 조각 목록, 오류를 낼 조각 위치 또는 None)
+        rng = self._rng
+        if self.latency_sigma > 0:
+            delay = rng.lognormvariate(math.log(max(self.latency_ms, 1) / 1000), self.latency_sigma)
+        else:
+            delay = self.latency_ms / 1000
+        text = fake_response(messages, rng, self.response_chars, **kwargs)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        fail_at = rng.randrange(len(chunks) + 1) if rng.random() < self.error_rate else None
+        return delay, chunks, fail_at
+
+    def _usage(self, messages, chunks):
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = len(chunks)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _chunk(self, index, piece, chunks, messages):
+        message = AIMessageChunk(content=piece)
+        if index == len(chunks) - 1:
+            # 마지막 조각에 사용량/모델명을 실어 보냄 (stream_usage=True와 같은 형태)
+            message = AIMessageChunk(
+                content=piece,
+                usage_metadata=self._usage(messages, chunks),
+                response_metadata={"model_name": self.model_name},
+            )
+        return ChatGenerationChunk(message=message)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, chunks, fail_at = self._plan(messages, **kwargs)
+        time.sleep(delay)
+        for index, piece in enumerate(chunks):
+            if index == fail_at:
+                raise FakeLLMError(f"가짜 LLM 오류 주입 ({index}/{len(chunks)} 조각)")
+            if index:
+                time.sleep(1 / self.tokens_per_second)
+            chunk = self._chunk(index, piece, chunks, messages)
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        if fail_at == len(chunks):
+            raise FakeLLMError("가짜 LLM 오류 주입 (응답 종료 직전)")
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, chunks, fail_at = self._plan(messages, **kwargs)
+        await asyncio.sleep(delay)
+        for index, piece in enumerate(chunks):
+            if index == fail_at:
+                raise FakeLLMError(f"가짜 LLM 오류 주입 ({index}/{len(chunks)} 조각)")
+            if index:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = self._chunk(index, piece, chunks, messages)
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        if fail_at == len(chunks):
+            raise FakeLLMError("가짜 LLM 오류 주입 (응답 종료 직전)")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        pieces = [chunk.message for chunk in self._stream(messages, stop, run_manager, **kwargs)]
+        merged = pieces[0]
+        for piece in pieces[1:]:
+            merged = merged + piece
+        message = AIMessage(
+            content=merged.content,
+            usage_metadata=merged.usage_metadata,
+            response_metadata=merged.response_metadata,
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def create_fake_llm(model="fake"):
+    # 환경 변수로 지연/속도/오류율 조절 (LLM_BACKEND=fake 일 때 get_llm에서 사용)
+    seed = os.getenv("FAKE_LLM_SEED")
+    return FakeChatModel(
+        model_name=f"fake:{model}",
+        latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "400")),
+        latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "60")),
+        chunk_chars=int(os.getenv("FAKE_LLM_CHUNK_CHARS", "3")),
+        response_chars=int(os.getenv("FAKE_LLM_RESPONSE_CHARS", "600")),
+        error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        seed=int(seed) if seed else None,
+    )
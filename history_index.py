@@ -0,0 +1,248 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+from conversation_store import read_conversation
+from history_store import _ImmediateTransaction
+
+
+# ======================== 감정 상태 ========================
+# 저장 파일에는 "😠 화남" 같은 라벨만 있으므로 검색 필터용 숫자로 변환
+EMOTION_LEVELS = {"매우 화남": 5, "화남": 4, "다소 불만": 2, "불만": 3, "평온": 1}
+
+
+def emotion_level(label):
+    label = str(label or "")
+    for text, level in sorted(EMOTION_LEVELS.items(), key=lambda item: -len(item[0])):
+        if text in label:
+            return level
+    return None
+
+
+def case_document(data):
+    # 저장된 대화(JSON)에서 색인할 필드만 추림. 예전 list 형식도 지원
+    if isinstance(data, list):
+        data = {"message_list": data}
+    script_context = data.get("script_context", "") or ""
+    messages = [
+        m.get("content", "") for m in data.get("message_list", [])
+        if isinstance(m, dict) and m.get("content") and m.get("content") != script_context
+    ]
+    return {
+        "customer_name": data.get("customer_name", "") or "",
+        "customer_situation": data.get("customer_situation", "") or "",
+        "extra_info": data.get("extra_info", "") or "",
+        "script_context": script_context,
+        "messages": "\n".join(messages),
+        "emotion_label": data.get("customer_emotion_label", "") or "",
+    }
+
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# ======================== 사용자별 검색 색인 ========================
+class HistoryIndex:
+    # 사용자 폴더의 저장 대화를 SQLite FTS5(trigram)로 색인. FTS5가 없으면 LIKE 검색으로 대체
+    TEXT_COLUMNS = ("customer_name", "customer_situation", "extra_info", "script_context", "messages")
+    RANK_WEIGHTS = (10.0, 5.0, 2.0, 1.0, 1.0)   # 고객명 > 민원 내용 > 참고 정보 > 스크립트/대화
+
+    def __init__(self, path, history_dir, busy_timeout=5.0):
+        self.path = path
+        self.history_dir = history_dir
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.fts = self._create_schema()
+        if self.count() == 0 and os.path.isdir(history_dir) and any(
+            name.endswith(".json") for name in os.listdir(history_dir)
+        ):
+            # 색인이 처음 만들어졌다면 기존 저장 파일로 한 번 채움
+            self.rebuild()
+
+    # ---------- 연결/스키마 ----------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _ImmediateTransaction(self._connect())
+
+    def _create_schema(self):
+        columns = ", ".join(self.TEXT_COLUMNS)
+        with self._write() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cases (
+                    filename TEXT PRIMARY KEY,
+                    customer_name TEXT,
+                    emotion_label TEXT,
+                    emotion_level INTEGER,
+                    mtime REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cases_mtime ON cases (mtime)")
+            try:
+                conn.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS cases_text USING fts5("
+                    f"filename UNINDEXED, {columns}, tokenize='trigram')"
+                )
+                return True
+            except sqlite3.OperationalError as e:
+                # FTS5/trigram을 지원하지 않는 SQLite (3.34 미만 등)
+                print("⚠️ FTS5 trigram을 사용할 수 없어 LIKE 검색으로 대체합니다:", e)
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS cases_text (filename TEXT PRIMARY KEY, {columns})"
+                )
+                return False
+
+    # ---------- 색인 갱신 ----------
+    def upsert(self, filename, data, mtime=None):
+        doc = case_document(data)
+        if mtime is None:
+            path = os.path.join(self.history_dir, filename)
+            mtime = os.path.getmtime(path) if os.path.exists(path) else 0.0
+        with self._write() as conn:
+            self._upsert(conn, filename, doc, mtime)
+
+    def _upsert(self, conn, filename, doc, mtime):
+        conn.execute("DELETE FROM cases WHERE filename = ?", (filename,))
+        conn.execute("DELETE FROM cases_text WHERE filename = ?", (filename,))
+        conn.execute(
+            "INSERT INTO cases (filename, customer_name, emotion_label, emotion_level, mtime) VALUES (?, ?, ?, ?, ?)",
+            (filename, doc["customer_name"], doc["emotion_label"], emotion_level(doc["emotion_label"]), mtime),
+        )
+        conn.execute(
+            f"INSERT INTO cases_text (filename, {', '.join(self.TEXT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            (filename, *(doc[c] for c in self.TEXT_COLUMNS)),
+        )
+
+    def remove(self, filename):
+        with self._write() as conn:
+            conn.execute("DELETE FROM cases WHERE filename = ?", (filename,))
+            conn.execute("DELETE FROM cases_text WHERE filename = ?", (filename,))
+
+    def rebuild(self):
+        # 사용자 폴더 전체를 다시 읽어 색인을 새로 만듦 (기존 데이터 이관/복구용)
+        indexed, failed = 0, 0
+        names = sorted(n for n in os.listdir(self.history_dir) if n.endswith(".json")) \
+            if os.path.isdir(self.history_dir) else []
+        with self._write() as conn:
+            conn.execute("DELETE FROM cases")
+            conn.execute("DELETE FROM cases_text")
+            for name in names:
+                path = os.path.join(self.history_dir, name)
+                try:
+                    data = read_conversation(path)
+                    self._upsert(conn, name, case_document(data), os.path.getmtime(path))
+                    indexed += 1
+                except (OSError, ValueError, AttributeError) as e:
+                    print(f"🔥 색인 실패 ({name}):", e)
+                    failed += 1
+        return {"indexed": indexed, "failed": failed}
+
+    # ---------- 검색 ----------
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+
+    def search(self, keyword="", emotion=None, page=0, page_size=20):
+        # (파일명 목록, 전체 건수) 반환. 검색어가 있으면 관련도순, 없으면 최신순
+        terms = [t for t in str(keyword or "").split() if t]
+        where, params = [], []
+        match_terms = []
+
+        for term in terms:
+            # trigram은 3글자 이상만 MATCH 가능. 짧은 검색어(2글자 이름 등)는 LIKE로 처리
+            if self.fts and len(term) >= 3:
+                match_terms.append('"' + term.replace('"', '""') + '"')
+            else:
+                like = f"%{_escape_like(term)}%"
+                where.append(
+                    "(" + " OR ".join(f"t.{c} LIKE ? ESCAPE '\\'" for c in self.TEXT_COLUMNS) + ")"
+                )
+                params.extend([like] * len(self.TEXT_COLUMNS))
+
+        if match_terms:
+            where.insert(0, "cases_text MATCH ?")
+            params.insert(0, " ".join(match_terms))
+        if emotion:
+            where.append("c.emotion_level = ?")
+            params.append(int(emotion))
+
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        base = f"FROM cases c JOIN cases_text t ON t.filename = c.filename {where_sql}"
+        if match_terms:
+            weights = ", ".join(str(w) for w in self.RANK_WEIGHTS)
+            order = f"ORDER BY bm25(cases_text, 0.0, {weights}), c.mtime DESC"
+        else:
+            order = "ORDER BY c.mtime DESC"
+
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT c.filename {base} {order} LIMIT ? OFFSET ?",
+            (*params, page_size, page * page_size),
+        ).fetchall()
+        return [row[0] for row in rows], total
+
+
+# ======================== 색인 인스턴스 ========================
+# 대화 저장 폴더는 화면(chatbot_comp)과 색인 재생성 CLI가 모두 이 값을 사용 (서로 다른 폴더를 보지 않도록)
+HISTORY_ROOT = os.getenv("HISTORY_ROOT", "/data/complaint/history")
+HISTORY_INDEX_DIR = os.getenv("HISTORY_INDEX_DIR", "/data/complaint/index")
+
+
+def user_history_path(user_folder):
+    return os.path.join(HISTORY_ROOT, user_folder)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_history_index(user_folder):
+    # 사용자별 색인은 프로세스에서 한 번만 열어 재사용
+    with _indexes_lock:
+        index = _indexes.get(user_folder)
+        if index is None:
+            index = HistoryIndex(
+                os.path.join(HISTORY_INDEX_DIR, f"{user_folder}.sqlite"),
+                user_history_path(user_folder),
+            )
+            _indexes[user_folder] = index
+        return index
+
+
+# ======================== 색인 재생성 CLI ========================
+# 사용법: python history_index.py rebuild [--user 홍길동_1234]
+def main():
+    parser = argparse.ArgumentParser(description="저장된 대화 검색 색인 관리")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="특정 사용자 폴더만 재생성 (생략 시 전체)")
+    args = parser.parse_args()
+
+    if args.user:
+        users = [args.user]
+    elif os.path.isdir(HISTORY_ROOT):
+        users = sorted(n for n in os.listdir(HISTORY_ROOT) if os.path.isdir(os.path.join(HISTORY_ROOT, n)))
+    else:
+        users = []
+
+    for user in users:
+        result = get_history_index(user).rebuild()
+        print(f"✅ {user}: {result['indexed']}건 색인 / 실패 {result['failed']}건")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+# langchain_community의 ChatMessageHistory는 이 클래스의 별칭 (커뮤니티 패키지를 가져오지 않도록 직접 사용)
+from langchain_core.chat_history import InMemoryChatMessageHistory as ChatMessageHistory
+
+from conversation_store import CONVERSATION_TAIL_MESSAGES, read_conversation_tail
+
+
+# ======================== 용량 제한 대화 기록 ========================
+def message_size(message):
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    return len(content.encode("utf-8"))
+
+
+class BoundedChatMessageHistory(ChatMessageHistory):
+    # 세션별 바이트 예산을 넘으면 스크립트 이후의 가장 오래된 턴(질문 + 답변)부터 통째로 삭제
+    max_bytes: int = 0
+    trimmed: int = 0
+
+    def add_message(self, message):
+        super().add_message(message)
+        self.trim()
+
+    def size(self):
+        return sum(message_size(m) for m in self.messages)
+
+    def pinned_count(self):
+        # 첫 AI 메시지(스크립트)까지는 항상 유지
+        # 실시간 세션: [민원 정보(human), 스크립트(ai), ...] / 불러온 세션: [스크립트(ai), ...]
+        for index, message in enumerate(self.messages):
+            if message.type == "ai":
+                return index + 1
+        return 0
+
+    def trim(self):
+        if self.max_bytes <= 0:
+            return 0
+        removed = 0
+        total = self.size()
+        start = self.pinned_count()
+        while total > self.max_bytes:
+            # start부터 다음 질문(human) 직전까지가 가장 오래된 턴 하나. 마지막 턴은 남김
+            end = start + 1
+            while end < len(self.messages) and self.messages[end].type != "human":
+                end += 1
+            if end >= len(self.messages):
+                break
+            total -= sum(message_size(m) for m in self.messages[start:end])
+            del self.messages[start:end]
+            removed += end - start
+        self.trimmed += removed
+        return removed
+
+
+# ======================== 저장된 대화 복원 ========================
+def messages_from_conversation(data):
+    # 실제로 LLM에 보낼 메시지만 복원: 스크립트(첫 메시지) + 불러온 최근 메시지
+    message_list = list(data.get("message_list", []))
+    if data.get("message_offset", 0) > 0 and data.get("script_context"):
+        message_list.insert(0, {"role": "ai", "content": data["script_context"]})
+
+    history = ChatMessageHistory()
+    for msg in message_list:
+        if isinstance(msg, dict) and 'role' in msg and 'content' in msg:
+            if msg['role'] == 'user':
+                history.add_user_message(msg['content'])
+            elif msg['role'] == 'ai':
+                history.add_ai_message(msg['content'])
+    return history.messages
+
+
+def load_messages_from_json(path, limit=CONVERSATION_TAIL_MESSAGES):
+    # 저장된 대화 파일(list/dict 형식 + 저널)에서 LLM 대화 기록을 복원
+    try:
+        return messages_from_conversation(read_conversation_tail(path, limit))
+    except ValueError:
+        return []
+
+
+# ======================== 저장소 인터페이스 ========================
+class HistoryBackend:
+    # get_session_history가 사용하는 대화 기록 저장소의 공통 인터페이스
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def __setitem__(self, session_id, history):
+        raise NotImplementedError
+
+    def __delitem__(self, session_id):
+        raise NotImplementedError
+
+    def __getitem__(self, session_id):
+        return self.get(session_id)
+
+    def reset(self, session_id):
+        self[session_id] = ChatMessageHistory()
+
+    def bind_source(self, session_id, path):
+        pass
+
+    def stats(self):
+        return {}
+
+
+# ======================== 메모리 저장소 ========================
+class BoundedHistoryStore(HistoryBackend):
+    # LRU 개수 제한 + 유휴 TTL + 세션별 바이트 예산을 가진 대화 기록 저장소
+    def __init__(self, max_sessions=500, idle_ttl=3600, max_bytes_per_session=256 * 1024):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes_per_session = max_bytes_per_session
+        self._sessions = OrderedDict()   # session_id -> (history, last_access)
+        self._sources = OrderedDict()    # session_id -> 저장된 JSON 경로
+        self._lock = threading.RLock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "rehydrated": 0,
+            "evicted_lru": 0,
+            "evicted_ttl": 0,
+            "trimmed_messages": 0,
+        }
+
+    # ---------- 조회 ----------
+    def get(self, session_id):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+
+            if session_id in self._sessions:
+                history, _ = self._sessions.pop(session_id)
+                self._sessions[session_id] = (history, now)
+                self._counters["hits"] += 1
+                return history
+
+            self._counters["misses"] += 1
+            history = self._new_history(self._rehydrate(session_id))
+            self._sessions[session_id] = (history, now)
+            self._evict_overflow()
+            return history
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    # ---------- 변경 ----------
+    def __setitem__(self, session_id, history):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = (self._new_history(history.messages), time.monotonic())
+            self._evict_overflow()
+
+    def __delitem__(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sources.pop(session_id, None)
+
+    def reset(self, session_id):
+        # 새 민원 시작: 기록을 비우고 연결된 저장 파일도 해제
+        with self._lock:
+            self._sources.pop(session_id, None)
+            self[session_id] = ChatMessageHistory()
+
+    def bind_source(self, session_id, path):
+        # 축출된 세션을 다시 불러올 때 사용할 저장 파일 등록
+        with self._lock:
+            self._sources.pop(session_id, None)
+            self._sources[session_id] = path
+            while len(self._sources) > self.max_sessions * 4:
+                self._sources.popitem(last=False)
+
+    # ---------- 통계 ----------
+    def stats(self):
+        with self._lock:
+            trimmed = sum(h.trimmed for h, _ in self._sessions.values())
+            return {
+                **self._counters,
+                "trimmed_messages": self._counters["trimmed_messages"] + trimmed,
+                "sessions": len(self._sessions),
+                "bytes": sum(h.size() for h, _ in self._sessions.values()),
+            }
+
+    # ---------- 내부 ----------
+    def _new_history(self, messages):
+        history = BoundedChatMessageHistory(messages=list(messages), max_bytes=self.max_bytes_per_session)
+        history.trim()
+        return history
+
+    def _rehydrate(self, session_id):
+        path = self._sources.get(session_id)
+        if not path or not os.path.exists(path):
+            return []
+        try:
+            messages = load_messages_from_json(path)
+        except Exception as e:
+            print(f"🔥 대화 기록 복원 실패 ({path}):", e)
+            return []
+        self._counters["rehydrated"] += 1
+        return messages
+
+    def _drop(self, session_id, reason):
+        history, _ = self._sessions.pop(session_id)
+        self._counters["trimmed_messages"] += history.trimmed
+        self._counters[reason] += 1
+
+    def _expire(self, now):
+        if self.idle_ttl <= 0:
+            return
+        while self._sessions:
+            session_id, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access < self.idle_ttl:
+                break
+            self._drop(session_id, "evicted_ttl")
+
+    def _evict_overflow(self):
+        while self.max_sessions > 0 and len(self._sessions) > self.max_sessions:
+            session_id = next(iter(self._sessions))
+            self._drop(session_id, "evicted_lru")
+
+
+# ======================== SQLite 저장소 ========================
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    # 메시지를 한 줄씩 추가(append)만 하는 SQLite 기반 대화 기록
+    def __init__(self, backend, session_id):
+        self.backend = backend
+        self.session_id = session_id
+
+    @property
+    def messages(self):
+        return self.backend.read_messages(self.session_id)
+
+    def add_messages(self, messages):
+        self.backend.append_messages(self.session_id, messages)
+
+    def clear(self):
+        self.backend.clear_messages(self.session_id)
+
+
+class SQLiteHistoryBackend(HistoryBackend):
+    # WAL 모드 SQLite 파일 하나를 여러 프로세스/워커가 함께 읽고 쓰는 저장소
+    def __init__(self, path, idle_ttl=7 * 24 * 3600, busy_timeout=5.0, prune_every=500):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.busy_timeout = busy_timeout
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {"reads": 0, "appended_messages": 0, "replaced": 0, "pruned_sessions": 0,
+                          "pruned_messages": 0}
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        with self._write() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id)"
+            )
+        self.prune_idle()
+
+    # ---------- 연결 ----------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 스레드마다 연결을 하나씩 두고, 트랜잭션은 직접 관리
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _ImmediateTransaction(self._connect())
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._counters[key] += amount
+
+    # ---------- 메시지 입출력 ----------
+    def read_messages(self, session_id):
+        rows = self._connect().execute(
+            "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        ).fetchall()
+        self._count("reads")
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def append_messages(self, session_id, messages):
+        now = time.time()
+        rows = [
+            (session_id, json.dumps(message_to_dict(m), ensure_ascii=False), now)
+            for m in messages
+        ]
+        if not rows:
+            return
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, message, created_at) VALUES (?, ?, ?)",
+                rows,
+            )
+        self._count("appended_messages", len(rows))
+
+        if self.prune_every and self._counters["appended_messages"] % self.prune_every < len(rows):
+            self.prune_idle()
+
+    def clear_messages(self, session_id):
+        with self._write() as conn:
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+
+    # ---------- 저장소 인터페이스 ----------
+    def get(self, session_id):
+        return SQLiteChatMessageHistory(self, session_id)
+
+    def __setitem__(self, session_id, history):
+        # 불러온 대화로 세션을 교체할 때만 삭제 + 일괄 삽입을 한 트랜잭션으로 처리
+        now = time.time()
+        rows = [
+            (session_id, json.dumps(message_to_dict(m), ensure_ascii=False), now)
+            for m in history.messages
+        ]
+        with self._write() as conn:
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, message, created_at) VALUES (?, ?, ?)",
+                rows,
+            )
+        self._count("replaced")
+
+    def __delitem__(self, session_id):
+        self.clear_messages(session_id)
+
+    def __contains__(self, session_id):
+        row = self._connect().execute(
+            "SELECT 1 FROM chat_messages WHERE session_id = ? LIMIT 1", (session_id,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        row = self._connect().execute("SELECT COUNT(DISTINCT session_id) FROM chat_messages").fetchone()
+        return row[0]
+
+    def prune_idle(self):
+        # 마지막 메시지 이후 idle_ttl이 지난 세션 삭제
+        if self.idle_ttl <= 0:
+            return 0
+        # DELETE의 rowcount는 메시지 수이므로, 세션 수는 같은 트랜잭션 안에서 먼저 셈
+        cutoff = time.time() - self.idle_ttl
+        idle_sessions = """
+            SELECT session_id FROM chat_messages
+            GROUP BY session_id HAVING MAX(created_at) < ?
+        """
+        with self._write() as conn:
+            pruned = conn.execute(f"SELECT COUNT(*) FROM ({idle_sessions})", (cutoff,)).fetchone()[0]
+            cursor = conn.execute(
+                f"DELETE FROM chat_messages WHERE session_id IN ({idle_sessions})", (cutoff,)
+            )
+        self._count("pruned_sessions", pruned)
+        self._count("pruned_messages", max(cursor.rowcount, 0))
+        return pruned
+
+    def stats(self):
+        conn = self._connect()
+        sessions, messages = conn.execute(
+            "SELECT COUNT(DISTINCT session_id), COUNT(*) FROM chat_messages"
+        ).fetchone()
+        with self._lock:
+            return {**self._counters, "sessions": sessions, "messages": messages}
+
+
+class _ImmediateTransaction:
+    # BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡아 여러 프로세스의 동시 쓰기를 직렬화
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+# ======================== 저장소 선택 ========================
+def create_history_backend():
+    # HISTORY_BACKEND=memory(기본) | sqlite
+    backend = os.getenv("HISTORY_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteHistoryBackend(
+            os.getenv("HISTORY_DB_PATH", "/data/complaint/session_history.sqlite"),
+            idle_ttl=int(os.getenv("HISTORY_DB_IDLE_TTL", str(7 * 24 * 3600))),
+        )
+    return BoundedHistoryStore(
+        max_sessions=int(os.getenv("HISTORY_MAX_SESSIONS", "500")),
+        idle_ttl=int(os.getenv("HISTORY_IDLE_TTL", "3600")),
+        max_bytes_per_session=int(os.getenv("HISTORY_MAX_BYTES", str(256 * 1024))),
+    )
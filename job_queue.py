@@ -0,0 +1,406 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from history_store import _ImmediateTransaction
+from metrics import record_job, record_job_queue
+
+# ======================== 생성 작업 큐 ========================
+# 버튼을 누른 화면(rerun)과 분리해서 생성 작업을 SQLite 작업 큐 + 워커 스레드 풀에서 실행
+# 화면이 rerun/새로고침돼도 작업은 계속 진행되고, 진행 중인 결과(progress)와 최종 결과가 DB에 남음
+# 화면은 작업 id로 진행 상황을 폴링하고, 끝난 결과를 상담 건(message_list)에 한 번만 붙임(attached_at)
+#
+# state: queued(대기) → running(실행 중) → done(완료) / cancelled(취소)
+# status: 완료된 결과의 상태 (ok / error / busy / timeout / cancelled)
+# 취소 요청은 DB(cancel_requested)에 남기므로 다른 프로세스의 워커가 실행 중인 작업도 진행 상황을 저장할 때 중단
+#
+# shared=False(기본): 이 JobQueue가 넣은 작업만 실행. 멈춘 다른 프로세스의 작업은 오류(worker stopped)로 끝냄
+# shared=True: 같은 DB 파일을 쓰는 모든 프로세스의 워커가 아무 작업이나 가져감 (멈춘 프로세스의 작업도 이어서 실행)
+#   생성 결과가 쌓이는 대화 기록이 프로세스 밖에 있을 때만 사용 (생성 서비스 사용 또는 HISTORY_BACKEND=sqlite)
+FINISHED_STATES = ("done", "cancelled")
+
+
+class JobQueue:
+    # runner(job): 진행 중인 결과 전체(스냅숏)를 차례로 내보내고, 끝나면 상태(status)를 반환하는 제너레이터
+    def __init__(self, path, runner, workers=4, busy_timeout=5.0, poll_interval=1.0,
+                 progress_interval=0.3, stale_after=300.0, max_attempts=2, retention=7 * 24 * 3600,
+                 shared=False):
+        self.path = path
+        self.runner = runner
+        self.workers = workers
+        self.shared = shared
+        self.instance_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.busy_timeout = busy_timeout
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._started_at = None
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        with self._write() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS generation_jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    case_key TEXT NOT NULL DEFAULT '',
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    status TEXT,
+                    progress TEXT NOT NULL DEFAULT '',
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL,
+                    attached_at REAL,
+                    submitter TEXT NOT NULL DEFAULT '',
+                    cancel_requested INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # 이전 버전에서 만든 파일에는 없는 열 추가
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(generation_jobs)")}
+            if "submitter" not in columns:
+                conn.execute("ALTER TABLE generation_jobs ADD COLUMN submitter TEXT NOT NULL DEFAULT ''")
+            if "cancel_requested" not in columns:
+                conn.execute("ALTER TABLE generation_jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_generation_jobs_state ON generation_jobs (state, created_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_generation_jobs_owner ON generation_jobs (owner, attached_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_generation_jobs_session ON generation_jobs (session_id, kind)"
+            )
+        self.prune()
+
+    # ---------- 연결 ----------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _ImmediateTransaction(self._connect())
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    # ---------- 화면 쪽 ----------
+    def submit(self, kind, payload, owner, session_id, case_key=""):
+        # 같은 화면 세션에서 같은 요청(kind, payload)이 아직 진행 중이거나 끝났지만 붙이지 않았으면
+        # 새로 넣지 않고 그 작업 id를 돌려줌 (rerun으로 버튼 처리가 두 번 돌아도 작업은 하나)
+        job_id = uuid.uuid4().hex
+        payload_json = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        with self._write() as conn:
+            existing = conn.execute(
+                """
+                SELECT id FROM generation_jobs
+                WHERE session_id = ? AND kind = ? AND case_key = ? AND payload = ?
+                  AND attached_at IS NULL AND state != 'cancelled'
+                ORDER BY created_at DESC LIMIT 1
+                """,
+                (session_id, kind, case_key or "", payload_json),
+            ).fetchone()
+            if existing is not None:
+                return existing[0]
+            conn.execute(
+                """
+                INSERT INTO generation_jobs (id, kind, owner, session_id, case_key, payload, state, created_at,
+                                             submitter)
+                VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)
+                """,
+                (job_id, kind, owner, session_id, case_key or "", payload_json, time.time(), self.instance_id),
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        return self._row(self._connect().execute(
+            "SELECT * FROM generation_jobs WHERE id = ?", (job_id,)
+        ).fetchone())
+
+    def unattached(self, owner, session_id=None, case_key=None, kinds=None):
+        # 아직 상담 건에 붙이지 않은 작업 (진행 중인 작업 포함), 요청 순서대로
+        query = "SELECT * FROM generation_jobs WHERE owner = ? AND attached_at IS NULL AND state != 'cancelled'"
+        params = [owner]
+        if session_id is not None:
+            query += " AND session_id = ?"
+            params.append(session_id)
+        if case_key is not None:
+            query += " AND case_key = ?"
+            params.append(case_key)
+        if kinds:
+            query += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        rows = self._connect().execute(query + " ORDER BY created_at", params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def mark_attached(self, job_id):
+        # 여러 탭/rerun이 같은 결과를 두 번 붙이지 않도록, 처음 표시한 쪽만 True
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE generation_jobs SET attached_at = ? WHERE id = ? AND attached_at IS NULL",
+                (time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id):
+        # 대기 중이면 바로 취소, 실행 중이면 (어느 프로세스의) 워커든 다음에 진행 상황을 저장할 때 중단
+        self._cancel_where("id = ?", (job_id,))
+
+    def cancel_session(self, session_id):
+        # 새 민원/다른 대화 불러오기/로그아웃 시 해당 화면 세션의 작업을 모두 취소
+        # 끝났지만 아직 붙이지 않은 결과 중 저장된 상담 건이 없는 것(case_key 없음)은 붙일 곳이 없으므로
+        # 붙인 것으로 처리해서 버림 (새 민원 화면에서 이전 스크립트/답변이 다시 붙지 않도록)
+        # 저장된 상담 건의 결과는 그 대화를 다시 불러올 때 붙임
+        # 실행 중인 작업은 워커가 끝낼 때 취소 요청을 같은 트랜잭션에서 확인하므로, 여기서 끝난 작업은 버리고
+        # 아직 실행 중인 작업은 취소로 끝남
+        with self._write() as conn:
+            self._cancel_where("session_id = ?", (session_id,), conn)
+            conn.execute(
+                """
+                UPDATE generation_jobs SET attached_at = ?
+                WHERE session_id = ? AND state = 'done' AND attached_at IS NULL AND case_key = ''
+                """,
+                (time.time(), session_id),
+            )
+
+    def _cancel_where(self, where, params, conn=None):
+        if conn is None:
+            with self._write() as conn:
+                return self._cancel_where(where, params, conn)
+        conn.execute(
+            f"""
+            UPDATE generation_jobs SET state = 'cancelled', status = 'cancelled', finished_at = ?
+            WHERE {where} AND state = 'queued'
+            """,
+            (time.time(), *params),
+        )
+        conn.execute(
+            f"UPDATE generation_jobs SET cancel_requested = 1 WHERE {where} AND state = 'running'", params
+        )
+
+    # ---------- 워커 ----------
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._started_at = time.perf_counter()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, args=(f"{os.getpid()}-{index}",),
+                                          name=f"generation-worker-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        print(f"🧵 생성 작업 큐 시작 (워커 {self.workers}개, {self.path})")
+        self._publish_stats()
+
+    def _claim(self, worker):
+        # 가장 오래 기다린 작업 하나를 가져옴. 멈춘 워커(heartbeat 끊김)의 작업은 다시 실행
+        now = time.time()
+        scope, params = "", [now - self.stale_after]
+        with self._write() as conn:
+            if not self.shared:
+                # 다른 프로세스의 작업은 그 프로세스의 대화 기록이 필요하므로 가져오지 않고, 멈춘 것만 정리
+                conn.execute(
+                    """
+                    UPDATE generation_jobs SET state = 'done', status = 'error', error = ?, finished_at = ?
+                    WHERE submitter != ? AND ((state = 'running' AND heartbeat_at < ?)
+                                              OR (state = 'queued' AND created_at < ?))
+                    """,
+                    ("worker stopped", now, self.instance_id, now - self.stale_after, now - self.stale_after),
+                )
+                scope = " AND submitter = ?"
+                params.append(self.instance_id)
+            row = conn.execute(
+                f"""
+                SELECT * FROM generation_jobs
+                WHERE (state = 'queued' OR (state = 'running' AND heartbeat_at < ?)){scope}
+                ORDER BY created_at LIMIT 1
+                """,
+                params,
+            ).fetchone()
+            if row is None:
+                return None
+            if row["cancel_requested"]:
+                # 실행하던 워커가 멈추기 전에 취소된 작업
+                conn.execute(
+                    """
+                    UPDATE generation_jobs SET state = 'cancelled', status = 'cancelled', finished_at = ?
+                    WHERE id = ?
+                    """,
+                    (now, row["id"]),
+                )
+                return None
+            if row["attempts"] >= self.max_attempts:
+                conn.execute(
+                    """
+                    UPDATE generation_jobs SET state = 'done', status = 'error', error = ?, finished_at = ?
+                    WHERE id = ?
+                    """,
+                    ("worker stopped", now, row["id"]),
+                )
+                return None
+            conn.execute(
+                """
+                UPDATE generation_jobs
+                SET state = 'running', worker = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?,
+                    progress = ''
+                WHERE id = ?
+                """,
+                (worker, now, now, row["id"]),
+            )
+        job = self._row(row)
+        if job["state"] == "running":
+            print(f"♻️ 멈춘 생성 작업 재실행: {job['id']} ({job['kind']})")
+        job["started_at"] = now
+        return job
+
+    def _flush(self, job_id, progress):
+        # 진행 상황/heartbeat 저장. 그 사이 들어온 취소 요청이 있으면 True
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE generation_jobs SET progress = ?, heartbeat_at = ? WHERE id = ?",
+                (progress, time.time(), job_id),
+            )
+            return bool(conn.execute(
+                "SELECT cancel_requested FROM generation_jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0])
+
+    def _finish(self, job_id, status, progress, error):
+        # 끝나기 직전에 들어온 취소 요청도 같은 트랜잭션에서 확인해 취소로 기록. 최종 status 반환
+        now = time.time()
+        with self._write() as conn:
+            if conn.execute("SELECT cancel_requested FROM generation_jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+                status = "cancelled"
+            conn.execute(
+                """
+                UPDATE generation_jobs
+                SET state = ?, status = ?, progress = ?, error = ?, heartbeat_at = ?, finished_at = ?
+                WHERE id = ?
+                """,
+                ("cancelled" if status == "cancelled" else "done", status, progress, error, now, now, job_id),
+            )
+        return status
+
+    def _work(self, worker):
+        while True:
+            try:
+                job = self._claim(worker)
+            except sqlite3.Error as e:
+                print("🔥 생성 작업 가져오기 실패:", e)
+                job = None
+            if job is None:
+                # 다른 프로세스가 넣은 작업도 가져가도록 알림이 없어도 주기적으로 확인
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._busy += 1
+        self._publish_stats()
+        progress, status, error = "", "error", None
+        runner = self.runner(job)
+        try:
+            last_flush = 0.0
+            while True:
+                try:
+                    progress = next(runner)
+                except StopIteration as stop:
+                    status = stop.value or "ok"
+                    break
+                if time.perf_counter() - last_flush >= self.progress_interval:
+                    if self._flush(job["id"], progress):
+                        runner.close()
+                        status = "cancelled"
+                        break
+                    last_flush = time.perf_counter()
+        except Exception as e:
+            error = repr(e)
+            print(f"🔥 생성 작업 실패 ({job['kind']} {job['id']}):", e)
+        finally:
+            run_seconds = time.perf_counter() - started_at
+            with self._lock:
+                self._busy -= 1
+                self._busy_seconds += run_seconds
+        status = self._finish(job["id"], status, progress, error)
+        record_job(job["kind"], status, job["started_at"] - job["created_at"], run_seconds)
+        self._publish_stats()
+
+    # ---------- 관리 ----------
+    def prune(self):
+        # 끝난 지 retention초가 지난 작업 삭제
+        if self.retention <= 0:
+            return 0
+        with self._write() as conn:
+            cursor = conn.execute(
+                "DELETE FROM generation_jobs WHERE state IN ('done', 'cancelled') AND finished_at < ?",
+                (time.time() - self.retention,),
+            )
+        return cursor.rowcount
+
+    def _publish_stats(self):
+        try:
+            stats = self.stats()
+        except sqlite3.Error:
+            return
+        record_job_queue(stats["queued"], stats["busy_workers"], stats["utilization"])
+
+    def stats(self):
+        # 대기열 깊이(queued), 실행 중, 워커 사용률(시작 이후 워커 시간 중 작업을 실행한 비율)
+        counts = dict(self._connect().execute(
+            "SELECT state, COUNT(*) FROM generation_jobs GROUP BY state"
+        ).fetchall())
+        oldest = self._connect().execute(
+            "SELECT MIN(created_at) FROM generation_jobs WHERE state = 'queued'"
+        ).fetchone()[0]
+        with self._lock:
+            busy = self._busy
+            uptime = time.perf_counter() - self._started_at if self._started_at else 0.0
+            busy_seconds = self._busy_seconds
+        capacity = uptime * self.workers
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "cancelled": counts.get("cancelled", 0),
+            "oldest_wait": round(time.time() - oldest, 3) if oldest else 0.0,
+            "workers": self.workers,
+            "busy_workers": busy,
+            "utilization": round(min(1.0, busy_seconds / capacity), 3) if capacity else 0.0,
+        }
@@ -0,0 +1,391 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import streamlit as st
+
+from job_queue import FINISHED_STATES, JobQueue
+from metrics import start_exporters
+
+# ======================== 설정 ========================
+# 화면(Streamlit)이 생성 기능을 호출하는 얇은 클라이언트
+# LLM_SERVICE_URL 미설정: 같은 프로세스에서 llm_comp 직접 호출 (기존 단일 컨테이너 배포)
+# LLM_SERVICE_URL 설정: 생성 서버(service_server.py)에 HTTP/SSE로 요청 (화면과 생성 작업을 따로 확장)
+LLM_SERVICE_URL = os.getenv("LLM_SERVICE_URL", "").rstrip("/")
+LLM_SERVICE_TOKEN = os.getenv("LLM_SERVICE_TOKEN", "")
+LLM_SERVICE_TIMEOUT = float(os.getenv("LLM_SERVICE_TIMEOUT", "180"))
+# 로컬 모드에서 시작 직후 백그라운드로 llm_comp 가져오기 + 체인 구성 (첫 화면은 기다리지 않음)
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") == "1"
+
+SERVICE_ERROR_RESPONSE = "❌ 생성 서버에 연결하지 못했습니다. 관리자에게 문의해 주세요."
+
+ERROR_MESSAGES = {
+    "script": "🔥 민원 응대 스크립트 생성 중 오류가 발생했습니다. 콘솔 로그를 확인해 주세요.",
+    "chat": "🔥 추가 질문 처리 중 오류가 발생했습니다. 콘솔 로그를 확인해 주세요.",
+    "kakao": "🔥 카카오톡 메시지 생성 중 오류가 발생했습니다. 콘솔 로그를 확인해 주세요.",
+}
+ERROR_MESSAGES["kakao_variants"] = ERROR_MESSAGES["kakao"]
+
+
+def local_service():
+    # 원격 모드에서는 LangChain/모델 클라이언트를 화면 프로세스에 불러오지 않음
+    import llm_comp
+    return llm_comp
+
+
+def warm_up_local():
+    # 첫 생성 요청이 llm_comp 가져오기/모델 클라이언트 구성을 기다리지 않도록 미리 준비
+    try:
+        local_service().warm_up()
+    except Exception as e:
+        print("🔥 LLM 워밍업 실패:", e)
+
+
+def session_args():
+    # 생성 함수에 명시적으로 넘길 현재 화면의 세션 정보
+    return {
+        "session_id": st.session_state.get("session_id"),
+        "consultant_name": st.session_state.get("user_name", "상담원"),
+        "extra_info": st.session_state.get("extra_info", ""),
+    }
+
+
+def show_status(status, kind):
+    if status == "error":
+        st.error(ERROR_MESSAGES[kind])
+
+
+# ======================== HTTP ========================
+def service_request(method, path, payload=None, accept="application/json"):
+    headers = {"Accept": accept}
+    data = None
+    if payload is not None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    if LLM_SERVICE_TOKEN:
+        headers["Authorization"] = f"Bearer {LLM_SERVICE_TOKEN}"
+    request = urllib.request.Request(f"{LLM_SERVICE_URL}{path}", data=data, headers=headers, method=method)
+    return urllib.request.urlopen(request, timeout=LLM_SERVICE_TIMEOUT)
+
+
+def service_json(method, path, payload=None):
+    with service_request(method, path, payload) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def service_events(path, payload):
+    # SSE 응답을 (이벤트 이름, 데이터)로 읽음. 제너레이터를 닫으면 연결도 끊겨 서버 쪽 생성이 정리됨
+    with service_request("POST", path, payload, accept="text/event-stream") as response:
+        event, lines = "message", []
+        for raw in response:
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                lines.append(line[5:].lstrip())
+            elif not line and lines:
+                yield event, json.loads("\n".join(lines))
+                event, lines = "message", []
+
+
+def call_session(method, path, payload=None):
+    # 세션 정리/복원 요청이 실패해도 화면은 계속 동작 (다음 생성에서 서버 기록으로 이어짐)
+    try:
+        return service_json(method, path, payload)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print(f"🔥 생성 서버 세션 요청 실패 ({method} {path}):", e)
+        return None
+
+
+# ======================== 생성 스트림 ========================
+# payload는 생성 서버 요청 본문과 같은 형식. 화면 세션 상태를 읽지 않으므로 작업 큐 워커에서도 사용
+TEXT_ROUTES = {"script": "/v1/script", "chat": "/v1/chat", "kakao": "/v1/kakao"}
+
+
+def local_chunks(kind, payload):
+    service = local_service()
+    session_id = payload["session_id"]
+    if kind == "script":
+        return service.get_script_response(
+            payload["name"], payload["situation"], payload["emotion"], payload.get("regenerate", False),
+            session_id=session_id, consultant_name=payload.get("consultant_name"),
+            extra_info=payload.get("extra_info"),
+        )
+    if kind == "chat":
+        return service.get_chatbot_response(payload["message"], payload.get("script_context", ""),
+                                            session_id=session_id)
+    return service.get_kakao_response(payload["script_context"], payload.get("message_list", []),
+                                      session_id=session_id)
+
+
+def text_stream(kind, payload, outcome):
+    # 조각을 흘려보내고, 끝나면 outcome["status"]에 결과 상태(ok/error/busy/timeout) 기록
+    if not LLM_SERVICE_URL:
+        text = ""
+        for chunk in local_chunks(kind, payload):
+            text += chunk
+            yield chunk
+        outcome["status"] = local_service().response_status(text)
+        return
+
+    outcome["status"] = "error"
+    try:
+        for event, data in service_events(TEXT_ROUTES[kind], payload):
+            if event == "chunk":
+                yield data["text"]
+            elif event == "done":
+                outcome["status"] = data["status"]
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print(f"🔥 생성 서버 호출 실패 ({TEXT_ROUTES[kind]}):", e)
+        yield SERVICE_ERROR_RESPONSE
+
+
+def variant_stream(payload, outcome):
+    # (유형, 조각), 유형이 끝나면 (유형, None). 오류로 끝난 유형이 있으면 outcome["status"] = error
+    failed = False
+    if not LLM_SERVICE_URL:
+        service = local_service()
+        texts = {}
+        for style, chunk in service.stream_kakao_variants(payload["script_context"], payload.get("message_list", []),
+                                                          payload.get("styles"), session_id=payload["session_id"]):
+            if chunk is None:
+                failed = failed or service.response_status(texts.get(style, "")) == "error"
+            else:
+                texts[style] = texts.get(style, "") + chunk
+            yield style, chunk
+        outcome["status"] = "error" if failed else "ok"
+        return
+
+    pending = list(payload.get("styles") or kakao_style_titles())
+    try:
+        for event, data in service_events("/v1/kakao", {**payload, "variants": True}):
+            if event == "chunk":
+                yield data["style"], data["text"]
+            elif event == "style_done":
+                failed = failed or data["status"] == "error"
+                if data["style"] in pending:
+                    pending.remove(data["style"])
+                yield data["style"], None
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print("🔥 생성 서버 호출 실패 (/v1/kakao):", e)
+        failed = True
+        for style in pending:
+            yield style, SERVICE_ERROR_RESPONSE
+            yield style, None
+    outcome["status"] = "error" if failed else "ok"
+
+
+# ======================== 생성 ========================
+def with_status(chunks, outcome, kind):
+    yield from chunks
+    show_status(outcome.get("status"), kind)
+
+
+def script_payload(name, situation, emotion_level, regenerate=False):
+    return {"name": name, "situation": situation, "emotion": emotion_level, "regenerate": regenerate,
+            **session_args()}
+
+
+def chat_payload(user_message, script_context=""):
+    return {"session_id": session_args()["session_id"], "message": user_message, "script_context": script_context}
+
+
+def kakao_payload(script_context, message_list, styles=None):
+    payload = {"session_id": session_args()["session_id"], "script_context": script_context,
+               "message_list": list(message_list)}
+    if styles:
+        payload["styles"] = list(styles)
+    return payload
+
+
+def get_script_response(name, situation, emotion_level, regenerate=False):
+    outcome = {}
+    payload = script_payload(name, situation, emotion_level, regenerate)
+    return with_status(text_stream("script", payload, outcome), outcome, "script")
+
+
+def get_chatbot_response(user_message, script_context=""):
+    outcome = {}
+    return with_status(text_stream("chat", chat_payload(user_message, script_context), outcome), outcome, "chat")
+
+
+def get_kakao_response(script_context, message_list):
+    outcome = {}
+    return with_status(text_stream("kakao", kakao_payload(script_context, message_list), outcome), outcome, "kakao")
+
+
+def stream_kakao_variants(script_context, message_list, styles=None):
+    # (유형, 조각) 이벤트, 유형이 끝나면 (유형, None). 오류로 끝난 유형이 있으면 안내 한 번 표시
+    outcome = {}
+    payload = kakao_payload(script_context, message_list, styles)
+    return with_status(variant_stream(payload, outcome), outcome, "kakao")
+
+
+def get_random_customer_info():
+    session_id = st.session_state.get("session_id")
+    if not LLM_SERVICE_URL:
+        return local_service().get_random_customer_info(session_id)
+    try:
+        return service_json("POST", "/v1/scenario", {"session_id": session_id})
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print("🔥 랜덤 민원 요청 실패:", e)
+        return {}
+
+
+_style_titles = {}
+
+def kakao_style_titles():
+    # 유형 키 -> 제목. 원격 모드에서는 서버 설정을 한 번만 받아 둠
+    if not _style_titles:
+        if not LLM_SERVICE_URL:
+            _style_titles.update({style: title for style, (title, _) in local_service().KAKAO_STYLES.items()})
+        else:
+            try:
+                _style_titles.update(service_json("GET", "/v1/kakao/styles"))
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                print("🔥 카카오톡 유형 목록 요청 실패:", e)
+    return dict(_style_titles)
+
+
+# ======================== 백그라운드 생성 작업 ========================
+# 생성은 버튼 처리 중에 직접 하지 않고 작업 큐(job_queue.py)에 넣은 뒤 진행 상황을 폴링해서 표시
+# rerun/새로고침으로 화면이 끊겨도 작업은 워커에서 끝까지 진행되고, 결과는 다음 화면에서 상담 건에 붙임
+JOB_POLL_INTERVAL = float(os.getenv("GENERATION_POLL_INTERVAL", "0.2"))
+
+
+def run_job(job):
+    # 작업 큐 워커에서 실행: 지금까지의 결과 전체를 차례로 내보내고 결과 상태를 반환
+    # kakao_variants는 유형별 텍스트를 JSON으로 저장
+    outcome = {}
+    if job["kind"] == "kakao_variants":
+        texts = {}
+        for style, chunk in variant_stream(job["payload"], outcome):
+            if chunk is not None:
+                texts[style] = texts.get(style, "") + chunk
+                yield json.dumps(texts, ensure_ascii=False)
+    else:
+        text = ""
+        for chunk in text_stream(job["kind"], job["payload"], outcome):
+            text += chunk
+            yield text
+    return outcome.get("status", "error")
+
+
+# 작업 파일을 여러 UI 프로세스가 같이 쓸 때, 다른 프로세스가 넣은 작업도 실행하려면 대화 기록이 프로세스 밖에 있어야 함
+# (생성 서비스 사용 또는 HISTORY_BACKEND=sqlite). 로컬 메모리 기록이면 각 프로세스는 자기가 넣은 작업만 실행
+GENERATION_JOBS_SHARED = bool(LLM_SERVICE_URL) or os.getenv("HISTORY_BACKEND", "memory").lower() == "sqlite"
+
+generation_jobs = JobQueue(
+    os.getenv("GENERATION_JOBS_PATH", "/data/complaint/generation_jobs.sqlite"),
+    run_job,
+    workers=int(os.getenv("GENERATION_WORKERS", "4")),
+    stale_after=float(os.getenv("GENERATION_STALE_AFTER", "300")),
+    retention=int(os.getenv("GENERATION_JOB_RETENTION", str(7 * 24 * 3600))),
+    shared=GENERATION_JOBS_SHARED,
+)
+generation_jobs.start()
+if not LLM_SERVICE_URL and LLM_WARMUP:
+    threading.Thread(target=warm_up_local, name="llm-warmup", daemon=True).start()
+# METRICS_PORT 설정 시 작업 큐 지표(대기열 깊이/워커 사용률)도 /metrics로 내보냄
+start_exporters()
+
+
+def submit_job(kind, payload, case_key=""):
+    # kind: script / chat / kakao / kakao_variants. 작업 id를 반환
+    return generation_jobs.submit(kind, payload, st.session_state["user_folder"], payload["session_id"], case_key)
+
+
+def get_job(job_id):
+    return generation_jobs.get(job_id)
+
+
+def pending_jobs(session_id=None, case_key=None, kinds=None):
+    return generation_jobs.unattached(st.session_state["user_folder"], session_id, case_key, kinds)
+
+
+def mark_job_attached(job_id):
+    return generation_jobs.mark_attached(job_id)
+
+
+def job_queue_stats():
+    return generation_jobs.stats()
+
+
+def follow_job(job_id):
+    # 작업이 끝날 때까지 진행 결과가 바뀔 때마다 작업 정보를 내보냄 (마지막은 항상 끝난 작업)
+    last = None
+    while True:
+        job = generation_jobs.get(job_id)
+        if job is None:
+            return
+        finished = job["state"] in FINISHED_STATES
+        if finished or job["progress"] != last:
+            last = job["progress"]
+            yield job
+        if finished:
+            return
+        time.sleep(JOB_POLL_INTERVAL)
+
+
+def job_text_chunks(job_id):
+    # 텍스트 작업의 진행 결과를 증가분 조각으로 바꿈 (스트리밍 표시 함수에 그대로 전달)
+    shown = ""
+    job = None
+    for job in follow_job(job_id):
+        progress = job["progress"]
+        if progress.startswith(shown) and len(progress) > len(shown):
+            yield progress[len(shown):]
+            shown = progress
+    if job is not None:
+        show_status(job["status"], job["kind"])
+
+
+def job_variant_events(job_id):
+    # kakao_variants 작업을 (유형, 조각) / 끝나면 (유형, None) 이벤트로 바꿈
+    shown = {}
+    job = None
+    for job in follow_job(job_id):
+        for style, text in json.loads(job["progress"] or "{}").items():
+            if text.startswith(shown.get(style, "")) and len(text) > len(shown.get(style, "")):
+                yield style, text[len(shown.get(style, "")):]
+                shown[style] = text
+    if job is not None:
+        for style in job["payload"].get("styles") or kakao_style_titles():
+            yield style, None
+        show_status(job["status"], job["kind"])
+
+
+# ======================== 세션 ========================
+def load_session(conversation, source=None):
+    # 저장된 대화를 불러오면 진행 중이던 생성(대기 중인 작업 포함)을 취소하고 LLM 대화 기록을 교체
+    session_id = st.session_state.session_id
+    generation_jobs.cancel_session(session_id)
+    if not LLM_SERVICE_URL:
+        return local_service().load_session(session_id, conversation, source)
+    call_session("PUT", f"/v1/sessions/{session_id}", {"conversation": conversation, "source": source})
+
+
+def bind_session_source(source):
+    session_id = st.session_state.session_id
+    if not LLM_SERVICE_URL:
+        return local_service().bind_session_source(session_id, source)
+    call_session("POST", f"/v1/sessions/{session_id}/source", {"source": source})
+
+
+def reset_session():
+    session_id = st.session_state.session_id
+    generation_jobs.cancel_session(session_id)
+    if not LLM_SERVICE_URL:
+        return local_service().reset_session(session_id)
+    call_session("POST", f"/v1/sessions/{session_id}/reset")
+
+
+def delete_session():
+    session_id = st.session_state.session_id
+    generation_jobs.cancel_session(session_id)
+    if not LLM_SERVICE_URL:
+        return local_service().delete_session(session_id)
+    call_session("DELETE", f"/v1/sessions/{session_id}")
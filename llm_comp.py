@@ -1,13 +1,27 @@
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_community.chat_models import ChatOpenAI
-from functools import lru_cache
-import streamlit as st
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler
 import os
+import time
+import json
+import hashlib
+import atexit
+import asyncio
+import queue
+import threading
+from functools import lru_cache
 from dotenv import load_dotenv
+from metrics import LLMMetricsHandler, record_cancel, record_queue_wait, record_retry, record_stream, start_exporters
+from history_store import create_history_backend, messages_from_conversation
+from langchain_core.chat_history import InMemoryChatMessageHistory as ChatMessageHistory
+from response_cache import DiskResponseCache, make_cache_key
+from semantic_cache import SemanticCache
+from context_builder import build_followup_context
+from concurrency import FairLimiter, LimiterQueueFull, LimiterTimeout
+from scenario_pool import ScenarioPool
+from scenario_schema import parse_scenario_batch, parse_scenario_text
+from singleflight import SingleFlight
+from model_router import LLM_BACKEND, ROUTES, describe_routes, get_task_llm, route_for
 
 # ======================== 설정 ========================
 load_dotenv(dotenv_path=".envfile", override=True)
@@ -15,7 +29,30 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
 # ======================== 전역 저장소 ========================
-store = {}
+# HISTORY_BACKEND 설정에 따라 메모리(LRU/TTL/용량 제한) 또는 SQLite(WAL) 저장소 사용
+store = create_history_backend()
+
+# 동일한 입력으로 생성된 민원 응대 스크립트를 디스크에 캐시
+script_cache = DiskResponseCache(
+    os.getenv("SCRIPT_CACHE_DIR", "/data/complaint/cache/scripts"),
+    ttl=int(os.getenv("SCRIPT_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("SCRIPT_CACHE_MAX_ENTRIES", "2000")),
+    max_bytes=int(os.getenv("SCRIPT_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+)
+
+# 비슷한 추가 질문의 답변을 재사용하는 로컬 의미 캐시 (시작 시 디스크에서 복원)
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "/data/complaint/cache/semantic/followup")
+SEMANTIC_CACHE_PERSIST_EVERY = int(os.getenv("SEMANTIC_CACHE_PERSIST_EVERY", "20"))
+semantic_cache = SemanticCache(
+    capacity=int(os.getenv("SEMANTIC_CACHE_CAPACITY", "2000")),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    context_threshold=float(os.getenv("SEMANTIC_CACHE_CONTEXT_THRESHOLD", "0.9")),
+)
+try:
+    semantic_cache.load(SEMANTIC_CACHE_PATH)
+except Exception as e:
+    print("🔥 의미 캐시 복원 실패:", e)
+atexit.register(lambda: semantic_cache.save_if_dirty(SEMANTIC_CACHE_PATH))
 
 # ======================== 전역 프롬프트 ========================
 SYSTEM_PROMPT_SCRIPT = (
@@ -108,25 +145,489 @@ SYSTEM_PROMPT_CHATBOT = (
     """
 )
 
+# 스크립트 생성용 고정 지침 (상담원/고객 정보는 뒤따르는 human 메시지로 전달해 앞부분을 항상 동일하게 유지)
+SYSTEM_PROMPT_SCRIPT_PREFIX = (
+    """
+    당신은 보험 민원 대응을 전문으로 하는 AI 상담 지원 도우미입니다.
+    상담원이 입력한 민원 상황과 고객 감정 상태를 바탕으로, 고객의 불만을 효과적으로 완화하고 신뢰를 줄 수 있는 **맞춤형 응대 스크립트**와 실무에 도움이 되는 **상담 TIP**을 함께 제공하세요.
+    응대 스크립트와 상담TIP 사이 구분선을 추가해서 내용을 구분해주세요.
+    고객 이름과 상담원 이름을 혼동하지 말고, 반드시 각 정보에 맞게 사용하세요.
+
+    ⚠️ 절대 지침
+    - 상담원 이름은 반드시 [상담원 정보]의 이름만 사용하세요.
+    - 상담원 이름을 임의로 생성하거나 변경하지 마세요.
+    - 고객 이름은 반드시 [고객 정보]의 이름만 사용하세요.
+    - 다른 이름, 가상의 이름을 절대 생성하지 마세요.
+    - 추가 참고 정보가 제공된 경우, 전체 스크립트 흐름을 이 정보 중심으로 끌고 가지 마세요.
+    - 필요할 때 자연스럽게 언급하거나 설명을 보완할 때 사용하세요.
+    - 고객 설명 파트나 처리절차 안내 파트에서 활용하면 좋습니다.
+    - 스크립트의 시작 부분에서는 상담원이 본인의 이름을 말하며 정중히 인사하도록 작성하세요.
+    - 예시: "안녕하세요, 저는 굿리치 상담사 **(상담원 이름)**입니다."
+    """
+    + SYSTEM_PROMPT_SCRIPT
+)
+
+# 카카오톡 문자 생성용 고정 지침 (상담 요약은 뒤따르는 human 메시지로 전달)
+SYSTEM_PROMPT_KAKAO = (
+    """
+    - 당신은 민원 처리 상담 후, 고객에게 상황을 정리하고 안내 메시지를 보내는 보험사 상담사입니다.
+    - 상담 내용을 기반으로 고객의 불만을 완화하고 신뢰를 회복할 수 있도록 다음 [출력 형식]과 [작성 지침]에 따라 총 **3가지 유형**의 메시지를 작성하세요.
+    - ⚠️ 반드시 함께 전달되는 **민원 상담 요약**과 **추가 대화 요약**을 반영하여, 고객에게 발송할 카카오톡 메시지를 작성하세요.
+
+    [출력 형식]
+    각 메시지는 아래 제목과 설명을 참고하여 작성하세요.
+
+    ### 1️⃣ 공감형
+    (고객의 불편과 감정에 깊이 공감하며, 진심 어린 위로와 배려의 메시지를 전달하세요.)
+
+    ### 2️⃣ 정중+사과형
+    (격식 있고 공식적인 어조로 진심 어린 사과와 함께 처리 진행 상황을 명확하고 책임감 있게 안내하세요.)
+
+    ### 3️⃣ 민원전문가형
+    (전문적인 용어와 절차 설명을 통해 신뢰를 주고, 체계적으로 대응하고 있음을 강조하여 고객을 안심시키는 메시지)
+
+    [작성 지침]
+    1. 각 메시지는 **15문장 내외**로 작성하세요.
+    2. 문장은 **문장 단위로 줄바꿈**하여 가독성을 높이세요.
+    3. 내용이 전환될 때는 **두 번 줄바꿈**으로 문단을 구분하세요.
+    4. 고객 이름을 자연스럽게 포함하세요.
+    5. 원 처리 상황, 현재 진행 단계, 예상 소요 시간, 추가 문의 가능 여부 등을 반드시 안내하세요.
+    6. 강압적 표현은 절대 사용하지 말고, 항상 **'편하게 문의 주세요'**, **'언제든 연락 주세요'** 등의 표현으로 마무리하세요.
+    7. 이모지는 [공감형]에서만 적절히 활용하고, 다른 유형에서는 사용하지 마세요.
+    8. [민원전문가형]에서는 전문성을 강조하되, 고객이 이해할 수 있도록 어려운 용어는 쉽게 풀어서 설명하세요.
+    9. 불안감을 유발하는 표현은 피하고, 신뢰와 안정감을 주는 표현을 사용하세요.
+    10. 모든 유형에서 고객을 존중하는 어투와 배려 깊은 표현을 유지하세요.
+    """
+)
+
+# 카카오톡 문자 유형별 동시 생성용 고정 지침 (세 요청이 같은 앞부분을 공유하고, 유형 지시는 맨 마지막에 둠)
+SYSTEM_PROMPT_KAKAO_VARIANT = (
+    """
+    - 당신은 민원 처리 상담 후, 고객에게 상황을 정리하고 안내 메시지를 보내는 보험사 상담사입니다.
+    - 상담 내용을 기반으로 고객의 불만을 완화하고 신뢰를 회복할 수 있도록 [작성 지침]에 따라 **요청된 유형 한 가지**의 메시지만 작성하세요.
+    - ⚠️ 반드시 함께 전달되는 **민원 상담 요약**과 **추가 대화 요약**을 반영하여, 고객에게 발송할 카카오톡 메시지를 작성하세요.
+    - 메시지 본문만 출력하고, 유형 제목이나 다른 유형의 메시지는 쓰지 마세요.
+
+    [작성 지침]
+    1. 메시지는 **15문장 내외**로 작성하세요.
+    2. 문장은 **문장 단위로 줄바꿈**하여 가독성을 높이세요.
+    3. 내용이 전환될 때는 **두 번 줄바꿈**으로 문단을 구분하세요.
+    4. 고객 이름을 자연스럽게 포함하세요.
+    5. 원 처리 상황, 현재 진행 단계, 예상 소요 시간, 추가 문의 가능 여부 등을 반드시 안내하세요.
+    6. 강압적 표현은 절대 사용하지 말고, 항상 **'편하게 문의 주세요'**, **'언제든 연락 주세요'** 등의 표현으로 마무리하세요.
+    7. 이모지는 [공감형]에서만 적절히 활용하고, 다른 유형에서는 사용하지 마세요.
+    8. 불안감을 유발하는 표현은 피하고, 신뢰와 안정감을 주는 표현을 사용하세요.
+    9. 고객을 존중하는 어투와 배려 깊은 표현을 유지하세요.
+    """
+)
+
+# 유형 키 -> (제목, 유형별 지시)
+KAKAO_STYLES = {
+    "empathy": (
+        "1️⃣ 공감형",
+        "고객의 불편과 감정에 깊이 공감하며, 진심 어린 위로와 배려의 메시지를 전달하세요.",
+    ),
+    "apology": (
+        "2️⃣ 정중+사과형",
+        "격식 있고 공식적인 어조로 진심 어린 사과와 함께 처리 진행 상황을 명확하고 책임감 있게 안내하세요.",
+    ),
+    "expert": (
+        "3️⃣ 민원전문가형",
+        "전문적인 용어와 절차 설명을 통해 신뢰를 주고, 체계적으로 대응하고 있음을 강조하여 고객을 안심시키세요. "
+        "어려운 용어는 고객이 이해할 수 있도록 쉽게 풀어서 설명하세요.",
+    ),
+}
+
+# 프롬프트 내용이 바뀌면 버전을 올려 이전 캐시가 재사용되지 않도록 함
+PROMPT_VERSION_SCRIPT = "v2"
+
 # ======================== 모델 호출 ========================
-@lru_cache(maxsize=1)
-def get_llm(model='gpt-4.1-mini'):
-    return ChatOpenAI(model=model)
+# 작업(script/chatbot/kakao/random_scenario/summary)별 모델·설정·대체 모델은 model_router.py에서 지정
+# LLM_MODEL_<작업>, LLM_TEMPERATURE_<작업>, LLM_MAX_TOKENS_<작업>, LLM_FALLBACK_<작업> 환경 변수로 변경 가능
+def get_llm(task="script"):
+    return get_task_llm(task)
+
+print("🧭 모델 라우팅:", describe_routes())
+
+def require_session(session_id):
+    # 생성 함수는 UI 세션 상태를 읽지 않음. 세션 id는 호출하는 쪽(UI 클라이언트/서버/배치)이 항상 넘겨야 함
+    if not session_id:
+        raise ValueError("session_id가 필요합니다.")
+    return session_id
+
+def call_config(call_type, session_id=None):
+    # 호출 유형별 지표 콜백(지연 시간/TTFT/토큰/비용/오류, 모델 태그) + (필요 시) 대화 기록 세션 지정
+    config = {"callbacks": [LLMMetricsHandler(call_type)], "tags": [call_type]}
+    if session_id is not None:
+        config["configurable"] = {"session_id": session_id}
+    return config
+
+# ======================== 동시성 제한 ========================
+# 프로세스 전체 LLM 동시 호출 수 제한 + 세션별 공정 대기열
+llm_limiter = FairLimiter(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+    timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30")),
+)
+BUSY_RESPONSE = "⏳ 지금은 요청이 많아 처리하지 못했습니다. 잠시 후 다시 시도해 주세요."
+
+# ======================== 지표 내보내기 ========================
+# METRICS_PORT 설정 시 Prometheus /metrics 엔드포인트, METRICS_LOG_INTERVAL 설정 시 주기 요약 로그
+start_exporters()
+
+# ======================== 스트리밍 ========================
+ERROR_RESPONSE = "❌ 오류가 발생했습니다. 관리자에게 문의해 주세요."
+
+# 첫 토큰을 받기 전에 실패한 호출만 다시 시도 (이미 화면에 흘려보낸 응답은 재시도하지 않음)
+LLM_STREAM_RETRIES = int(os.getenv("LLM_STREAM_RETRIES", "1"))
+
+# 제한 시간을 넘긴 응답은 받은 부분까지만 보여주고 안내 문구를 덧붙임 (대화 기록/캐시에는 저장하지 않음)
+TIMEOUT_NOTICE = "\n\n⏱️ 응답 시간이 초과되어 생성을 중단했습니다. 다시 시도해 주세요."
+
+# 응답 끝에 붙는 실패 문구 -> 상태 (UI 오류 표시, 배치 결과, 서버 done 이벤트에서 공통 사용)
+FAILURE_STATUS = {
+    ERROR_RESPONSE: "error",
+    BUSY_RESPONSE: "busy",
+    TIMEOUT_NOTICE: "timeout",
+}
+
+def response_status(text):
+    for failure, status in FAILURE_STATUS.items():
+        if failure in text:
+            return status
+    return "ok"
+
+
+class GenerationCancelled(BaseException):
+    # reason: timeout(작업별 제한 시간 초과) / abandoned(보는 화면 없음) / session(세션 전환·로그아웃)
+    # asyncio.CancelledError처럼 BaseException을 상속해, 체인 내부의 일반 예외 처리(대체 모델 전환,
+    # 재시도, 콜백 오류 무시)를 거치지 않고 바로 빠져나오게 함
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationHandler(BaseCallbackHandler):
+    # LLM이 토큰을 낼 때마다 취소/제한 시간을 확인하고, 중단해야 하면 LLM 스트림 안에서 예외를 발생시킴
+    # (체인 밖에서 스트림을 닫으면 LangChain이 남은 응답을 끝까지 받은 뒤 잘린 답변을 대화 기록에 저장함)
+    run_inline = True
+
+    def __init__(self, call, started_at):
+        self.call = call
+        self.started_at = started_at
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.call.check(self.started_at)
+
+
+class PreparedCall:
+    # 생성 요청 하나를 동기(stream)/비동기(astream) 어느 쪽으로도 실행할 수 있게 준비한 상태
+    # cached가 있으면 LLM을 호출하지 않고 캐시된 텍스트를 그대로 흘려보냄
+    # request: 중복 요청 합치기 키에 쓸 원래 요청 인자 (없으면 inputs 사용, 캐시 적중 호출은 반드시 지정)
+    def __init__(self, call_type, session_key, runnable=None, inputs=None,
+                 config=None, cached=None, on_complete=None, deadline=None, request=None):
+        self.call_type = call_type
+        self.session_key = session_key
+        self.runnable = runnable
+        self.inputs = inputs
+        self.request = request
+        self.config = config
+        self.cached = cached
+        self.on_complete = on_complete
+        # 대기열 대기 + 생성 전체 제한 시간(초). 지정하지 않으면 작업별 라우팅 설정값
+        self.deadline = route_for(call_type)["deadline"] if deadline is None else deadline
+        self.cancel_reason = None
+        self._cancelled = threading.Event()
+
+    @property
+    def metric_name(self):
+        return f"{self.call_type}_cached" if self.cached is not None else self.call_type
+
+    @property
+    def flight_key(self):
+        # 같은 세션 + 같은 요청(공백 정규화)이면 같은 키 → 진행 중인 호출에 합류
+        # 캐시 적중 호출은 inputs가 없으므로 원래 요청 인자로 구분 (다른 요청끼리 합쳐지지 않도록)
+        request = self.request if self.request is not None else self.inputs
+        if request is None:
+            raise ValueError(f"{self.call_type}: 합치기 키를 만들 요청 인자(request 또는 inputs)가 없습니다.")
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(" ".join(payload.split()).encode("utf-8")).hexdigest()
+        return self.call_type, self.session_key, digest
+
+    def cancel(self, reason="cancelled"):
+        # 다른 스레드에서 호출 가능. 생산자는 다음 조각을 받을 때 확인하고 중단
+        self.cancel_reason = reason
+        self._cancelled.set()
+
+    def remaining(self, started_at):
+        if not self.deadline:
+            return None
+        return max(0.0, self.deadline - (time.perf_counter() - started_at))
+
+    def check(self, started_at):
+        if self._cancelled.is_set():
+            raise GenerationCancelled(self.cancel_reason)
+        if self.deadline and time.perf_counter() - started_at > self.deadline:
+            raise GenerationCancelled("timeout")
+
+    def stream_config(self, started_at):
+        config = dict(self.config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [CancellationHandler(self, started_at)]
+        return config
+
+    def queue_timeout(self, started_at):
+        # 대기열에서도 남은 제한 시간보다 오래 기다리지 않음
+        remaining = self.remaining(started_at)
+        if remaining is None:
+            return llm_limiter.timeout
+        return remaining if llm_limiter.timeout is None else min(remaining, llm_limiter.timeout)
+
+
+# 동기 스트림을 읽는 쪽이 취소/제한 시간을 확인하는 간격(초)
+STREAM_POLL_INTERVAL = float(os.getenv("LLM_STREAM_POLL_INTERVAL", "0.2"))
+_STREAM_END = object()
+
+def threaded_stream(call, started_at):
+    # chain.stream을 별도 스레드에서 읽고, 이쪽은 남은 제한 시간만큼만 기다림
+    # 토큰 콜백(CancellationHandler)은 토큰이 와야 확인하므로, 첫 토큰 전에 멈춘 호출은 여기서 끊음
+    # (멈춘 HTTP 요청은 취소 표시 후 스레드에 남았다가 요청 타임아웃으로 끝나며, 결과는 버려짐)
+    chunks = queue.Queue()
+
+    def produce():
+        try:
+            for chunk in call.runnable.stream(call.inputs, config=call.stream_config(started_at)):
+                chunks.put((chunk, None))
+        except BaseException as e:
+            chunks.put((_STREAM_END, e))
+        else:
+            chunks.put((_STREAM_END, None))
+
+    threading.Thread(target=produce, daemon=True, name=f"llm-stream-{call.call_type}").start()
+    finished = False
+    try:
+        while True:
+            call.check(started_at)
+            remaining = call.remaining(started_at)
+            wait = STREAM_POLL_INTERVAL if remaining is None else min(STREAM_POLL_INTERVAL, remaining)
+            try:
+                chunk, error = chunks.get(timeout=wait)
+            except queue.Empty:
+                continue
+            if chunk is _STREAM_END:
+                finished = True
+                if error is not None:
+                    raise error
+                return
+            yield chunk
+    finally:
+        if not finished:
+            # 아직 읽는 중인 스트림은 다음 토큰에서 중단되도록 표시 (대화 기록/캐시에 남지 않음)
+            call.cancel(call.cancel_reason or "timeout")
+
+
+def stream_response(call):
+    # chain.stream 결과를 토큰 단위로 흘려보내면서 TTFT/대기 시간을 기록
+    # 오류 없이 끝나면 call.on_complete(전체 텍스트) 호출
+    # 제한 시간 초과/취소 시 받은 부분까지만 흘려보내고 on_complete(대화 기록/캐시 저장)는 건너뜀
+    started_at = time.perf_counter()
+    first_token_at = None
+    queue_wait = 0.0
+    parts = []
+    error = None
+    status = None
+    try:
+        if call.cached is not None:
+            first_token_at = time.perf_counter()
+            parts.append(call.cached)
+            yield call.cached
+        else:
+            with llm_limiter.slot(call.session_key, timeout=call.queue_timeout(started_at)) as queue_wait:
+                for attempt in range(LLM_STREAM_RETRIES + 1):
+                    call.check(started_at)
+                    try:
+                        for chunk in threaded_stream(call, started_at):
+                            if not chunk:
+                                continue
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            parts.append(chunk)
+                            yield chunk
+                        break
+                    except Exception as e:
+                        if parts or attempt >= LLM_STREAM_RETRIES:
+                            raise
+                        record_retry(call.call_type, route_for(call.call_type)["model"], e)
+    except GenerationCancelled as e:
+        error = e
+        status = "timeout" if e.reason == "timeout" else "cancelled"
+        record_cancel(call.call_type, e.reason)
+        print(f"🛑 생성 중단 ({call.call_type}, {e.reason}, {sum(len(p) for p in parts)}자 수신)")
+        if e.reason == "timeout":
+            yield TIMEOUT_NOTICE
+    except (LimiterQueueFull, LimiterTimeout) as e:
+        error = e
+        print(f"⏳ 대기열 초과 ({call.call_type}):", e)
+        yield BUSY_RESPONSE
+    except Exception as e:
+        error = e
+        print(f"🔥 예외 ({call.call_type}):", e)
+        yield ERROR_RESPONSE
+    finally:
+        record_stream(call.metric_name, started_at, first_token_at, sum(len(p) for p in parts), error,
+                      queue_wait=queue_wait, status=status, cached=call.cached is not None)
+
+    if error is None and call.on_complete is not None:
+        call.on_complete("".join(parts))
+
+
+async def astream_response(call):
+    # stream_response의 비동기 버전 (astream + 공유 제한기). 조각 사이 대기에도 제한 시간 적용
+    started_at = time.perf_counter()
+    first_token_at = None
+    queue_wait = 0.0
+    parts = []
+    error = None
+    status = None
+    try:
+        if call.cached is not None:
+            first_token_at = time.perf_counter()
+            parts.append(call.cached)
+            yield call.cached
+        else:
+            async with llm_limiter.aslot(call.session_key, timeout=call.queue_timeout(started_at)) as queue_wait:
+                for attempt in range(LLM_STREAM_RETRIES + 1):
+                    call.check(started_at)
+                    stream = call.runnable.astream(call.inputs, config=call.stream_config(started_at))
+                    try:
+                        while True:
+                            # 첫 토큰 전이나 조각 사이에서 멈춘 호출도 남은 제한 시간이 지나면 중단
+                            try:
+                                chunk = await asyncio.wait_for(stream.__anext__(), call.remaining(started_at))
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                raise GenerationCancelled("timeout")
+                            if not chunk:
+                                continue
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            parts.append(chunk)
+                            yield chunk
+                        break
+                    except Exception as e:
+                        if parts or attempt >= LLM_STREAM_RETRIES:
+                            raise
+                        record_retry(call.call_type, route_for(call.call_type)["model"], e)
+    except GenerationCancelled as e:
+        error = e
+        status = "timeout" if e.reason == "timeout" else "cancelled"
+        record_cancel(call.call_type, e.reason)
+        print(f"🛑 생성 중단 ({call.call_type}, {e.reason}, {sum(len(p) for p in parts)}자 수신)")
+        if e.reason == "timeout":
+            yield TIMEOUT_NOTICE
+    except asyncio.CancelledError:
+        # 단일 호출 합치기에서 태스크를 취소한 경우 (세션 전환 등)
+        error = GenerationCancelled(call.cancel_reason or "cancelled")
+        status = "cancelled"
+        record_cancel(call.call_type, error.reason)
+        raise
+    except (LimiterQueueFull, LimiterTimeout) as e:
+        error = e
+        print(f"⏳ 대기열 초과 ({call.call_type}):", e)
+        yield BUSY_RESPONSE
+    except Exception as e:
+        error = e
+        print(f"🔥 예외 ({call.call_type}):", e)
+        yield ERROR_RESPONSE
+    finally:
+        record_stream(call.metric_name, started_at, first_token_at, sum(len(p) for p in parts), error,
+                      queue_wait=queue_wait, status=status, cached=call.cached is not None)
+
+    if error is None and call.on_complete is not None:
+        call.on_complete("".join(parts))
+
+# ======================== 중복 요청 합치기 / 취소 ========================
+# 버튼 중복 클릭/rerun으로 같은 요청이 겹치면 LLM 호출과 대화 기록 저장을 한 번만 수행
+# 화면을 떠나 아무도 보지 않는 호출은 LLM_CANCEL_GRACE초 뒤 취소 (그 사이 같은 요청이 오면 다시 합류)
+inflight = SingleFlight("llm", grace=float(os.getenv("LLM_CANCEL_GRACE", "3")))
+
+def coalesced_stream(call):
+    # 실제 호출은 생산자 스레드에서 실행. 오류 안내는 마지막 조각(response_status)을 보고 호출한 쪽에서 표시
+    produce = lambda: stream_response(call)
+    return inflight.stream(call.flight_key, produce, group=call.session_key, cancel=call.cancel)
+
+
+def acoalesced_stream(call):
+    aproduce = lambda: astream_response(call)
+    return inflight.astream(call.flight_key, aproduce, group=call.session_key, cancel=call.cancel)
+
+
+def cancel_session_generations(session_id):
+    # 새 민원 입력/다른 대화 불러오기/로그아웃 시 해당 세션에서 진행 중인 생성을 바로 취소
+    cancelled = inflight.cancel_group(session_id, "session")
+    if cancelled:
+        print(f"🛑 세션 생성 취소: {session_id} ({cancelled}건)")
+    return cancelled
 
 # ======================== 세션 관리 ========================
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
 
-# ======================== 랜덤 고객 정보 생성 ========================
-@lru_cache(maxsize=1)
-def get_llm(model='gpt-4.1-mini'):
-    return ChatOpenAI(model=model)
 
-def get_random_customer_info():
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", """
+def load_session(session_id, conversation, source=None):
+    # 저장된 대화를 불러올 때: 진행 중이던 생성은 취소하고 LLM 대화 기록을 대화 내용으로 교체
+    # conversation: 대화 파일 내용(script_context, message_list, message_offset)
+    # source: 원본 대화 파일 경로 (메모리 저장소에서 밀려난 세션을 다시 읽어 올 때 사용)
+    require_session(session_id)
+    cancel_session_generations(session_id)
+    store[session_id] = ChatMessageHistory(messages=messages_from_conversation(conversation))
+    if source:
+        store.bind_source(session_id, source)
+
+
+def bind_session_source(session_id, source):
+    store.bind_source(require_session(session_id), source)
+
+
+def reset_session(session_id):
+    # 새 민원 입력 시: 진행 중인 생성 취소 + 대화 기록 비우기
+    require_session(session_id)
+    cancel_session_generations(session_id)
+    store.reset(session_id)
+
+
+def delete_session(session_id):
+    # 로그아웃 시: 진행 중인 생성 취소 + 스크립트/카카오톡 대화 기록 삭제
+    require_session(session_id)
+    cancel_session_generations(session_id)
+    del store[session_id]
+    del store[f"{session_id}_kakao"]
+
+# ======================== 체인 구성 ========================
+# 프롬프트 템플릿과 모델을 붙인 체인은 처음 쓸 때(또는 warm_up()에서) 한 번만 구성해 모든 세션이 재사용
+# 프롬프트/출력 파서/대화 기록 래퍼(runnables)와 langchain_openai는 체인을 구성할 때 가져옴
+# 대화 기록 자리는 ("placeholder", "{chat_history}")로 표시
+def chat_prompt(messages):
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(messages)
+
+def text_chain(messages, llm):
+    from langchain_core.output_parsers import StrOutputParser
+    return chat_prompt(messages) | llm | StrOutputParser()
+
+def with_session_history(chain, input_messages_key):
+    # 세션은 호출할 때 config(configurable.session_id)로 지정하므로 체인 하나를 모든 세션이 공유
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+    return RunnableWithMessageHistory(
+        chain,
+        get_session_history,
+        input_messages_key=input_messages_key,
+        history_messages_key="chat_history",
+    )
+
+# ======================== 랜덤 고객 정보 생성 ========================
+RANDOM_SCENARIO_MESSAGES = [
+    ("system", """
         당신은 보험과 관련된 가상의 민원 상황을 생성하는 AI 어시스턴트입니다.
         
         [출력 지침]
@@ -143,146 +644,277 @@ def get_random_customer_info():
         고객 감정 상태: (1~5 숫자만)
         추가 참고 정보: (추가 참고 정보)
         """),
-        ("human", "랜덤 고객 정보를 생성해 주세요.")
-    ])
+    ("human", "랜덤 고객 정보를 생성해 주세요.")
+]
 
-    chain = prompt_template | get_llm() | StrOutputParser()
+@lru_cache(maxsize=None)
+def get_random_scenario_chain():
+    return text_chain(RANDOM_SCENARIO_MESSAGES, get_llm("random_scenario"))
 
-    result = chain.invoke({})
+def generate_random_customer_info(session_id=None):
+    # LLM으로 랜덤 고객 정보 1건을 실시간 생성
+    # 요청한 화면 세션별로 대기열에 줄을 세워 여러 교육생이 동시에 눌러도 각자 라운드로빈 차례를 받음
+    with llm_limiter.slot(session_id or "random_scenario") as queue_wait:
+        record_queue_wait("random_scenario", queue_wait)
+        result = get_random_scenario_chain().invoke({}, config=call_config("random_scenario"))
     
-    # 결과 파싱
-    lines = result.splitlines()
-    info = {}
-    for line in lines:
-        if line.startswith("이름:"):
-            info['name'] = line.replace("이름:", "").strip()
-        elif line.startswith("민원 내용:"):
-            info['situation'] = line.replace("민원 내용:", "").strip()
-        elif line.startswith("고객 감정 상태:"):
-            info['emotion'] = int(line.replace("고객 감정 상태:", "").strip())
-        elif line.startswith("추가 참고 정보:"):
-            info['extra_info'] = line.replace("추가 참고 정보:", "").strip()
+    # 여러 줄 민원 내용, "4점" 같은 감정 표기도 보정해서 파싱
+    return parse_scenario_text(result) or {}
+
+SCENARIO_BATCH_SIZE = int(os.getenv("SCENARIO_BATCH_SIZE", "5"))
+
+SYSTEM_PROMPT_SCENARIO_BATCH = """
+당신은 보험과 관련된 가상의 민원 상황을 생성하는 AI 어시스턴트입니다.
 
+[출력 지침]
+요청받은 개수만큼 서로 다른 민원 상담 상황을 생성하세요.
+- name: 자연스러운 한글 이름 (서로 겹치지 않게)
+- situation: 태아보험, 어린이보험, 건강보험과 관련한 현실적인 민원 상황을 구체적으로 작성
+- emotion: 1~5 중 하나의 정수 (1=평온, 5=매우 화남)
+- extra_info: 답변에 활용할 수 있는 규정, 법 조항, 회사 방침 등 전문적인 정보
+
+반드시 아래 형태의 JSON 객체 하나만 출력하세요. 다른 설명은 쓰지 마세요.
+{{"scenarios": [{{"name": "...", "situation": "...", "emotion": 3, "extra_info": "..."}}]}}
+"""
+
+SCENARIO_BATCH_MESSAGES = [
+    ("system", SYSTEM_PROMPT_SCENARIO_BATCH),
+    ("human", "서로 다른 랜덤 고객 정보 {count}건을 생성해 주세요."),
+]
+
+@lru_cache(maxsize=None)
+def get_scenario_batch_chain():
+    llm = get_llm("random_scenario").bind(response_format={"type": "json_object"})
+    return text_chain(SCENARIO_BATCH_MESSAGES, llm)
+
+def generate_random_customer_batch(count=SCENARIO_BATCH_SIZE):
+    # 한 번의 호출로 N건을 JSON으로 생성하고, 스키마에 맞지 않는 항목은 보정하거나 버림
+    with llm_limiter.slot("random_scenario_batch") as queue_wait:
+        record_queue_wait("random_scenario_batch", queue_wait)
+        result = get_scenario_batch_chain().invoke({"count": count}, config=call_config("random_scenario_batch"))
+
+    scenarios, report = parse_scenario_batch(result)
+    print(
+        f"🎲 [random_scenario_batch] 요청 {count}건 / 수신 {report['received']} / "
+        f"정상 {report['valid']} (보정 {report['repaired']}) / 폐기 {report['dropped']}"
+    )
+    return scenarios[:count]
+
+# 교육용 랜덤 시나리오를 미리 만들어 두는 풀 (SQLite 파일이라 재시작해도 남고, 같은 파일을 쓰는 프로세스끼리 공유)
+scenario_pool = ScenarioPool(
+    generate_batch=generate_random_customer_batch,
+    path=os.getenv("SCENARIO_POOL_PATH", "/data/complaint/cache/scenario_pool.sqlite"),
+    capacity=int(os.getenv("SCENARIO_POOL_CAPACITY", "50")),
+    low_water=int(os.getenv("SCENARIO_POOL_LOW_WATER", "10")),
+    batch_size=SCENARIO_BATCH_SIZE,
+)
+if os.getenv("SCENARIO_POOL_PREFILL", "0") == "1":
+    scenario_pool.start()
+
+def get_random_customer_info(session_id=None):
+    # 풀에 준비된 시나리오가 있으면 즉시 제공, 비어 있을 때만 실시간 생성
+    # 대기열 초과/호출 실패 시 빈 dict (화면에서 안내)
+    info = scenario_pool.take()
+    if info is not None:
+        return info
+    try:
+        info = generate_random_customer_info(session_id)
+    except (LimiterQueueFull, LimiterTimeout) as e:
+        print("⏳ 대기열 초과 (random_scenario):", e)
+        return {}
+    except Exception as e:
+        print("🔥 예외 (random_scenario):", e)
+        return {}
+    if info:
+        scenario_pool.mark_served_live(info)
     return info
 
 # ======================== 스크립트 생성 ========================
-def get_script_response(name, situation, emotion_level):
+# 고정 지침 → 대화 기록 → 이번 민원 정보 순서
+SCRIPT_MESSAGES = [
+    ("system", SYSTEM_PROMPT_SCRIPT_PREFIX),
+    ("placeholder", "{chat_history}"),
+    ("human", "[상담원 정보]\n- 상담원 이름: {consultant_name}\n\n[고객 정보]\n{complaint_info}")
+]
+
+@lru_cache(maxsize=None)
+def get_script_chain():
+    return with_session_history(text_chain(SCRIPT_MESSAGES, get_llm("script")), "complaint_info")
+
+def prepare_script_call(name, situation, emotion_level, regenerate=False,
+                        session_id=None, consultant_name=None, extra_info=None):
+    # 고객 감정 상태 설명 매핑
+    emotion_labels = {
+        1: "평온",
+        2: "다소 불만",
+        3: "불만",
+        4: "화남",
+        5: "매우 화남"
+    }
+    emotion_desc = f"{emotion_level} ({emotion_labels.get(emotion_level, '불만')})"
+    session_id = require_session(session_id)
+    extra_info = extra_info or ""
+
+    # 입력 정보를 LLM에게 전달할 포맷으로 구성
+    complaint_info = (
+        f"- 민원인 이름: {name}\n"
+        f"- 민원 내용: {situation}\n"
+        f"- 고객 감정 상태: {emotion_desc}"
+    )
+    # 추가 정보가 있으면 추가
+    if extra_info:
+        complaint_info += f"\n- 추가 참고 정보: {extra_info}"
+
+    # ⭐ 상담원 이름 (없으면 기본 호칭)
+    consultant_name = consultant_name or "상담원"
+
+    # ⭐ 캐시 확인 (새로 생성하기 요청이면 건너뜀)
+    # 라우팅된 스크립트 모델 기준으로 캐시 (모델을 바꾸면 이전 모델의 스크립트는 재사용하지 않음)
+    script_model = ROUTES["script"]["model"]
+    cache_key = make_cache_key(
+        consultant_name, name, situation, emotion_level, extra_info, script_model, PROMPT_VERSION_SCRIPT
+    )
+    if regenerate:
+        script_cache.bypass()
+    else:
+        cached_script = script_cache.get(cache_key)
+        if cached_script is not None:
+            # 캐시 적중 시에도 이후 추가 질문을 위해 대화 기록은 동일하게 남김
+            return PreparedCall(
+                "script", session_id,
+                cached=cached_script,
+                request={"cache_key": cache_key},
+                on_complete=lambda text: get_session_history(session_id).add_messages([
+                    HumanMessage(content=complaint_info),
+                    AIMessage(content=text),
+                ]),
+            )
+
+    return PreparedCall(
+        "script", session_id,
+        runnable=get_script_chain(),
+        inputs={"complaint_info": complaint_info, "consultant_name": consultant_name},
+        config=call_config("script", session_id=session_id),
+        on_complete=lambda text: script_cache.put(cache_key, text, model=script_model),
+    )
+
+
+def get_script_response(name, situation, emotion_level, regenerate=False, **session_args):
     try:
-        # 고객 감정 상태 설명 매핑
-        emotion_labels = {
-            1: "평온",
-            2: "다소 불만",
-            3: "불만",
-            4: "화남",
-            5: "매우 화남"
-        }
-        emotion_desc = f"{emotion_level} ({emotion_labels.get(emotion_level, '불만')})"
-        extra_info = st.session_state.get('extra_info', '')
-
-        # 입력 정보를 LLM에게 전달할 포맷으로 구성
-        complaint_info = (
-            f"- 민원인 이름: {name}\n"
-            f"- 민원 내용: {situation}\n"
-            f"- 고객 감정 상태: {emotion_desc}"
-        )
-        # 추가 정보가 있으면 추가
-        if extra_info:
-            complaint_info += f"- 추가 참고 정보: {extra_info}\n"
-
-        # ⭐ 상담원 이름 불러오기
-        consultant_name = st.session_state.get('user_name', '상담원')
-
-        # ⭐ dynamic_prompt 생성
-        dynamic_prompt = f"""
-        당신은 보험 민원 대응을 전문으로 하는 AI 상담 지원 도우미입니다.
-        상담원이 입력한 민원 상황과 고객 감정 상태를 바탕으로, 고객의 불만을 효과적으로 완화하고 신뢰를 줄 수 있는 **맞춤형 응대 스크립트**와 실무에 도움이 되는 **상담 TIP**을 함께 제공하세요.
-        응대 스크립트와 상담TIP 사이 구분선을 추가해서 내용을 구분해주세요.
-        고객 이름과 상담원 이름을 혼동하지 말고, 반드시 각 정보에 맞게 사용하세요.
-
-        ⚠️ 절대 지침
-        - 상담원 이름은 반드시 아래 [상담원 정보]의 이름만 사용하세요.
-        - 상담원 이름을 임의로 생성하거나 변경하지 마세요.
-        - 고객 이름은 반드시 [고객 정보]의 이름만 사용하세요.
-        - 다른 이름, 가상의 이름을 절대 생성하지 마세요.
-        - 추가 참고 정보가 제공된 경우, 전체 스크립트 흐름을 이 정보 중심으로 끌고 가지 마세요.
-        - 필요할 때 자연스럽게 언급하거나 설명을 보완할 때 사용하세요.
-        - 고객 설명 파트나 처리절차 안내 파트에서 활용하면 좋습니다.
-
-        [상담원 정보]
-        - 상담원 이름: {consultant_name}
-
-        [고객 정보]
-        {complaint_info}
-
-        - 스크립트의 시작 부분에서는 상담원이 본인의 이름을 말하며 정중히 인사하도록 작성하세요.
-        - 예시: "안녕하세요, 저는 굿리치 상담사 **{consultant_name}**입니다."
-        
-        {SYSTEM_PROMPT_SCRIPT}
-        """
-
-        # 3️⃣ 체인 호출
-        chain = RunnableWithMessageHistory(
-            ChatPromptTemplate.from_messages([
-                ("system", dynamic_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{complaint_info}")
-            ]) | get_llm() | StrOutputParser(),
-            get_session_history,
-            input_messages_key="complaint_info",
-            history_messages_key="chat_history",
-        )
+        return coalesced_stream(prepare_script_call(name, situation, emotion_level, regenerate, **session_args))
 
-        result = chain.invoke(
-            {"complaint_info": complaint_info},
-            config={"configurable": {"session_id": st.session_state.session_id}}
-        )
-        return iter([result])
-    
+    except Exception as e:
+        print("🔥 예외:", e)
+        return iter([ERROR_RESPONSE])
 
+
+async def aget_script_response(name, situation, emotion_level, regenerate=False, **session_args):
+    try:
+        call = prepare_script_call(name, situation, emotion_level, regenerate, **session_args)
     except Exception as e:
-        st.error("🔥 민원 응대 스크립트 생성 중 오류가 발생했습니다. 콘솔 로그를 확인해 주세요.")
         print("🔥 예외:", e)
-        return iter(["❌ 오류가 발생했습니다. 관리자에게 문의해 주세요."])
+        yield ERROR_RESPONSE
+        return
+    async for chunk in acoalesced_stream(call):
+        yield chunk
 
 # ======================== 대화 챗봇 ========================
+# 추가 질문 1회에 보내는 입력 토큰 예산과 원문 그대로 유지할 최근 턴 수
+FOLLOWUP_CONTEXT_BUDGET = int(os.getenv("FOLLOWUP_CONTEXT_BUDGET", "6000"))
+FOLLOWUP_KEEP_TURNS = int(os.getenv("FOLLOWUP_KEEP_TURNS", "3"))
+
+# 스크립트는 매 턴 질문에 붙이지 않고 별도 블록으로 한 번만 전달
+CHATBOT_MESSAGES = [
+    ("system", SYSTEM_PROMPT_CHATBOT),
+    ("system", "[주의] 아래 상담 스크립트 내용을 반드시 참고하여 상담원의 요청에 답변하세요.\n\n"
+               "[현재 상담 스크립트]\n{script_context}"),
+    ("placeholder", "{chat_history}"),
+    ("human", "[상담원의 질문]\n{input}")
+]
+
+@lru_cache(maxsize=None)
 def get_chatbot_chain():
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT_CHATBOT),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}")
-    ])
-    return prompt | get_llm() | StrOutputParser()
+    return text_chain(CHATBOT_MESSAGES, get_llm("chatbot"))
 
 
-def get_chatbot_response(user_message, script_context=""):
+def remember_followup_answer(session_id, user_message, answer, script_context):
+    # 대화 기록에는 스크립트를 붙이지 않은 질문 원문만 남김
+    get_session_history(session_id).add_messages([
+        HumanMessage(content=user_message),
+        AIMessage(content=answer),
+    ])
+    semantic_cache.add(user_message, answer, context=script_context)
     try:
-        full_input = (
-            "[주의] 아래 상담 스크립트 내용을 반드시 참고하여 상담원의 요청에 답변하세요.\n\n"
-            "[현재 상담 스크립트]\n"
-            f"{script_context}\n\n"
-            "[상담원의 질문]\n"
-            f"{user_message}"
-        )
+        semantic_cache.save_if_dirty(SEMANTIC_CACHE_PATH, min_changes=SEMANTIC_CACHE_PERSIST_EVERY)
+    except Exception as e:
+        print("🔥 의미 캐시 저장 실패:", e)
 
-        chain = RunnableWithMessageHistory(
-            get_chatbot_chain(),
-            get_session_history,
-            input_messages_key="input",
-            history_messages_key="chat_history",
-        )
 
-        result = chain.invoke(
-            {"input": full_input},
-            config={"configurable": {"session_id": st.session_state.session_id}}
+def prepare_chatbot_call(user_message, script_context="", session_id=None):
+    session_id = require_session(session_id)
 
+    # ⭐ 같은 민원 맥락에서 비슷한 질문에 대한 답변이 있으면 재사용
+    cached = semantic_cache.lookup(user_message, script_context)
+    if cached is not None:
+        answer, _ = cached
+        return PreparedCall(
+            "chatbot", session_id,
+            cached=answer,
+            request={"input": user_message, "script_context": script_context},
+            on_complete=lambda text: get_session_history(session_id).add_messages([
+                HumanMessage(content=user_message),
+                AIMessage(content=text),
+            ]),
         )
-        return iter([result])
 
+    # ⭐ 토큰 예산 안에서 대화 맥락 구성 (스크립트 중복 제거 + 오래된 턴 요약)
+    chat_history, context_stats = build_followup_context(
+        get_session_history(session_id).messages,
+        script_context,
+        user_message,
+        budget_tokens=FOLLOWUP_CONTEXT_BUDGET,
+        keep_turns=FOLLOWUP_KEEP_TURNS,
+    )
+    print(
+        f"📦 [chatbot] 입력 토큰 약 {context_stats['total_tokens']} "
+        f"(스크립트 {context_stats['script_tokens']} / 요약 {context_stats['summary_tokens']} / "
+        f"최근 {context_stats['recent_turns']}턴 {context_stats['recent_tokens']} / "
+        f"질문 {context_stats['question_tokens']})"
+    )
+
+    return PreparedCall(
+        "chatbot", session_id,
+        runnable=get_chatbot_chain(),
+        inputs={
+            "script_context": script_context,
+            "chat_history": chat_history,
+            "input": user_message,
+        },
+        config=call_config("chatbot"),
+        on_complete=lambda text: remember_followup_answer(session_id, user_message, text, script_context),
+    )
+
+
+def get_chatbot_response(user_message, script_context="", session_id=None):
+    try:
+        return coalesced_stream(prepare_chatbot_call(user_message, script_context, session_id))
+
+    except Exception as e:
+        print(f"🔥 예외 발생 - 입력 내용: {user_message}")
+        print(f"🔥 예외 상세: {e}")
+        return iter([ERROR_RESPONSE])
+
+
+async def aget_chatbot_response(user_message, script_context="", session_id=None):
+    try:
+        call = prepare_chatbot_call(user_message, script_context, session_id)
     except Exception as e:
-        st.error("🔥 추가 질문 처리 중 오류가 발생했습니다. 콘솔 로그를 확인해 주세요.")
         print(f"🔥 예외 발생 - 입력 내용: {user_message}")
         print(f"🔥 예외 상세: {e}")
-        return iter(["❌ 오류가 발생했습니다. 관리자에게 문의해 주세요."])
+        yield ERROR_RESPONSE
+        return
+    async for chunk in acoalesced_stream(call):
+        yield chunk
 
 # ======================== 카카오톡 문자 발송 ========================
 def generate_conversation_summary(message_list):
@@ -296,68 +928,184 @@ def generate_conversation_summary(message_list):
                 if line.startswith("> "):
                     summary_points.append(f"- 제안 멘트: {line[2:]}")
     return "\n".join(summary_points)
+
+# 고정 지침을 앞에 두고, 이번 상담 요약은 마지막 human 메시지로 전달
+KAKAO_MESSAGES = [
+    ("system", SYSTEM_PROMPT_KAKAO),
+    ("placeholder", "{chat_history}"),
+    ("human", "[민원 상담 요약]\n{script_context}\n\n[추가 대화 요약]\n{conversation_summary}\n\n{input}")
+]
+
+@lru_cache(maxsize=None)
+def get_kakao_chain():
+    return with_session_history(text_chain(KAKAO_MESSAGES, get_llm("kakao")), "input")
     
-def get_kakao_response(script_context, message_list):
+def prepare_kakao_call(script_context, message_list, session_id=None):
+    session_id = require_session(session_id)
+    conversation_summary = generate_conversation_summary(message_list)
+    kakao_session_id = f"{session_id}_kakao"
+
+    return PreparedCall(
+        "kakao", session_id,
+        runnable=get_kakao_chain(),
+        inputs={
+            "script_context": script_context,
+            "conversation_summary": conversation_summary,
+            "input": "카카오톡 메시지를 생성해 주세요.",
+        },
+        config=call_config("kakao", session_id=kakao_session_id),
+    )
+
+
+def get_kakao_response(script_context, message_list, session_id=None):
     try:
-        conversation_summary = generate_conversation_summary(message_list)
-
-        dynamic_prompt = f"""
-        [민원 상담 요약]
-        {script_context}
-
-        [추가 대화 요약]
-        {conversation_summary}
-
-        ⚠️ 반드시 위 **민원 상담 요약**과 **추가 대화 요약**을 반영하여, 고객에게 발송할 카카오톡 메시지를 작성하세요.
-
-        - 당신은 민원 처리 상담 후, 고객에게 상황을 정리하고 안내 메시지를 보내는 보험사 상담사입니다.
-        - 상담 내용을 기반으로 고객의 불만을 완화하고 신뢰를 회복할 수 있도록 다음 [출력 형식]과 [작성 지침]에 따라 총 **3가지 유형**의 메시지를 작성하세요.
-
-        [출력 형식]
-        각 메시지는 아래 제목과 설명을 참고하여 작성하세요.
-
-        ### 1️⃣ 공감형
-        (고객의 불편과 감정에 깊이 공감하며, 진심 어린 위로와 배려의 메시지를 전달하세요.)
-
-        ### 2️⃣ 정중+사과형
-        (격식 있고 공식적인 어조로 진심 어린 사과와 함께 처리 진행 상황을 명확하고 책임감 있게 안내하세요.)
-
-        ### 3️⃣ 민원전문가형
-        (전문적인 용어와 절차 설명을 통해 신뢰를 주고, 체계적으로 대응하고 있음을 강조하여 고객을 안심시키는 메시지)
-
-        [작성 지침]            
-        1. 각 메시지는 **15문장 내외**로 작성하세요.
-        2. 문장은 **문장 단위로 줄바꿈**하여 가독성을 높이세요.
-        3. 내용이 전환될 때는 **두 번 줄바꿈**으로 문단을 구분하세요.
-        4. 고객 이름을 자연스럽게 포함하세요.
-        5. 원 처리 상황, 현재 진행 단계, 예상 소요 시간, 추가 문의 가능 여부 등을 반드시 안내하세요.
-        6. 강압적 표현은 절대 사용하지 말고, 항상 **'편하게 문의 주세요'**, **'언제든 연락 주세요'** 등의 표현으로 마무리하세요.
-        7. 이모지는 [공감형]에서만 적절히 활용하고, 다른 유형에서는 사용하지 마세요.
-        8. [민원전문가형]에서는 전문성을 강조하되, 고객이 이해할 수 있도록 어려운 용어는 쉽게 풀어서 설명하세요.
-        9. 불안감을 유발하는 표현은 피하고, 신뢰와 안정감을 주는 표현을 사용하세요.
-        10. 모든 유형에서 고객을 존중하는 어투와 배려 깊은 표현을 유지하세요.
-        """
-
-        chain = RunnableWithMessageHistory(
-            ChatPromptTemplate.from_messages([
-                ("system", dynamic_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}")
-            ]) | get_llm() | StrOutputParser(),
-            get_session_history,
-            input_messages_key="input",
-            history_messages_key="chat_history",
-        )
-        
-        kakao_session_id = f"{st.session_state.session_id}_kakao"
-        
-        result = chain.invoke(
-            {"input": "카카오톡 메시지를 생성해 주세요."},
-            config={"configurable": {"session_id": kakao_session_id}}
-        )
-        return iter([result])
+        return coalesced_stream(prepare_kakao_call(script_context, message_list, session_id))
 
     except Exception as e:
-        st.error("🔥 카카오톡 메시지 생성 중 오류가 발생했습니다. 콘솔 로그를 확인해 주세요.")
         print("🔥 예외:", e)
-        return iter(["❌ 오류가 발생했습니다. 관리자에게 문의해 주세요."])
+        return iter([ERROR_RESPONSE])
+
+
+async def aget_kakao_response(script_context, message_list, session_id=None):
+    try:
+        call = prepare_kakao_call(script_context, message_list, session_id)
+    except Exception as e:
+        print("🔥 예외:", e)
+        yield ERROR_RESPONSE
+        return
+    async for chunk in acoalesced_stream(call):
+        yield chunk
+
+
+# ======================== 카카오톡 문자 유형별 동시 생성 ========================
+# 세 유형이 [고정 지침 → 상담 요약]까지 같은 앞부분을 공유
+KAKAO_VARIANT_MESSAGES = [
+    ("system", SYSTEM_PROMPT_KAKAO_VARIANT),
+    ("human", "[민원 상담 요약]\n{script_context}\n\n[추가 대화 요약]\n{conversation_summary}"),
+    ("human", "### {title}\n({instruction})\n\n위 유형의 카카오톡 메시지를 작성해 주세요.")
+]
+
+@lru_cache(maxsize=None)
+def get_kakao_variant_chain():
+    return text_chain(KAKAO_VARIANT_MESSAGES, get_llm("kakao"))
+
+def prepare_kakao_variant_call(style, script_context, message_list, session_id=None):
+    # 유형 하나만 생성하는 요청
+    session_id = require_session(session_id)
+    title, instruction = KAKAO_STYLES[style]
+    conversation_summary = generate_conversation_summary(message_list)
+
+    return PreparedCall(
+        "kakao_variant", session_id,
+        runnable=get_kakao_variant_chain(),
+        inputs={
+            "script_context": script_context,
+            "conversation_summary": conversation_summary,
+            "title": title,
+            "instruction": instruction,
+        },
+        config=call_config("kakao_variant"),
+    )
+
+
+def stream_kakao_variants(script_context, message_list, styles=None, session_id=None):
+    # 유형별 요청을 동시에 실행하고 (유형, 조각) 이벤트를 도착 순서대로 전달
+    # 한 유형이 끝나면 (유형, None)을 전달
+    styles = list(styles or KAKAO_STYLES)
+    try:
+        calls = {
+            style: prepare_kakao_variant_call(style, script_context, message_list, session_id)
+            for style in styles
+        }
+    except Exception as e:
+        print("🔥 예외:", e)
+        for style in styles:
+            yield style, ERROR_RESPONSE
+            yield style, None
+        return
+
+    events = queue.Queue()
+    stopped = threading.Event()
+
+    def worker(style, call):
+        # 화면(rerun)이 이 제너레이터를 버리면 구독을 끊어, 아무도 보지 않는 생성이 취소되도록 함
+        stream = coalesced_stream(call)
+        try:
+            for chunk in stream:
+                if stopped.is_set():
+                    break
+                events.put((style, chunk))
+        finally:
+            stream.close()
+            events.put((style, None))
+
+    for style, call in calls.items():
+        threading.Thread(target=worker, args=(style, call), daemon=True).start()
+
+    try:
+        remaining = len(calls)
+        while remaining:
+            style, chunk = events.get()
+            if chunk is None:
+                remaining -= 1
+            yield style, chunk
+    finally:
+        stopped.set()
+
+
+async def astream_kakao_variants(script_context, message_list, styles=None, session_id=None):
+    # stream_kakao_variants의 비동기 버전
+    styles = list(styles or KAKAO_STYLES)
+    try:
+        calls = {
+            style: prepare_kakao_variant_call(style, script_context, message_list, session_id)
+            for style in styles
+        }
+    except Exception as e:
+        print("🔥 예외:", e)
+        for style in styles:
+            yield style, ERROR_RESPONSE
+            yield style, None
+        return
+
+    events = asyncio.Queue()
+
+    async def worker(style, call):
+        try:
+            async for chunk in acoalesced_stream(call):
+                await events.put((style, chunk))
+        finally:
+            await events.put((style, None))
+
+    tasks = [asyncio.create_task(worker(style, call)) for style, call in calls.items()]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            style, chunk = await events.get()
+            if chunk is None:
+                remaining -= 1
+            yield style, chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# ======================== 워밍업 ========================
+# 가져오기(import)는 가볍게 끝내고, 모델 클라이언트(langchain_openai)와 체인 구성은 첫 요청으로 미룸
+# 서버 시작/화면 프로세스 시작 직후 warm_up()을 부르면 첫 요청이 그 비용을 치르지 않음 (LLM_WARMUP=0이면 끔)
+CHAIN_BUILDERS = (
+    get_script_chain,
+    get_chatbot_chain,
+    get_kakao_chain,
+    get_kakao_variant_chain,
+    get_random_scenario_chain,
+    get_scenario_batch_chain,
+)
+
+def warm_up():
+    started_at = time.perf_counter()
+    for build in CHAIN_BUILDERS:
+        build()
+    elapsed = time.perf_counter() - started_at
+    print(f"♨️ LLM 체인 준비 완료 ({len(CHAIN_BUILDERS)}개, {elapsed:.2f}s)")
+    return elapsed
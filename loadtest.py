@@ -0,0 +1,216 @@
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+
+# ======================== 부하 테스트 환경 ========================
+# 기본은 가짜 모델 + 임시 디렉터리 (OpenAI 호출/운영 데이터 없이 실행). 반드시 llm_comp import 전에 설정
+WORK_DIR = tempfile.mkdtemp(prefix="complaint-loadtest-")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+os.environ.setdefault("SCRIPT_CACHE_DIR", os.path.join(WORK_DIR, "cache", "scripts"))
+os.environ.setdefault("SEMANTIC_CACHE_PATH", os.path.join(WORK_DIR, "cache", "semantic"))
+os.environ.setdefault("SCENARIO_POOL_PATH", os.path.join(WORK_DIR, "cache", "scenario_pool.sqlite"))
+os.environ.setdefault("HISTORY_ROOT", os.path.join(WORK_DIR, "history"))
+os.environ.setdefault("HISTORY_INDEX_DIR", os.path.join(WORK_DIR, "index"))
+
+import llm_comp  # noqa: E402
+from conversation_store import conversation_store  # noqa: E402
+from history_index import HISTORY_ROOT, get_history_index  # noqa: E402
+from metrics import call_summary  # noqa: E402
+
+FAILURE_TEXTS = {llm_comp.ERROR_RESPONSE, llm_comp.BUSY_RESPONSE, llm_comp.TIMEOUT_NOTICE}
+
+FOLLOWUP_QUESTIONS = [
+    "고객이 계속 화를 내면서 책임자를 바꿔 달라고 하면 어떻게 말해야 할까요?",
+    "약관 조항을 쉽게 풀어서 설명하는 멘트를 알려주세요.",
+    "처리 기간이 더 걸릴 수 있다는 걸 어떻게 안내하면 좋을까요?",
+    "고객이 금융감독원에 민원을 넣겠다고 하면 어떻게 대응하나요?",
+    "마무리 인사는 어떻게 하는 게 좋을까요?",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class LoadTestRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.flows_completed = 0
+
+    def step(self, name, fn):
+        # 단계 하나를 실행하고 소요 시간/오류를 기록. 오류 응답 문구도 실패로 집계
+        started_at = time.perf_counter()
+        failed = False
+        try:
+            result = fn()
+            failed = isinstance(result, str) and any(text in result for text in FAILURE_TEXTS)
+            return result
+        except Exception as e:
+            failed = True
+            print(f"🔥 [{name}] 예외:", e)
+            return None
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with self._lock:
+                self.latencies[name].append(elapsed)
+                if failed:
+                    self.errors[name] += 1
+
+    def flow_done(self):
+        with self._lock:
+            self.flows_completed += 1
+
+
+# ======================== 가상 상담원 ========================
+def run_consultant(index, args, recorder):
+    # 로그인 → 스크립트 생성 → 추가 질문 → 카카오톡 문자 → 저장 (UI의 한 사이클과 같은 순서)
+    session_id = str(uuid.uuid4())
+    consultant_name = f"상담원{index:03d}"
+    user_folder = f"{consultant_name}_{index:04d}"
+    think = args.think_ms / 1000
+
+    recorder.step("login", lambda: llm_comp.store.get(session_id))
+
+    scenario = recorder.step("scenario", lambda: llm_comp.get_random_customer_info(session_id)) or {}
+    name = scenario.get("name") or f"고객{index}"
+    situation = scenario.get("situation") or "보험금 지급이 지연되고 있다는 민원"
+    emotion = scenario.get("emotion", 3)
+    time.sleep(think)
+
+    script = recorder.step("script", lambda: "".join(llm_comp.get_script_response(
+        name, situation, emotion,
+        session_id=session_id, consultant_name=consultant_name, extra_info=scenario.get("extra_info", ""),
+    ))) or ""
+    message_list = [{"role": "ai", "content": script}]
+
+    for turn in range(args.followups):
+        time.sleep(think)
+        question = FOLLOWUP_QUESTIONS[turn % len(FOLLOWUP_QUESTIONS)]
+        answer = recorder.step("followup", lambda: "".join(
+            llm_comp.get_chatbot_response(question, script, session_id=session_id)
+        )) or ""
+        message_list += [{"role": "user", "content": question}, {"role": "ai", "content": answer}]
+
+    time.sleep(think)
+    if args.kakao == "variants":
+        recorder.step("kakao", lambda: "".join(
+            chunk for _, chunk in llm_comp.stream_kakao_variants(script, message_list, session_id=session_id)
+            if chunk
+        ))
+    else:
+        recorder.step("kakao", lambda: "".join(
+            llm_comp.get_kakao_response(script, message_list, session_id=session_id)
+        ))
+
+    def save():
+        filename = f"{name}_{index:04d}.json"
+        data = {
+            "customer_name": name,
+            "customer_emotion_label": str(emotion),
+            "customer_situation": situation,
+            "extra_info": scenario.get("extra_info", ""),
+            "script_context": script,
+            "message_list": message_list,
+        }
+        path = os.path.join(HISTORY_ROOT, user_folder, filename)
+        conversation_store.save(path, data)
+        get_history_index(user_folder).upsert(filename, data)
+
+    recorder.step("save", save)
+    recorder.flow_done()
+
+
+# ======================== 리포트 ========================
+def print_report(args, recorder, elapsed, store_before, store_after, memory_growth, rss_before):
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    print(f"\n📊 부하 테스트 결과 (상담원 {args.users}명, 추가 질문 {args.followups}회, backend={llm_comp.LLM_BACKEND})")
+    print(f"- 전체 소요: {elapsed:.2f}s / 완료 사이클 {recorder.flows_completed}건")
+    print(f"- 처리량: {recorder.flows_completed / elapsed:.2f} 사이클/s, {total_requests / elapsed:.2f} 단계/s")
+    print(f"\n{'단계':<10}{'건수':>6}{'오류':>6}{'p50(s)':>9}{'p95(s)':>9}{'p99(s)':>9}{'최대(s)':>9}")
+    for name in ("login", "scenario", "script", "followup", "kakao", "save"):
+        values = recorder.latencies.get(name, [])
+        if not values:
+            continue
+        print(
+            f"{name:<10}{len(values):>6}{recorder.errors.get(name, 0):>6}"
+            f"{percentile(values, 50):>9.3f}{percentile(values, 95):>9.3f}"
+            f"{percentile(values, 99):>9.3f}{max(values):>9.3f}"
+        )
+
+    print("\n🧠 대화 기록 저장소(store)")
+    for key in ("sessions", "bytes", "messages", "evicted_lru", "evicted_ttl", "trimmed_messages"):
+        if key in store_after:
+            print(f"- {key}: {store_before.get(key, 0)} → {store_after[key]}")
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1 if sys.platform == "darwin" else 1024   # macOS는 바이트, 리눅스는 KB
+    print(f"- Python 힙 증가(tracemalloc): {memory_growth / 1024 / 1024:.2f} MB")
+    print(f"- 최대 RSS: {rss_before * scale / 1024 / 1024:.1f} MB → {rss_after * scale / 1024 / 1024:.1f} MB")
+    print(f"\n⏳ 제한기: {llm_comp.llm_limiter.stats()}")
+    print(f"🔗 중복 요청 합치기: {llm_comp.inflight.stats()}")
+
+    print(f"\n📈 LLM 호출 지표")
+    print(f"{'호출 유형':<24}{'건수':>6}{'오류':>6}{'TTFT p50':>10}{'전체 p95':>9}{'입력':>9}{'출력':>8}{'비용($)':>11}")
+    for item in call_summary():
+        print(
+            f"{item['call_type']:<24}{item['calls']:>6}{item['errors']:>6}"
+            f"{item['ttft_p50'] or 0:>10.3f}{item['latency_p95'] or 0:>9.3f}"
+            f"{item['input_tokens']:>9}{item['output_tokens']:>8}{item['cost_usd']:>11.6f}"
+        )
+
+
+# 사용법: python loadtest.py --users 50 --followups 3 --ramp 5
+#        FAKE_LLM_LATENCY_MS=800 FAKE_LLM_ERROR_RATE=0.02 python loadtest.py --users 100
+def main():
+    parser = argparse.ArgumentParser(description="가짜 LLM으로 상담원 N명의 전체 흐름을 동시에 실행")
+    parser.add_argument("--users", type=int, default=20, help="동시 가상 상담원 수")
+    parser.add_argument("--followups", type=int, default=3, help="상담원당 추가 질문 수")
+    parser.add_argument("--kakao", choices=["variants", "single"], default="variants")
+    parser.add_argument("--ramp", type=float, default=0.0, help="상담원 투입을 나눌 시간(초)")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="단계 사이 상담원 입력 시간(ms)")
+    parser.add_argument("--semantic-cache", action="store_true", help="추가 질문 의미 캐시 사용 (기본: 끔)")
+    args = parser.parse_args()
+
+    if not args.semantic_cache:
+        # 모든 상담원이 같은 질문을 하므로 캐시를 켜면 LLM 부하가 거의 측정되지 않음
+        llm_comp.semantic_cache.threshold = 1.01
+
+    recorder = LoadTestRecorder()
+    store_before = llm_comp.store.stats()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    heap_before, _ = tracemalloc.get_traced_memory()
+
+    started_at = time.perf_counter()
+    threads = []
+    for index in range(args.users):
+        thread = threading.Thread(target=run_consultant, args=(index, args, recorder), daemon=True)
+        threads.append(thread)
+        thread.start()
+        if args.ramp and args.users > 1:
+            time.sleep(args.ramp / (args.users - 1))
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    heap_after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print_report(args, recorder, elapsed, store_before, llm_comp.store.stats(), heap_after - heap_before, rss_before)
+    print(f"\n📁 임시 데이터: {WORK_DIR}")
+
+
+if __name__ == "__main__":
+    main()
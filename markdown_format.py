@@ -0,0 +1,79 @@
+import re
+from functools import lru_cache
+
+
+# ======================== 마크다운 자동 정리 ========================
+# 줄마다 다시 컴파일하지 않도록 패턴은 한 번만 컴파일
+TITLE_PATTERN = re.compile(r"^(▶️|✅|📌|❗|📝|📍)\s*[^:：]+[:：]?")
+TITLE_COLON_PATTERN = re.compile(r"[:：]\s*$")
+BOLD_BULLET_PATTERN = re.compile(r"^[-•]\s*\*\*.*\*\*")
+BULLET_PATTERN = re.compile(r"^[-•]\s*")
+
+
+def format_markdown(text: str) -> str:
+    lines = text.strip().splitlines()
+    formatted_lines = []
+    indent_next = False
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            formatted_lines.append("")
+            indent_next = False
+            continue
+
+        if TITLE_PATTERN.match(line):
+            title = TITLE_COLON_PATTERN.sub("", line)
+            formatted_lines.append(f"**{title}**\n")
+            indent_next = False
+            continue
+
+        if BOLD_BULLET_PATTERN.match(line):
+            formatted_lines.append(BULLET_PATTERN.sub("- ", line, count=1))
+            indent_next = True
+            continue
+
+        if BULLET_PATTERN.match(line):
+            if indent_next:
+                formatted_lines.append("    " + BULLET_PATTERN.sub("- ", line, count=1))
+            else:
+                formatted_lines.append(BULLET_PATTERN.sub("- ", line, count=1))
+            continue
+
+        formatted_lines.append(line)
+        indent_next = False
+
+    return "\n".join(formatted_lines).strip() + "\n"
+
+
+# ======================== 메시지 렌더링 캐시 ========================
+# 이미 표시한 메시지는 rerun마다 다시 정리하지 않고 내용(해시) 기준으로 재사용
+# 스트리밍 중 중간 결과는 캐시를 오염시키지 않도록 format_markdown을 직접 사용
+@lru_cache(maxsize=4096)
+def format_markdown_cached(text: str) -> str:
+    return format_markdown(text)
+
+
+@lru_cache(maxsize=4096)
+def render_message_parts(role, content, avatar_html):
+    # (말풍선 시작 HTML, 본문 마크다운 또는 None, 말풍선 끝 HTML)
+    if role == "user":
+        display_html = f"""
+        <div class="message-container user">
+            <div class="user-message">{content}</div>
+            {avatar_html}
+        </div>
+        """
+        return display_html, None, None
+
+    display_html = f"""
+        <div class="message-container ai">
+            {avatar_html}
+            <div class="ai-message">
+        """
+    return display_html, format_markdown_cached(content), "</div></div>"
+
+
+def render_cache_stats():
+    info = render_message_parts.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
@@ -0,0 +1,460 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# ======================== 설정 ========================
+# text: 사람이 읽는 한 줄 로그 / json: 호출마다 구조화된 JSON 한 줄 / off: 호출별 로그 끔
+METRICS_LOG_FORMAT = os.getenv("LLM_METRICS_LOG", "text").lower()
+
+# 모델별 토큰 1M당 가격($): (입력, 캐시된 입력, 출력). 목록에 없는 모델은 비용 0으로 집계
+MODEL_PRICES = {
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+
+
+def model_price(model):
+    # "gpt-4.1-mini-2025-04-14", "fake:gpt-4.1-mini"처럼 붙은 접두어/날짜는 무시하고 가장 긴 이름으로 매칭
+    name = (model or "").split(":")[-1]
+    for known in sorted(MODEL_PRICES, key=len, reverse=True):
+        if name.startswith(known):
+            return MODEL_PRICES[known]
+    return None
+
+
+def estimate_cost(model, usage):
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    input_price, cached_price, output_price = price
+    uncached = max(0, usage["input_tokens"] - usage["cached_tokens"])
+    return (
+        uncached * input_price + usage["cached_tokens"] * cached_price + usage["output_tokens"] * output_price
+    ) / 1_000_000
+
+
+# ======================== Prometheus 지표 ========================
+# 라벨 조합별 카운터/게이지/히스토그램 누적치. /metrics 에서 Prometheus 텍스트 형식으로 내보냄
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    "llm_calls_total": ("counter", "LLM calls by call type, model and status"),
+    "llm_retries_total": ("counter", "LLM call retries"),
+    "llm_tokens_total": ("counter", "LLM tokens by kind (prompt, completion, cached)"),
+    "llm_cost_usd_total": ("counter", "Estimated LLM cost in USD"),
+    "llm_latency_seconds": ("histogram", "LLM call latency"),
+    "llm_ttft_seconds": ("histogram", "LLM time to first token"),
+    "llm_queue_wait_seconds": ("histogram", "Time spent waiting for an LLM slot"),
+    "llm_stream_requests_total": ("counter", "Streamed responses by status and cache (hit, miss)"),
+    "llm_cancellations_total": ("counter", "Generations stopped before completion (timeout, abandoned, session)"),
+    "generation_jobs_total": ("counter", "Background generation jobs finished by kind and status"),
+    "generation_job_wait_seconds": ("histogram", "Time a generation job waited in the queue"),
+    "generation_job_run_seconds": ("histogram", "Time a worker spent running a generation job"),
+    "generation_queue_depth": ("gauge", "Generation jobs waiting for a worker"),
+    "generation_workers_busy": ("gauge", "Generation workers currently running a job"),
+    "generation_worker_utilization": ("gauge", "Share of worker time spent running jobs since start"),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: defaultdict(float))
+        self._gauges = defaultdict(dict)
+        # 이름 -> 라벨 -> [버킷별 누적 개수..., 합계, 개수]
+        self._histograms = defaultdict(dict)
+
+    def inc(self, name, labels, amount=1.0):
+        with self._lock:
+            self._counters[name][_label_key(labels)] += amount
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._gauges[name][_label_key(labels)] = value
+
+    def observe(self, name, labels, value):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = self._histograms[name][key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            counters.update({name: dict(series) for name, series in self._gauges.items()})
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+
+        lines = []
+        for name in sorted(set(counters) | set(histograms)):
+            kind, help_text = METRIC_HELP.get(name, ("counter" if name in counters else "histogram", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(counters.get(name, {}).items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+            for key, series in sorted(histograms.get(name, {}).items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', str(bound))])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_number(series[-2])}")
+                lines.append(f"{name}_count{_format_labels(key)} {series[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def record_queue_wait(call_type, seconds):
+    REGISTRY.observe("llm_queue_wait_seconds", {"call_type": call_type}, seconds)
+
+
+def record_cancel(call_type, reason):
+    REGISTRY.inc("llm_cancellations_total", {"call_type": call_type, "reason": reason})
+
+
+def record_job(kind, status, wait, run):
+    labels = {"kind": kind}
+    REGISTRY.inc("generation_jobs_total", {**labels, "status": status})
+    REGISTRY.observe("generation_job_wait_seconds", labels, wait)
+    REGISTRY.observe("generation_job_run_seconds", labels, run)
+
+
+def record_job_queue(depth, busy, utilization):
+    REGISTRY.set("generation_queue_depth", {}, depth)
+    REGISTRY.set("generation_workers_busy", {}, busy)
+    REGISTRY.set("generation_worker_utilization", {}, utilization)
+
+
+def record_retry(call_type, model=None, error=None):
+    REGISTRY.inc("llm_retries_total", {"call_type": call_type, "model": model or "unknown"})
+    print(f"🔁 [{call_type}] 재시도:", repr(error) if error else "-")
+
+
+# ======================== 스트리밍 지표 ========================
+# 호출별 첫 토큰 도달 시간(TTFT)과 전체 소요 시간을 최근 N건까지 보관
+STREAM_METRICS = deque(maxlen=1000)
+
+
+def record_stream(call_type, started_at, first_token_at, chars, error=None, queue_wait=0.0, status=None,
+                  cached=False):
+    # cached: 캐시에서 바로 돌려준 응답. 대기열을 거치지 않으므로 대기 시간 히스토그램에는 넣지 않고
+    # cache="hit" 라벨로 따로 셈 (실제 LLM 호출의 p50/p95가 낮게 왜곡되지 않도록)
+    finished_at = time.perf_counter()
+    entry = {
+        "call_type": call_type,
+        "cache": "hit" if cached else "miss",
+        "queue_wait": queue_wait,
+        "ttft": (first_token_at - started_at) if first_token_at else None,
+        "total": finished_at - started_at,
+        "chars": chars,
+        "error": repr(error) if error else None,
+        "status": status or ("error" if error else "ok"),
+        "timestamp": time.time(),
+    }
+    STREAM_METRICS.append(entry)
+    REGISTRY.inc("llm_stream_requests_total",
+                 {"call_type": call_type, "status": entry["status"], "cache": entry["cache"]})
+    if not cached:
+        record_queue_wait(call_type, queue_wait)
+
+    ttft_text = f"{entry['ttft']:.2f}s" if entry["ttft"] is not None else "-"
+    print(f"⏱️ [{call_type}] 대기 {queue_wait:.2f}s / TTFT {ttft_text} / 전체 {entry['total']:.2f}s / {chars}자")
+    return entry
+
+
+def recent_stream_metrics(call_type=None, limit=50, include_cached=True):
+    items = [
+        m for m in STREAM_METRICS
+        if (call_type is None or m["call_type"] == call_type) and (include_cached or m["cache"] != "hit")
+    ]
+    return items[-limit:]
+
+
+# ======================== 토큰 사용량 ========================
+# 호출 유형별 입력/출력/캐시 토큰 누적치 (프롬프트 캐시 적중률 확인용)
+USAGE_METRICS = deque(maxlen=1000)
+USAGE_TOTALS = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0})
+_usage_lock = threading.Lock()
+
+
+def extract_usage(response):
+    # LLMResult에서 usage_metadata(스트리밍 포함)를 꺼내 합산
+    usage = {"input_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "model": None}
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            metadata = getattr(message, "usage_metadata", None) or {}
+            details = metadata.get("input_token_details") or {}
+            usage["input_tokens"] += metadata.get("input_tokens", 0)
+            usage["output_tokens"] += metadata.get("output_tokens", 0)
+            usage["cached_tokens"] += details.get("cache_read", 0) or 0
+            if message is not None and usage["model"] is None:
+                usage["model"] = (message.response_metadata or {}).get("model_name")
+    return usage
+
+
+def record_usage(call_type, usage):
+    entry = {"call_type": call_type, "timestamp": time.time(), **usage}
+    USAGE_METRICS.append(entry)
+    with _usage_lock:
+        totals = USAGE_TOTALS[call_type]
+        totals["calls"] += 1
+        totals["input_tokens"] += usage["input_tokens"]
+        totals["cached_tokens"] += usage["cached_tokens"]
+        totals["output_tokens"] += usage["output_tokens"]
+    return entry
+
+
+def usage_summary():
+    with _usage_lock:
+        summary = {k: dict(v) for k, v in USAGE_TOTALS.items()}
+    for totals in summary.values():
+        totals["cache_hit_ratio"] = (
+            totals["cached_tokens"] / totals["input_tokens"] if totals["input_tokens"] else 0.0
+        )
+    return summary
+
+
+# ======================== LLM 호출 지표 ========================
+# 호출(LLM 실행) 단위 기록: 최근 N건은 주기 로그의 p50/p95 계산에 사용
+CALL_METRICS = deque(maxlen=5000)
+
+
+def record_call(call_type, model, latency, ttft=None, usage=None, error=None):
+    labels = {"call_type": call_type, "model": model}
+    # Exception이 아닌 중단(취소/제한 시간 초과, asyncio 취소)은 오류와 구분해서 집계
+    status = "ok" if error is None else ("error" if isinstance(error, Exception) else "cancelled")
+    REGISTRY.inc("llm_calls_total", {**labels, "status": status})
+    REGISTRY.observe("llm_latency_seconds", labels, latency)
+    if ttft is not None:
+        REGISTRY.observe("llm_ttft_seconds", labels, ttft)
+
+    cost = 0.0
+    if usage is not None:
+        record_usage(call_type, usage)
+        cost = estimate_cost(model, usage)
+        REGISTRY.inc("llm_tokens_total", {**labels, "kind": "prompt"}, usage["input_tokens"])
+        REGISTRY.inc("llm_tokens_total", {**labels, "kind": "completion"}, usage["output_tokens"])
+        REGISTRY.inc("llm_tokens_total", {**labels, "kind": "cached"}, usage["cached_tokens"])
+        REGISTRY.inc("llm_cost_usd_total", labels, cost)
+
+    entry = {
+        "event": "llm_call",
+        "timestamp": time.time(),
+        "call_type": call_type,
+        "model": model,
+        "status": status,
+        "latency": round(latency, 4),
+        "ttft": round(ttft, 4) if ttft is not None else None,
+        "input_tokens": usage["input_tokens"] if usage else 0,
+        "cached_tokens": usage["cached_tokens"] if usage else 0,
+        "output_tokens": usage["output_tokens"] if usage else 0,
+        "cost_usd": round(cost, 8),
+        "error": repr(error) if error else None,
+    }
+    CALL_METRICS.append(entry)
+
+    if METRICS_LOG_FORMAT == "json":
+        print(json.dumps(entry, ensure_ascii=False))
+    elif METRICS_LOG_FORMAT != "off":
+        if status == "cancelled":
+            print(f"🛑 [{call_type}] {model} 호출 중단 ({latency:.2f}s):", repr(error))
+        elif error:
+            print(f"🔥 [{call_type}] {model} 호출 실패 ({latency:.2f}s):", repr(error))
+        else:
+            ttft_text = f"{ttft:.2f}s" if ttft is not None else "-"
+            print(
+                f"💰 [{call_type}] {model} 입력 {entry['input_tokens']} (캐시 {entry['cached_tokens']}) "
+                f"/ 출력 {entry['output_tokens']} / ${cost:.6f} / TTFT {ttft_text} / 전체 {latency:.2f}s"
+            )
+    return entry
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    # 체인 호출 config의 callbacks로 전달해 LLM 실행마다 지연 시간/토큰/비용/오류를 기록
+    # (프롬프트/파서/대화 기록 단계는 무시하고 LLM 이벤트만 집계)
+    def __init__(self, call_type, model=None):
+        self.call_type = call_type
+        self.model = model
+        self._runs = {}
+
+    def _start(self, run_id, invocation_params, metadata):
+        # 요청한 모델명으로 태그 (응답의 날짜 붙은 모델명보다 라벨 수가 적음)
+        params = invocation_params or {}
+        model = (
+            params.get("model") or params.get("model_name")
+            or (metadata or {}).get("ls_model_name") or self.model
+        )
+        self._runs[run_id] = {"started_at": time.perf_counter(), "first_token_at": None, "model": model}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, metadata=None, **kwargs):
+        self._start(run_id, invocation_params, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, invocation_params=None, metadata=None, **kwargs):
+        self._start(run_id, invocation_params, metadata)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and run["first_token_at"] is None and token:
+            run["first_token_at"] = time.perf_counter()
+
+    def _finish(self, run_id, usage=None, error=None):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        finished_at = time.perf_counter()
+        ttft = run["first_token_at"] - run["started_at"] if run["first_token_at"] else None
+        model = run["model"] or (usage or {}).get("model") or "unknown"
+        record_call(self.call_type, model, finished_at - run["started_at"], ttft, usage, error)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        try:
+            self._finish(run_id, usage=extract_usage(response))
+        except Exception as e:
+            print(f"🔥 호출 지표 기록 실패 ({self.call_type}):", e)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        try:
+            self._finish(run_id, error=error)
+        except Exception as e:
+            print(f"🔥 호출 지표 기록 실패 ({self.call_type}):", e)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        outcome = getattr(retry_state, "outcome", None)
+        record_retry(self.call_type, self.model, outcome.exception() if outcome is not None else None)
+
+
+# ======================== 내보내기 ========================
+def call_summary(since=0.0):
+    # since 이후 호출을 (호출 유형, 모델)별로 요약 (주기 로그용)
+    groups = defaultdict(list)
+    for entry in list(CALL_METRICS):
+        if entry["timestamp"] > since:
+            groups[(entry["call_type"], entry["model"])].append(entry)
+
+    def pct(values, p):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 4)
+
+    summary = []
+    for (call_type, model), entries in sorted(groups.items()):
+        latencies = [e["latency"] for e in entries]
+        ttfts = [e["ttft"] for e in entries if e["ttft"] is not None]
+        summary.append({
+            "call_type": call_type,
+            "model": model,
+            "calls": len(entries),
+            "errors": sum(1 for e in entries if e["status"] == "error"),
+            "latency_p50": pct(latencies, 50),
+            "latency_p95": pct(latencies, 95),
+            "ttft_p50": pct(ttfts, 50),
+            "ttft_p95": pct(ttfts, 95),
+            "input_tokens": sum(e["input_tokens"] for e in entries),
+            "cached_tokens": sum(e["cached_tokens"] for e in entries),
+            "output_tokens": sum(e["output_tokens"] for e in entries),
+            "cost_usd": round(sum(e["cost_usd"] for e in entries), 6),
+        })
+    return summary
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # 스크레이프 요청마다 접근 로그를 남기지 않음
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    # Prometheus 스크레이프용 /metrics 엔드포인트 (프로세스당 한 번만 시작)
+    with _exporters_lock:
+        if "server" in _exporters:
+            return _exporters["server"]
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        except OSError as e:
+            print(f"🔥 지표 서버 시작 실패 (포트 {port}):", e)
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _exporters["server"] = server
+        print(f"📈 지표 엔드포인트: http://{host}:{port}/metrics")
+        return server
+
+
+def start_metrics_logger(interval):
+    # interval초마다 직전 구간의 호출 요약을 JSON 한 줄씩 출력
+    with _exporters_lock:
+        if "logger" in _exporters:
+            return _exporters["logger"]
+
+        def run():
+            since = time.time()
+            while True:
+                time.sleep(interval)
+                now = time.time()
+                for item in call_summary(since):
+                    print(json.dumps({"event": "llm_metrics", "interval": interval, **item}, ensure_ascii=False))
+                since = now
+
+        thread = threading.Thread(target=run, name="metrics-logger", daemon=True)
+        thread.start()
+        _exporters["logger"] = thread
+        return thread
+
+
+def start_exporters():
+    # METRICS_PORT: /metrics 엔드포인트 포트 (미설정 시 끔), METRICS_LOG_INTERVAL: 주기 요약 로그 간격(초, 0이면 끔)
+    port = os.getenv("METRICS_PORT")
+    if port:
+        start_metrics_server(int(port), os.getenv("METRICS_HOST", "0.0.0.0"))
+    interval = float(os.getenv("METRICS_LOG_INTERVAL", "0"))
+    if interval > 0:
+        start_metrics_logger(interval)
@@ -0,0 +1,116 @@
+import os
+from functools import lru_cache
+
+# ======================== 설정 ========================
+# openai: 실제 OpenAI 호출 / fake: 부하 테스트용 가짜 모델 (fake_llm.py, FAKE_LLM_* 환경 변수로 조절)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+
+DEFAULT_MODEL = "gpt-4.1-mini"
+
+# OpenAI SDK 자체 재시도 횟수. 기본 0: 재시도는 stream_response가 작업별 제한 시간 안에서 직접 하고,
+# SDK가 재시도하면 요청 타임아웃(deadline) × (재시도 + 1) × (대체 모델 수)만큼 늘어날 수 있음
+LLM_SDK_MAX_RETRIES = int(os.getenv("LLM_SDK_MAX_RETRIES", "0"))
+
+# ======================== 작업별 모델 라우팅 ========================
+# 작업마다 모델/temperature/max_tokens/대체 모델을 따로 지정
+# temperature, max_tokens가 None이면 모델 기본값 사용 (스크립트 품질은 기존 설정 그대로 유지)
+# fallback: 기본 모델 호출이 실패(재시도 소진)하면 한 번 더 시도할 더 저렴한 모델 (None이면 사용 안 함)
+# deadline: 대기열 대기 + 생성까지 허용하는 전체 시간(초). OpenAI 요청 타임아웃으로도 사용
+MODEL_ROUTES = {
+    "script": {"model": DEFAULT_MODEL, "temperature": None, "max_tokens": None,
+               "fallback": "gpt-4.1-nano", "deadline": 120.0},
+    "chatbot": {"model": DEFAULT_MODEL, "temperature": None, "max_tokens": 1500,
+                "fallback": "gpt-4.1-nano", "deadline": 60.0},
+    "kakao": {"model": DEFAULT_MODEL, "temperature": None, "max_tokens": 1000,
+              "fallback": "gpt-4.1-nano", "deadline": 60.0},
+    # 랜덤 시나리오는 교육용 가상 데이터라 빠르고 저렴한 모델로 충분
+    "random_scenario": {"model": "gpt-4.1-nano", "temperature": 1.0, "max_tokens": 3000,
+                        "fallback": "gpt-4o-mini", "deadline": 90.0},
+    # 대화 요약용 (현재 추가 대화 요약은 규칙 기반이며, LLM 요약을 붙일 때 이 설정을 사용)
+    "summary": {"model": "gpt-4.1-nano", "temperature": 0.2, "max_tokens": 600,
+                "fallback": None, "deadline": 30.0},
+}
+
+# 호출 유형(지표 라벨) -> 작업
+TASK_BY_CALL_TYPE = {
+    "kakao_variant": "kakao",
+    "random_scenario_batch": "random_scenario",
+}
+
+
+def _env_value(name, default, cast):
+    # 빈 문자열은 "사용 안 함"(None)으로 취급
+    value = os.getenv(name)
+    if value is None:
+        return default
+    value = value.strip()
+    return cast(value) if value else None
+
+
+def load_routes():
+    # 환경 변수로 작업별 설정 덮어쓰기: LLM_MODEL_SCRIPT, LLM_TEMPERATURE_CHATBOT, LLM_MAX_TOKENS_KAKAO,
+    # LLM_FALLBACK_RANDOM_SCENARIO (빈 값이면 대체 모델 끔), LLM_DEADLINE_SCRIPT (빈 값이면 제한 없음)
+    routes = {}
+    for task, route in MODEL_ROUTES.items():
+        suffix = task.upper()
+        routes[task] = {
+            "model": os.getenv(f"LLM_MODEL_{suffix}") or route["model"],
+            "temperature": _env_value(f"LLM_TEMPERATURE_{suffix}", route["temperature"], float),
+            "max_tokens": _env_value(f"LLM_MAX_TOKENS_{suffix}", route["max_tokens"], int),
+            "fallback": _env_value(f"LLM_FALLBACK_{suffix}", route["fallback"], str),
+            "deadline": _env_value(f"LLM_DEADLINE_{suffix}", route["deadline"], float),
+        }
+    return routes
+
+
+ROUTES = load_routes()
+
+
+def task_for(call_type):
+    task = TASK_BY_CALL_TYPE.get(call_type, call_type)
+    return task if task in ROUTES else "script"
+
+
+def route_for(call_type):
+    return ROUTES[task_for(call_type)]
+
+
+# ======================== 모델 클라이언트 ========================
+@lru_cache(maxsize=None)
+def get_chat_model(model, temperature=None, max_tokens=None, timeout=None):
+    # (모델, temperature, max_tokens, 타임아웃) 조합마다 클라이언트 하나를 만들어 재사용
+    # langchain_openai(openai SDK 포함)는 가져오는 데만 약 1초가 걸려, 첫 클라이언트를 만들 때 가져옴
+    if LLM_BACKEND == "fake":
+        from fake_llm import create_fake_llm
+        return create_fake_llm(model)
+    from langchain_openai import ChatOpenAI
+
+    options = {}
+    if timeout is not None:
+        # 응답 없는 호출이 작업 스레드를 무기한 붙잡지 않도록 HTTP 요청 타임아웃 지정
+        options["timeout"] = timeout
+    if temperature is not None:
+        options["temperature"] = temperature
+    if max_tokens is not None:
+        options["max_tokens"] = max_tokens
+    # stream_usage=True: 스트리밍 응답에서도 토큰 사용량(캐시 토큰 포함)을 받음
+    return ChatOpenAI(model=model, stream_usage=True, max_retries=LLM_SDK_MAX_RETRIES, **options)
+
+
+@lru_cache(maxsize=None)
+def get_task_llm(task):
+    # 작업별 모델 + 대체 모델. 스트리밍은 첫 조각을 받기 전에 실패했을 때만 대체 모델로 넘어감
+    route = ROUTES[task]
+    llm = get_chat_model(route["model"], route["temperature"], route["max_tokens"], route["deadline"])
+    if route["fallback"] and route["fallback"] != route["model"]:
+        fallback = get_chat_model(route["fallback"], route["temperature"], route["max_tokens"], route["deadline"])
+        return llm.with_fallbacks([fallback])
+    return llm
+
+
+def describe_routes():
+    return {
+        task: f"{route['model']} (temperature={route['temperature']}, max_tokens={route['max_tokens']}, "
+              f"fallback={route['fallback']}, deadline={route['deadline']})"
+        for task, route in ROUTES.items()
+    }
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+
+
+# ======================== 입력 정규화 ========================
+def normalize_text(value):
+    # 공백/유니코드 표기 차이만 있는 입력은 같은 키가 되도록 정리
+    text = unicodedata.normalize("NFC", str(value if value is not None else ""))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(*parts):
+    payload = json.dumps([normalize_text(p) for p in parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ======================== 디스크 응답 캐시 ========================
+class DiskResponseCache:
+    # 입력 해시를 파일명으로 쓰는 콘텐츠 주소 기반 캐시 (TTL + 개수/용량 제한)
+    def __init__(self, directory, ttl=7 * 24 * 3600, max_entries=2000, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evicted": 0, "bypassed": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    # ---------- 조회/저장 ----------
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+
+        if self.ttl > 0 and time.time() - entry.get("created_at", 0) > self.ttl:
+            self._remove(path)
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        # 최근 사용 시각을 mtime으로 기록해 LRU 축출에 활용
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._count("hits")
+        return entry.get("value")
+
+    def put(self, key, value, **meta):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"value": value, "created_at": time.time(), **meta}
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._count("writes")
+        self._evict()
+
+    def bypass(self):
+        # "새로 생성하기" 요청은 캐시를 읽지 않고 결과만 갱신
+        self._count("bypassed")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        return counters
+
+    # ---------- 축출 ----------
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        if len(entries) <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        entries.sort()  # 오래 사용하지 않은 항목부터
+        evicted = 0
+        for _, size, path in entries:
+            if len(entries) - evicted <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+            evicted += 1
+        self._count("evicted", evicted)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
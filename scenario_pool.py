@@ -0,0 +1,226 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from history_store import _ImmediateTransaction
+from response_cache import make_cache_key
+
+
+# ======================== 시나리오 식별 ========================
+def scenario_fingerprint(scenario):
+    # 이름 + 민원 내용이 같으면 같은 시나리오로 간주
+    return make_cache_key(scenario.get("name", ""), scenario.get("situation", ""))
+
+
+# ======================== 랜덤 시나리오 풀 ========================
+class ScenarioPool:
+    # 미리 생성해 둔 교육용 랜덤 민원 시나리오를 바로 꺼내 쓰는 풀
+    # 재고가 low_water 이하로 내려가면 백그라운드 스레드가 capacity까지 채움
+    #
+    # 재고와 제공한 시나리오 지문은 SQLite(WAL) 파일에 두고 여러 프로세스(서버 워커/UI 복제본)가 공유
+    # - 꺼내기는 BEGIN IMMEDIATE 트랜잭션 안에서 조회 + 삭제하므로 같은 시나리오를 두 프로세스가 제공하지 않음
+    # - 보충은 임대(lease)를 잡은 프로세스 하나만 실행 (임대는 lease_seconds 뒤 만료되어 멈춘 프로세스 대신 다른 쪽이 이어받음)
+    # - 카운터(stats의 served_from_pool 등)는 프로세스 단위, available/served_tracked는 공유 값
+    def __init__(self, generate_batch, path, capacity=50, low_water=10, batch_size=1,
+                 served_history=5000, retry_delay=10.0, busy_timeout=5.0, lease_seconds=120.0):
+        self.generate_batch = generate_batch   # n -> list[dict]
+        self.path = path
+        self.capacity = capacity
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.served_history = served_history
+        self.retry_delay = retry_delay
+        self.busy_timeout = busy_timeout
+        self.lease_seconds = lease_seconds
+        self.instance_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._counters = {"served_from_pool": 0, "served_live": 0, "generated": 0, "duplicates": 0, "errors": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._write() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scenario_pool (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fingerprint TEXT NOT NULL UNIQUE,
+                    scenario TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scenario_served (
+                    fingerprint TEXT PRIMARY KEY,
+                    served_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_scenario_served_at ON scenario_served (served_at)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scenario_pool_lease (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    # ---------- 연결 ----------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _ImmediateTransaction(self._connect())
+
+    def available(self):
+        return self._connect().execute("SELECT COUNT(*) FROM scenario_pool").fetchone()[0]
+
+    # ---------- 제공 ----------
+    def take(self):
+        # 풀에서 즉시 하나 꺼냄. 비어 있으면 None (호출 측에서 실시간 생성)
+        self.start()
+        with self._write() as conn:
+            row = conn.execute("SELECT id, scenario FROM scenario_pool ORDER BY id LIMIT 1").fetchone()
+            scenario = None
+            if row is not None:
+                conn.execute("DELETE FROM scenario_pool WHERE id = ?", (row[0],))
+                scenario = json.loads(row[1])
+                self._mark_served(conn, scenario)
+            remaining = conn.execute("SELECT COUNT(*) FROM scenario_pool").fetchone()[0]
+        if scenario is not None:
+            with self._lock:
+                self._counters["served_from_pool"] += 1
+        if remaining <= self.low_water:
+            self._wakeup.set()
+        return scenario
+
+    def mark_served_live(self, scenario):
+        with self._write() as conn:
+            self._mark_served(conn, scenario)
+        with self._lock:
+            self._counters["served_live"] += 1
+
+    def _mark_served(self, conn, scenario):
+        conn.execute(
+            "INSERT OR REPLACE INTO scenario_served (fingerprint, served_at) VALUES (?, ?)",
+            (scenario_fingerprint(scenario), time.time()),
+        )
+        # 오래된 지문부터 served_history개만 남김
+        conn.execute(
+            """
+            DELETE FROM scenario_served WHERE fingerprint IN (
+                SELECT fingerprint FROM scenario_served ORDER BY served_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.served_history,),
+        )
+
+    # ---------- 보충 ----------
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="scenario-pool", daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self._refill()
+            except Exception as e:
+                with self._lock:
+                    self._counters["errors"] += 1
+                print("🔥 시나리오 풀 보충 실패:", e)
+                time.sleep(self.retry_delay)
+                self._wakeup.set()
+
+    def _refill(self):
+        # 다른 프로세스가 보충 중이면 그쪽에 맡김 (같은 재고를 여러 프로세스가 동시에 생성하지 않도록)
+        if not self._acquire_lease():
+            return
+        try:
+            while True:
+                missing = self.capacity - self.available()
+                if missing <= 0:
+                    return
+                batch = self.generate_batch(min(self.batch_size, missing))
+                if not batch or self.add(batch) == 0:
+                    raise RuntimeError("새 시나리오를 만들지 못했습니다 (빈 결과 또는 모두 중복).")
+                if not self._acquire_lease():
+                    return
+        finally:
+            self._release_lease()
+
+    def _acquire_lease(self):
+        # 비어 있거나 만료됐거나 이미 내 것이면 잡고(연장하고) True
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM scenario_pool_lease WHERE name = 'refill'").fetchone()
+            if row is not None and row[0] != self.instance_id and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO scenario_pool_lease (name, owner, expires_at) VALUES ('refill', ?, ?)",
+                (self.instance_id, now + self.lease_seconds),
+            )
+        return True
+
+    def _release_lease(self):
+        with self._write() as conn:
+            conn.execute("DELETE FROM scenario_pool_lease WHERE name = 'refill' AND owner = ?", (self.instance_id,))
+
+    def add(self, scenarios):
+        # 재고/이미 제공한 시나리오와 겹치는 것은 버리고 capacity까지만 추가
+        added = duplicates = 0
+        with self._write() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM scenario_pool").fetchone()[0]
+            for scenario in scenarios:
+                if count >= self.capacity:
+                    break
+                fingerprint = scenario_fingerprint(scenario)
+                if conn.execute("SELECT 1 FROM scenario_served WHERE fingerprint = ?", (fingerprint,)).fetchone():
+                    duplicates += 1
+                    continue
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO scenario_pool (fingerprint, scenario, created_at) VALUES (?, ?, ?)",
+                    (fingerprint, json.dumps(scenario, ensure_ascii=False), time.time()),
+                )
+                if cursor.rowcount == 0:
+                    duplicates += 1
+                    continue
+                count += 1
+                added += 1
+        with self._lock:
+            self._counters["generated"] += added
+            self._counters["duplicates"] += duplicates
+        return added
+
+    def stats(self):
+        conn = self._connect()
+        available = conn.execute("SELECT COUNT(*) FROM scenario_pool").fetchone()[0]
+        served_tracked = conn.execute("SELECT COUNT(*) FROM scenario_served").fetchone()[0]
+        with self._lock:
+            return {**self._counters, "available": available, "served_tracked": served_tracked,
+                    "capacity": self.capacity, "low_water": self.low_water}
@@ -0,0 +1,153 @@
+import json
+import re
+
+
+# ======================== 시나리오 스키마 ========================
+SCENARIO_FIELDS = ("name", "situation", "emotion", "extra_info")
+REQUIRED_FIELDS = ("name", "situation")
+
+# 모델이 한글 키나 다른 표기로 답하는 경우도 표준 필드로 맞춤
+FIELD_ALIASES = {
+    "이름": "name",
+    "고객 이름": "name",
+    "민원 내용": "situation",
+    "민원내용": "situation",
+    "고객 감정 상태": "emotion",
+    "감정 상태": "emotion",
+    "emotion_level": "emotion",
+    "추가 참고 정보": "extra_info",
+    "추가 정보": "extra_info",
+    "extra": "extra_info",
+}
+
+# 기존 줄 단위 출력 형식의 라벨
+LINE_LABELS = (
+    ("이름:", "name"),
+    ("민원 내용:", "situation"),
+    ("고객 감정 상태:", "emotion"),
+    ("추가 참고 정보:", "extra_info"),
+)
+
+
+def coerce_emotion(value, default=3):
+    # "4", "4점", "4 (화남)", 4.0 등을 1~5 정수로 보정. 숫자가 없으면 기본값
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        number = int(round(value))
+    else:
+        match = re.search(r"\d+", str(value or ""))
+        if not match:
+            return default
+        number = int(match.group())
+    return min(5, max(1, number))
+
+
+def coerce_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "\n".join(coerce_text(v) for v in value if v is not None).strip()
+    return str(value).strip()
+
+
+def validate_scenario(item):
+    # 스키마에 맞게 보정한 시나리오와 보정 여부를 반환. 복구할 수 없으면 (None, False)
+    if not isinstance(item, dict):
+        return None, False
+
+    data = {}
+    for key, value in item.items():
+        field = FIELD_ALIASES.get(str(key).strip(), str(key).strip())
+        if field in SCENARIO_FIELDS and field not in data:
+            data[field] = value
+
+    scenario = {
+        "name": coerce_text(data.get("name")),
+        "situation": coerce_text(data.get("situation")),
+        "emotion": coerce_emotion(data.get("emotion")),
+        "extra_info": coerce_text(data.get("extra_info")),
+    }
+    if any(not scenario[field] for field in REQUIRED_FIELDS):
+        return None, False
+    return scenario, scenario != item
+
+
+# ======================== 응답 파싱 ========================
+def extract_json(text):
+    # 코드 블록, 앞뒤 설명 문장이 섞여 있어도 가장 바깥 JSON을 꺼냄
+    text = (text or "").strip()
+    fence = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    if fence:
+        text = fence.group(1).strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    for open_ch, close_ch in (("[", "]"), ("{", "}")):
+        start, end = text.find(open_ch), text.rfind(close_ch)
+        if start != -1 and end > start:
+            try:
+                return json.loads(text[start:end + 1])
+            except ValueError:
+                continue
+    return None
+
+
+def iter_json_objects(text):
+    # 배열 전체가 깨졌을 때(출력이 중간에 잘린 경우 등) 온전한 객체만 하나씩 복구
+    decoder = json.JSONDecoder()
+    text = text or ""
+    index = 0
+    while True:
+        start = text.find("{", index)
+        if start == -1:
+            return
+        try:
+            obj, end = decoder.raw_decode(text, start)
+        except ValueError:
+            index = start + 1
+            continue
+        if isinstance(obj, dict) and "scenarios" not in obj:
+            yield obj
+        index = end
+
+
+def parse_scenario_batch(text):
+    # JSON 배열(또는 {"scenarios": [...]}) 응답을 검증해 (시나리오 목록, 리포트) 반환
+    data = extract_json(text)
+    if isinstance(data, dict):
+        data = data.get("scenarios", [data])
+    if not isinstance(data, list):
+        data = list(iter_json_objects(text))
+
+    scenarios = []
+    report = {"received": len(data), "valid": 0, "repaired": 0, "dropped": 0}
+    for item in data:
+        scenario, repaired = validate_scenario(item)
+        if scenario is None:
+            report["dropped"] += 1
+            continue
+        scenarios.append(scenario)
+        report["valid"] += 1
+        report["repaired"] += int(repaired)
+    return scenarios, report
+
+
+def parse_scenario_text(text):
+    # 기존 "이름: ..." 줄 단위 형식 파싱. 여러 줄에 걸친 항목은 이어 붙임
+    info = {}
+    current = None
+    for line in (text or "").splitlines():
+        stripped = line.strip()
+        label_line = stripped.lstrip("-• ").strip()
+        for label, field in LINE_LABELS:
+            if label_line.startswith(label):
+                current = field
+                info[field] = label_line[len(label):].strip()
+                break
+        else:
+            if current and stripped:
+                info[current] = f"{info[current]}\n{stripped}".strip()
+    scenario, _ = validate_scenario(info)
+    return scenario
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from response_cache import normalize_text
+
+
+# ======================== 로컬 임베딩 ========================
+class HashingEmbedder:
+    # 문자 n-gram을 해시해 고정 길이 벡터로 만드는 오프라인 임베딩 (외부 API 호출 없음)
+    def __init__(self, dim=512, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _ngrams(self, text):
+        # 한국어 띄어쓰기 차이에 흔들리지 않도록 공백을 제거한 뒤 n-gram 추출
+        text = normalize_text(text).lower().replace(" ", "")
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                yield text[i:i + n]
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram in self._ngrams(text):
+            h = zlib.crc32(gram.encode("utf-8"))
+            # 상위 비트로 부호를 정해 해시 충돌로 인한 편향을 상쇄
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_many(self, texts):
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self.embed(t) for t in texts])
+
+
+# ======================== 의미 기반 캐시 ========================
+class SemanticCache:
+    # 질문 벡터를 행렬로 보관하고 코사인 유사도로 비슷한 질문의 답변을 재사용
+    def __init__(self, capacity=2000, threshold=0.92, context_threshold=0.9, embedder=None):
+        self.embedder = embedder or HashingEmbedder()
+        self.capacity = capacity
+        self.threshold = threshold
+        self.context_threshold = context_threshold
+
+        dim = self.embedder.dim
+        self._questions = np.zeros((capacity, dim), dtype=np.float32)
+        self._contexts = np.zeros((capacity, dim), dtype=np.float32)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._entries = [None] * capacity   # (질문 원문, 답변)
+        self._size = 0
+        self._dirty = 0
+        self._lock = threading.RLock()
+        self._counters = {"hits": 0, "misses": 0, "adds": 0, "evicted": 0}
+
+    # ---------- 조회 ----------
+    def lookup(self, question, context=""):
+        return self.lookup_many([question], context)[0]
+
+    def lookup_many(self, questions, context=""):
+        # 여러 질문을 한 번의 행렬 곱으로 검색, 결과는 (답변, 유사도) 또는 None
+        query = self.embedder.embed_many(questions)
+        context_vector = self.embedder.embed(context)
+
+        with self._lock:
+            n = self._size
+            if n == 0:
+                self._counters["misses"] += len(questions)
+                return [None] * len(questions)
+
+            context_scores = self._contexts[:n] @ context_vector
+            scores = query @ self._questions[:n].T
+            scores[:, context_scores < self.context_threshold] = -1.0
+
+            best = scores.argmax(axis=1)
+            now = time.time()
+            results = []
+            for row, idx in enumerate(best):
+                score = float(scores[row, idx])
+                if score >= self.threshold:
+                    self._last_used[idx] = now
+                    self._counters["hits"] += 1
+                    results.append((self._entries[idx][1], score))
+                else:
+                    self._counters["misses"] += 1
+                    results.append(None)
+            return results
+
+    # ---------- 추가/축출 ----------
+    def add(self, question, answer, context=""):
+        question_vector = self.embedder.embed(question)
+        context_vector = self.embedder.embed(context)
+
+        with self._lock:
+            if self._size < self.capacity:
+                idx = self._size
+                self._size += 1
+            else:
+                # 가장 오래 사용되지 않은 항목을 덮어씀
+                idx = int(self._last_used.argmin())
+                self._counters["evicted"] += 1
+
+            self._questions[idx] = question_vector
+            self._contexts[idx] = context_vector
+            self._last_used[idx] = time.time()
+            self._entries[idx] = (question, answer)
+            self._counters["adds"] += 1
+            self._dirty += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["size"] = self._size
+            counters["capacity"] = self.capacity
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        return counters
+
+    # ---------- 저장/불러오기 ----------
+    def save(self, path):
+        # 벡터는 .npz, 원문/답변은 .json으로 원자적 저장
+        with self._lock:
+            n = self._size
+            arrays = {
+                "questions": self._questions[:n].copy(),
+                "contexts": self._contexts[:n].copy(),
+                "last_used": self._last_used[:n].copy(),
+            }
+            entries = [list(e) for e in self._entries[:n]]
+            self._dirty = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_npz = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_npz, **arrays)
+        os.replace(tmp_npz, f"{path}.npz")
+
+        tmp_json = f"{path}.{os.getpid()}.tmp.json"
+        with open(tmp_json, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.embedder.dim, "entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp_json, f"{path}.json")
+
+    def save_if_dirty(self, path, min_changes=1):
+        if self._dirty >= min_changes:
+            self.save(path)
+
+    def load(self, path):
+        if not (os.path.exists(f"{path}.npz") and os.path.exists(f"{path}.json")):
+            return False
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("dim") != self.embedder.dim:
+            print(f"⚠️ 의미 캐시 차원이 달라 불러오지 않습니다: {meta.get('dim')} != {self.embedder.dim}")
+            return False
+
+        arrays = np.load(f"{path}.npz")
+        entries = meta.get("entries", [])
+        # 최근 사용 순으로 capacity 만큼만 복원
+        order = np.argsort(arrays["last_used"])[::-1][:self.capacity]
+        with self._lock:
+            n = len(order)
+            self._questions[:n] = arrays["questions"][order]
+            self._contexts[:n] = arrays["contexts"][order]
+            self._last_used[:n] = arrays["last_used"][order]
+            self._entries[:n] = [tuple(entries[i]) for i in order]
+            self._size = n
+            self._dirty = 0
+        return True
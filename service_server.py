@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import re
+
+import llm_comp
+from metrics import REGISTRY
+from scenario_schema import coerce_text, validate_scenario
+
+# ======================== 설정 ========================
+# Streamlit 화면과 분리해서 생성 기능(스크립트/추가 질문/카카오톡/랜덤 민원)만 HTTP로 제공하는 ASGI 서버
+# 실행: python service_server.py --port 8600 --workers 4   (UI 쪽은 LLM_SERVICE_URL=http://<host>:8600)
+#
+# 여러 프로세스/서버로 늘릴 때:
+# - 대화 기록은 세션 id로 이어지므로 HISTORY_BACKEND=sqlite를 공유 볼륨에 두거나, 세션별 고정 라우팅(sticky) 사용
+# - 중복 요청 합치기/동시 호출 제한/의미 캐시는 프로세스 단위 (LLM_MAX_IN_FLIGHT는 프로세스당 값)
+# - 랜덤 시나리오 풀(SCENARIO_POOL_PATH, SQLite)은 같은 파일을 쓰는 모든 프로세스가 공유 (보충은 한 프로세스만)
+SERVICE_TOKEN = os.getenv("LLM_SERVICE_TOKEN", "")
+MAX_BODY_BYTES = int(os.getenv("LLM_SERVICE_MAX_BODY", str(2 * 1024 * 1024)))
+# 시작할 때 모델 클라이언트/체인을 미리 만들어 첫 요청 지연을 없앰 (준비가 끝난 뒤 요청을 받음)
+WARMUP = os.getenv("LLM_WARMUP", "1") == "1"
+
+SESSION_PATH = re.compile(r"^/v1/sessions/([^/]+)(?:/(reset|cancel|source))?$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ======================== 요청/응답 ========================
+async def read_json(receive):
+    # 본문 크기 제한을 넘으면 413. 빈 본문은 빈 객체로 취급
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(499, "client disconnected")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        if not message.get("more_body"):
+            break
+    if not body:
+        return {}
+    try:
+        data = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise HTTPError(400, "invalid JSON body")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "JSON body must be an object")
+    return data
+
+
+async def send_body(send, status, body, content_type):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, data):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await send_body(send, status, body, "application/json; charset=utf-8")
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def send_events(receive, send, events):
+    # events: (이벤트 이름, 데이터)를 내보내는 비동기 제너레이터
+    # 클라이언트가 연결을 끊으면 스트리밍 태스크를 취소 → 구독 해제 → 아무도 보지 않는 생성은 유예 후 취소
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),   # 프록시(nginx)가 조각을 모아 두지 않도록
+        ],
+    })
+
+    async def pump():
+        try:
+            async for event, data in events:
+                await send({"type": "http.response.body", "body": sse_event(event, data), "more_body": True})
+        finally:
+            await events.aclose()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    stream_task = asyncio.ensure_future(pump())
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await asyncio.wait({stream_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not stream_task.done():
+            print("🔌 클라이언트 연결 끊김: 스트리밍 중단")
+            stream_task.cancel()
+    try:
+        await stream_task
+    except (asyncio.CancelledError, OSError):
+        pass
+
+
+def require_field(data, key):
+    value = coerce_text(data.get(key))
+    if not value:
+        raise HTTPError(400, f"'{key}' is required")
+    return value
+
+
+# ======================== 생성 스트림 ========================
+async def text_events(chunks):
+    # 조각마다 chunk 이벤트, 마지막에 done 이벤트 (status: ok/error/busy/timeout)
+    text = ""
+    async for chunk in chunks:
+        text += chunk
+        yield "chunk", {"text": chunk}
+    yield "done", {"status": llm_comp.response_status(text)}
+
+
+async def variant_events(chunks):
+    # 유형별 조각은 chunk {style, text}, 유형 하나가 끝나면 style_done {style, status}
+    texts = {}
+    statuses = {}
+    async for style, chunk in chunks:
+        if chunk is None:
+            statuses[style] = llm_comp.response_status(texts.get(style, ""))
+            yield "style_done", {"style": style, "status": statuses[style]}
+            continue
+        texts[style] = texts.get(style, "") + chunk
+        yield "chunk", {"style": style, "text": chunk}
+    failed = [status for status in statuses.values() if status != "ok"]
+    yield "done", {"status": failed[0] if failed else "ok", "styles": statuses}
+
+
+def script_events(data):
+    session_id = require_field(data, "session_id")
+    scenario, _ = validate_scenario(data)
+    if scenario is None:
+        raise HTTPError(400, "'name' and 'situation' are required")
+    return text_events(llm_comp.aget_script_response(
+        scenario["name"], scenario["situation"], scenario["emotion"],
+        regenerate=bool(data.get("regenerate")),
+        session_id=session_id,
+        consultant_name=coerce_text(data.get("consultant_name")),
+        extra_info=scenario["extra_info"],
+    ))
+
+
+def chat_events(data):
+    session_id = require_field(data, "session_id")
+    message = require_field(data, "message")
+    return text_events(llm_comp.aget_chatbot_response(
+        message, coerce_text(data.get("script_context")), session_id=session_id,
+    ))
+
+
+def kakao_events(data):
+    session_id = require_field(data, "session_id")
+    script_context = require_field(data, "script_context")
+    message_list = data.get("message_list") or []
+    if not isinstance(message_list, list):
+        raise HTTPError(400, "'message_list' must be a list")
+    if not data.get("variants"):
+        return text_events(llm_comp.aget_kakao_response(script_context, message_list, session_id=session_id))
+    styles = data.get("styles") or None
+    if styles is not None and (not isinstance(styles, list) or any(s not in llm_comp.KAKAO_STYLES for s in styles)):
+        raise HTTPError(400, f"'styles' must be a subset of {list(llm_comp.KAKAO_STYLES)}")
+    return variant_events(llm_comp.astream_kakao_variants(script_context, message_list, styles, session_id=session_id))
+
+
+STREAM_ROUTES = {
+    "/v1/script": script_events,
+    "/v1/chat": chat_events,
+    "/v1/kakao": kakao_events,
+}
+
+
+# ======================== 세션 ========================
+async def session_route(method, session_id, action, receive):
+    if method == "PUT" and action is None:
+        data = await read_json(receive)
+        conversation = data.get("conversation")
+        if not isinstance(conversation, dict):
+            raise HTTPError(400, "'conversation' must be an object")
+        llm_comp.load_session(session_id, conversation, coerce_text(data.get("source")) or None)
+        return {"session_id": session_id, "loaded": True}
+    if method == "DELETE" and action is None:
+        llm_comp.delete_session(session_id)
+        return {"session_id": session_id, "deleted": True}
+    if method == "POST" and action == "reset":
+        llm_comp.reset_session(session_id)
+        return {"session_id": session_id, "reset": True}
+    if method == "POST" and action == "cancel":
+        return {"session_id": session_id, "cancelled": llm_comp.cancel_session_generations(session_id)}
+    if method == "POST" and action == "source":
+        data = await read_json(receive)
+        llm_comp.bind_session_source(session_id, require_field(data, "source"))
+        return {"session_id": session_id, "bound": True}
+    raise HTTPError(405, "method not allowed")
+
+
+# ======================== ASGI 앱 ========================
+def authorized(scope):
+    if not SERVICE_TOKEN:
+        return True
+    headers = dict(scope.get("headers") or [])
+    expected = f"Bearer {SERVICE_TOKEN}".encode()
+    return hmac.compare_digest(headers.get(b"authorization", b""), expected)
+
+
+def health():
+    return {
+        "status": "ok",
+        "backend": llm_comp.LLM_BACKEND,
+        "limiter": llm_comp.llm_limiter.stats(),
+        "inflight": llm_comp.inflight.stats(),
+        "sessions": llm_comp.store.stats(),
+    }
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            print(f"🚀 생성 서버 시작 (pid {os.getpid()}, backend={llm_comp.LLM_BACKEND})")
+            if WARMUP:
+                await asyncio.to_thread(llm_comp.warm_up)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            llm_comp.semantic_cache.save_if_dirty(llm_comp.SEMANTIC_CACHE_PATH)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    method = scope["method"]
+    path = scope["path"].rstrip("/") or "/"
+    try:
+        if path == "/healthz" and method == "GET":
+            await send_json(send, 200, health())
+            return
+        if not authorized(scope):
+            raise HTTPError(401, "unauthorized")
+        if path == "/metrics" and method == "GET":
+            await send_body(send, 200, REGISTRY.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+            return
+
+        if path in STREAM_ROUTES:
+            if method != "POST":
+                raise HTTPError(405, "method not allowed")
+            # 입력 검증은 스트리밍 시작 전에 끝내서 잘못된 요청은 400으로 응답
+            events = STREAM_ROUTES[path](await read_json(receive))
+            await send_events(receive, send, events)
+            return
+
+        if path == "/v1/scenario" and method == "POST":
+            # 풀이 비어 있으면 실시간 생성(동기 호출)이므로 이벤트 루프를 막지 않도록 스레드에서 실행
+            # session_id(선택)는 실시간 생성 때 동시 호출 제한기의 대기열 키
+            session_id = coerce_text((await read_json(receive)).get("session_id")) or None
+            await send_json(send, 200, await asyncio.to_thread(llm_comp.get_random_customer_info, session_id))
+            return
+        if path == "/v1/kakao/styles" and method == "GET":
+            await send_json(send, 200, {style: title for style, (title, _) in llm_comp.KAKAO_STYLES.items()})
+            return
+
+        match = SESSION_PATH.match(path)
+        if match:
+            await send_json(send, 200, await session_route(method, match.group(1), match.group(2), receive))
+            return
+        raise HTTPError(404, "not found")
+
+    except HTTPError as e:
+        if e.status != 499:
+            await send_json(send, e.status, {"error": e.message})
+    except Exception as e:
+        print(f"🔥 서버 예외 ({method} {path}):", e)
+        await send_json(send, 500, {"error": "internal error"})
+
+
+# 사용법: python service_server.py --host 0.0.0.0 --port 8600 --workers 4
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="민원 응대 생성 서버 (ASGI, SSE 스트리밍)")
+    parser.add_argument("--host", default=os.getenv("LLM_SERVICE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("LLM_SERVICE_PORT", "8600")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("LLM_SERVICE_WORKERS", "1")),
+                        help="작업 프로세스 수 (2 이상이면 대화 기록 저장소를 공유해야 함)")
+    args = parser.parse_args()
+    uvicorn.run("service_server:app", host=args.host, port=args.port, workers=args.workers,
+                timeout_keep_alive=30)
+
+
+if __name__ == "__main__":
+    main()
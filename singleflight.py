@@ -0,0 +1,219 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+
+# ======================== 진행 중인 호출 ========================
+class Flight:
+    # 생산자 하나가 흘려보내는 조각을 모아 두고, 나중에 붙은 구독자에게도 처음부터 다시 전달
+    def __init__(self, key, group=None, cancel=None):
+        self.key = key
+        self.group = group
+        self.chunks = []
+        self.done = False
+        self.subscribers = 0
+        self.started_at = time.time()
+        self.task = None
+        self.cancel = cancel          # cancel(reason): 생산자에게 중단을 요청하는 함수
+        self.cancel_reason = None
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        self._wake(waiters)
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        self._wake(waiters)
+
+    @staticmethod
+    def _wake(waiters):
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass   # 이미 닫힌 이벤트 루프
+
+    def subscribe(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                pending = self.chunks[index:]
+                done = self.done
+            index += len(pending)
+            for chunk in pending:
+                yield chunk
+            if done:
+                return
+
+    async def asubscribe(self):
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            event = asyncio.Event()
+            waiter = (loop, event)
+            with self._cond:
+                pending = self.chunks[index:]
+                done = self.done
+                if not pending and not done:
+                    self._async_waiters.add(waiter)
+            if not pending and not done:
+                try:
+                    await event.wait()
+                finally:
+                    with self._cond:
+                        self._async_waiters.discard(waiter)
+                continue
+            index += len(pending)
+            for chunk in pending:
+                yield chunk
+            if done:
+                return
+
+
+# ======================== 중복 요청 합치기 ========================
+# 같은 키(세션 + 정규화한 입력 해시)의 요청이 진행 중이면 새로 호출하지 않고 그 호출에 합류
+# 실제 호출은 요청한 쪽과 분리된 스레드/태스크에서 실행되므로, Streamlit rerun으로
+# 첫 요청의 화면 출력이 중단돼도 LLM 호출과 대화 기록 저장은 정확히 한 번만 일어남
+# 구독자가 모두 떠난 호출은 grace초 안에 아무도 다시 합류하지 않으면 취소 (토큰/연결 낭비 방지)
+class SingleFlight:
+    def __init__(self, name="llm", grace=3.0):
+        self.name = name
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.started = 0
+        self.coalesced = 0
+        self.cancelled = defaultdict(int)
+
+    def _join(self, key, group=None, cancel=None):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not flight.done and flight.cancel_reason is None:
+                self.coalesced += 1
+                flight.subscribers += 1
+                return flight, False
+            flight = Flight(key, group, cancel)
+            flight.subscribers = 1
+            self._flights[key] = flight
+            self.started += 1
+            return flight, True
+
+    def _leave(self, flight):
+        with self._lock:
+            flight.subscribers -= 1
+            abandoned = flight.subscribers == 0 and not flight.done
+        if abandoned and flight.cancel is not None:
+            timer = threading.Timer(self.grace, self._cancel_if_abandoned, args=(flight,))
+            timer.daemon = True
+            timer.start()
+
+    def _cancel_if_abandoned(self, flight):
+        with self._lock:
+            if flight.subscribers or flight.done:
+                return
+        self._cancel(flight, "abandoned")
+
+    def _cancel(self, flight, reason):
+        with self._lock:
+            if flight.done or flight.cancel_reason is not None:
+                return False
+            flight.cancel_reason = reason
+            self.cancelled[reason] += 1
+            # 취소된 호출에는 새 요청이 합류하지 않도록 바로 목록에서 뺌
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        print(f"🛑 [{self.name}] 생성 취소 ({reason}, 구독자 {flight.subscribers}명)")
+        flight.cancel(reason)
+        if isinstance(flight.task, asyncio.Future):
+            # 비동기 생산자는 대기 중인 await도 바로 깨우도록 태스크 자체를 취소
+            try:
+                flight.task.get_loop().call_soon_threadsafe(flight.task.cancel)
+            except RuntimeError:
+                pass
+        return True
+
+    def cancel_group(self, group, reason="session"):
+        # 세션 전환/로그아웃 등으로 더는 필요 없는 호출을 즉시 취소
+        with self._lock:
+            flights = [f for f in self._flights.values() if f.group == group and f.cancel is not None]
+        return sum(1 for flight in flights if self._cancel(flight, reason))
+
+    def _release(self, flight):
+        flight.finish()
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    # ---------- 동기 ----------
+    def _run(self, flight, produce):
+        try:
+            for chunk in produce():
+                flight.publish(chunk)
+        except Exception as e:
+            print(f"🔥 [{self.name}] 생산자 예외:", e)
+        finally:
+            self._release(flight)
+
+    def stream(self, key, produce, group=None, cancel=None):
+        # produce: 조각을 내보내는 제너레이터 함수. 새 요청일 때만 생산자 스레드에서 실행
+        # group: 함께 취소할 묶음(세션), cancel(reason): 생산자 중단 요청 함수
+        # 구독 등록/생산자 시작은 첫 조각을 요청할 때 함 (만들기만 하고 읽지 않은 제너레이터는
+        # finally가 실행되지 않아 구독자로 남고, 아무도 보지 않는 호출이 취소되지 않음)
+        flight, leader = self._join(key, group, cancel)
+        try:
+            if leader:
+                flight.task = threading.Thread(target=self._run, args=(flight, produce), daemon=True,
+                                               name=f"singleflight-{self.name}")
+                flight.task.start()
+            else:
+                print(f"🔗 [{self.name}] 진행 중인 동일 요청에 합류 (구독자 {flight.subscribers}명)")
+            yield from flight.subscribe()
+        finally:
+            self._leave(flight)
+
+    # ---------- 비동기 ----------
+    async def _arun(self, flight, aproduce):
+        try:
+            async for chunk in aproduce():
+                flight.publish(chunk)
+        except Exception as e:
+            print(f"🔥 [{self.name}] 생산자 예외:", e)
+        finally:
+            self._release(flight)
+
+    async def astream(self, key, aproduce, group=None, cancel=None):
+        # aproduce: 비동기 제너레이터 함수. 새 요청일 때만 현재 이벤트 루프의 태스크로 실행
+        # 동기 버전과 같이 구독 등록/생산자 시작은 첫 조각을 요청할 때 함
+        flight, leader = self._join(key, group, cancel)
+        try:
+            if leader:
+                flight.task = asyncio.ensure_future(self._arun(flight, aproduce))
+            else:
+                print(f"🔗 [{self.name}] 진행 중인 동일 요청에 합류 (구독자 {flight.subscribers}명)")
+            async for chunk in flight.asubscribe():
+                yield chunk
+        finally:
+            self._leave(flight)
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._flights)
+            subscribers = sum(f.subscribers for f in self._flights.values())
+        return {
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "cancelled": dict(self.cancelled),
+            "in_flight": in_flight,
+            "subscribers": subscribers,
+        }
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# 저장소 루트의 모듈(history_store, job_queue, llm_comp ...)을 그대로 가져오도록 경로 추가
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 가짜 모델 + 임시 디렉터리 (OpenAI 호출/운영 데이터 없이 실행). llm_comp import 전에 설정 (loadtest.py와 같은 방식)
+WORK_DIR = tempfile.mkdtemp(prefix="complaint-tests-")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("OPENAI_API_KEY", "tests")
+os.environ.setdefault("LLM_METRICS_LOG", "off")
+os.environ.setdefault("SCRIPT_CACHE_DIR", os.path.join(WORK_DIR, "cache", "scripts"))
+os.environ.setdefault("SEMANTIC_CACHE_PATH", os.path.join(WORK_DIR, "cache", "semantic"))
+os.environ.setdefault("SCENARIO_POOL_PATH", os.path.join(WORK_DIR, "cache", "scenario_pool.sqlite"))
+os.environ.setdefault("HISTORY_ROOT", os.path.join(WORK_DIR, "history"))
+os.environ.setdefault("HISTORY_INDEX_DIR", os.path.join(WORK_DIR, "index"))
+os.environ.setdefault("GENERATION_JOBS_PATH", os.path.join(WORK_DIR, "generation_jobs.sqlite"))
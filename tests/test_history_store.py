@@ -0,0 +1,69 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from history_store import BoundedChatMessageHistory
+
+
+def live_session(turns, answer_chars=400):
+    # 실제 세션 순서: 민원 정보(human) → 스크립트(ai) → 추가 질문/답변 반복
+    messages = [
+        HumanMessage(content="- 민원인 이름: 김민지\n- 민원 내용: 입원비 지급 지연"),
+        AIMessage(content="[스크립트] " + "공감 멘트 " * 50),
+    ]
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"질문 {i}"))
+        messages.append(AIMessage(content=f"답변 {i} " + "가" * answer_chars))
+    return messages
+
+
+def test_trim_keeps_script_and_drops_whole_turns():
+    messages = live_session(6)
+    history = BoundedChatMessageHistory(messages=messages[:2], max_bytes=4000)
+    for message in messages[2:]:
+        history.add_message(message)
+
+    kept = history.messages
+    assert history.trimmed > 0
+    assert history.size() <= 4000
+    # 민원 정보와 스크립트는 그대로 앞에 남음
+    assert kept[0].content == messages[0].content
+    assert kept[1].content == messages[1].content
+    # 이후는 질문/답변 쌍 단위로 남고, 최신 턴이 마지막
+    rest = kept[2:]
+    assert len(rest) % 2 == 0
+    assert [m.type for m in rest] == ["human", "ai"] * (len(rest) // 2)
+    assert rest[-1].content.startswith("답변 5")
+
+
+def test_trim_keeps_loaded_script_first():
+    # 불러온 대화는 스크립트(ai)가 첫 메시지
+    messages = live_session(6)[1:]
+    history = BoundedChatMessageHistory(messages=messages, max_bytes=3000)
+    history.trim()
+
+    kept = history.messages
+    assert kept[0].content == messages[0].content
+    assert [m.type for m in kept[1:]] == ["human", "ai"] * ((len(kept) - 1) // 2)
+
+
+def test_trim_never_drops_latest_turn():
+    messages = live_session(1, answer_chars=5000)
+    history = BoundedChatMessageHistory(messages=messages, max_bytes=100)
+    history.trim()
+    assert [m.content for m in history.messages] == [m.content for m in messages]
+
+
+def test_sqlite_prune_counts_sessions_not_messages(tmp_path):
+    from history_store import SQLiteHistoryBackend
+
+    backend = SQLiteHistoryBackend(str(tmp_path / "history.sqlite"), idle_ttl=3600)
+    for session_id in ("a", "b"):
+        backend.append_messages(session_id, live_session(2))   # 세션당 메시지 6개
+    backend.append_messages("fresh", live_session(1))
+    conn = backend._connect()
+    conn.execute("UPDATE chat_messages SET created_at = 0 WHERE session_id IN ('a', 'b')")
+
+    assert backend.prune_idle() == 2
+    stats = backend.stats()
+    assert stats["pruned_sessions"] == 2
+    assert stats["pruned_messages"] == 12
+    assert stats["sessions"] == 1
@@ -0,0 +1,106 @@
+import time
+
+from job_queue import JobQueue
+
+
+def finished_runner(job):
+    yield f"{job['kind']} 결과"
+    return "ok"
+
+
+def slow_runner(job):
+    text = ""
+    for i in range(300):
+        time.sleep(0.01)
+        text += f"{i} "
+        yield text
+    return "ok"
+
+
+def wait_state(queue, job_id, state, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if queue.get(job_id)["state"] == state:
+            return
+        time.sleep(0.02)
+    raise AssertionError(f"작업이 {state} 상태가 되지 않음: {job_id}")
+
+
+def wait_done(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["state"] in ("done", "cancelled"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"작업이 끝나지 않음: {job_id}")
+
+
+def test_reset_discards_finished_unattached_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), finished_runner, workers=1, poll_interval=0.05)
+    queue.start()
+    job_id = queue.submit("script", {"name": "김민지", "session_id": "s1"}, "owner", "s1")
+    assert wait_done(queue, job_id)["state"] == "done"
+    assert [job["id"] for job in queue.unattached("owner", session_id="s1", kinds=("script",))] == [job_id]
+
+    # 새 민원(reset): 끝났지만 화면에 붙이지 않은 스크립트는 다시 이어 붙지 않아야 함
+    queue.cancel_session("s1")
+    assert queue.unattached("owner", kinds=("script",)) == []
+    assert queue.mark_attached(job_id) is False
+
+
+def test_reset_keeps_finished_job_of_saved_case(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), finished_runner, workers=1, poll_interval=0.05)
+    queue.start()
+    job_id = queue.submit("chat", {"message": "질문", "session_id": "s1"}, "owner", "s1", case_key="김민지_1")
+    wait_done(queue, job_id)
+
+    # 저장된 상담 건의 결과는 그 대화를 다시 불러올 때 붙임
+    queue.cancel_session("s1")
+    assert [job["id"] for job in queue.unattached("owner", case_key="김민지_1")] == [job_id]
+
+
+def test_submit_dedupes_same_request_until_attached(tmp_path):
+    # 워커를 시작하지 않아 작업은 대기 상태로 남음
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), finished_runner, workers=1)
+    payload = {"name": "김민지", "situation": "지급 지연", "session_id": "s1"}
+    first = queue.submit("script", payload, "owner", "s1")
+    assert queue.submit("script", dict(reversed(list(payload.items()))), "owner", "s1") == first
+    # 다른 세션/다른 요청은 따로 작업
+    assert queue.submit("script", payload, "owner", "s2") != first
+    assert queue.submit("script", {**payload, "regenerate": True}, "owner", "s1") != first
+
+    # 붙인 뒤(또는 취소 뒤) 같은 요청은 새 작업
+    queue.mark_attached(first)
+    assert queue.submit("script", payload, "owner", "s1") != first
+
+
+def test_cancel_session_stops_job_running_in_other_process(tmp_path):
+    # 같은 작업 파일을 쓰는 두 프로세스: A(화면)가 넣은 작업을 B의 워커가 실행 중일 때 A에서 새 민원
+    path = str(tmp_path / "jobs.sqlite")
+    ui = JobQueue(path, slow_runner, shared=True)
+    worker = JobQueue(path, slow_runner, workers=1, poll_interval=0.05, progress_interval=0.02, shared=True)
+    worker.start()
+    job_id = ui.submit("script", {"name": "김민지", "session_id": "s1"}, "owner", "s1")
+    wait_state(ui, job_id, "running")
+
+    ui.cancel_session("s1")
+    job = wait_done(ui, job_id)
+    assert (job["state"], job["status"]) == ("cancelled", "cancelled")
+    assert len(job["progress"].split()) < 300
+    assert ui.unattached("owner", session_id="s1") == []
+
+
+def test_unshared_queue_runs_only_its_own_jobs(tmp_path):
+    # 메모리 대화 기록이면 다른 프로세스가 넣은 작업을 실행하면 안 됨
+    path = str(tmp_path / "jobs.sqlite")
+    ui = JobQueue(path, finished_runner, workers=1, poll_interval=0.05)
+    other = JobQueue(path, finished_runner, workers=1, poll_interval=0.05)
+    other.start()
+    job_id = ui.submit("chat", {"message": "질문", "session_id": "s1"}, "owner", "s1")
+    time.sleep(0.3)
+    assert ui.get(job_id)["state"] == "queued"
+
+    ui.start()
+    job = wait_done(ui, job_id)
+    assert job["state"] == "done"
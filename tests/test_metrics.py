@@ -0,0 +1,16 @@
+import time
+
+from metrics import REGISTRY, record_stream, recent_stream_metrics
+
+
+def test_cache_hits_are_labelled_and_kept_out_of_queue_wait():
+    started_at = time.perf_counter()
+    record_stream("test_stream", started_at, started_at, 10, queue_wait=0.5)
+    record_stream("test_stream", started_at, started_at, 10, cached=True)
+    record_stream("test_stream", started_at, started_at, 10, cached=True)
+
+    text = REGISTRY.render()
+    assert 'llm_queue_wait_seconds_count{call_type="test_stream"} 1' in text
+    assert 'llm_stream_requests_total{cache="hit",call_type="test_stream",status="ok"} 2' in text
+    assert 'llm_stream_requests_total{cache="miss",call_type="test_stream",status="ok"} 1' in text
+    assert len(recent_stream_metrics("test_stream", include_cached=False)) == 1
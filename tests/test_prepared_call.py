@@ -0,0 +1,23 @@
+import llm_comp
+
+
+def test_cache_hits_with_different_requests_do_not_share_a_flight():
+    first = llm_comp.PreparedCall("chatbot", "s1", cached="답변 A", request={"input": "질문 A"})
+    second = llm_comp.PreparedCall("chatbot", "s1", cached="답변 B", request={"input": "질문 B"})
+    same = llm_comp.PreparedCall("chatbot", "s1", cached="답변 A", request={"input": "질문  A"})
+
+    assert first.flight_key != second.flight_key
+    assert first.flight_key == same.flight_key
+
+
+def test_concurrent_cached_followups_get_their_own_answers():
+    session_id = "test-cached-followups"
+    context = "스크립트 본문"
+    llm_comp.semantic_cache.add("환불 기간은 얼마나 걸리나요?", "환불 답변", context=context)
+    llm_comp.semantic_cache.add("담당자를 바꿔 달라고 하면요?", "담당자 답변", context=context)
+
+    refund = llm_comp.get_chatbot_response("환불 기간은 얼마나 걸리나요?", context, session_id=session_id)
+    manager = llm_comp.get_chatbot_response("담당자를 바꿔 달라고 하면요?", context, session_id=session_id)
+
+    assert "".join(refund) == "환불 답변"
+    assert "".join(manager) == "담당자 답변"
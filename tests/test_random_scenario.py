@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+import llm_comp
+from concurrency import LimiterQueueFull
+
+
+def test_live_scenario_waits_in_callers_lane(monkeypatch):
+    keys = []
+    slot = llm_comp.llm_limiter.slot
+
+    @contextmanager
+    def recording_slot(session_key, timeout=None):
+        keys.append(session_key)
+        with slot(session_key, timeout) as waited:
+            yield waited
+
+    monkeypatch.setattr(llm_comp.scenario_pool, "take", lambda: None)
+    monkeypatch.setattr(llm_comp.llm_limiter, "slot", recording_slot)
+    info = llm_comp.get_random_customer_info("trainee-1")
+
+    assert info.get("name")
+    assert keys == ["trainee-1"]
+
+
+def test_live_scenario_returns_empty_when_queue_is_full(monkeypatch):
+    @contextmanager
+    def full_slot(session_key, timeout=None):
+        raise LimiterQueueFull("LLM 대기열이 가득 찼습니다 (0건)")
+        yield
+
+    monkeypatch.setattr(llm_comp.scenario_pool, "take", lambda: None)
+    monkeypatch.setattr(llm_comp.llm_limiter, "slot", full_slot)
+
+    assert llm_comp.get_random_customer_info("trainee-1") == {}
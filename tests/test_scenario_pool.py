@@ -0,0 +1,47 @@
+import itertools
+import threading
+
+from scenario_pool import ScenarioPool, scenario_fingerprint
+
+counter = itertools.count()
+
+
+def generate_batch(n):
+    return [{"name": f"고객{i}", "situation": f"민원 {i}", "emotion": 3, "extra_info": ""}
+            for i in (next(counter) for _ in range(n))]
+
+
+def test_processes_sharing_pool_never_serve_same_scenario(tmp_path):
+    # 서버 워커 두 개가 같은 풀 파일을 씀
+    path = str(tmp_path / "scenario_pool.sqlite")
+    first = ScenarioPool(generate_batch, path, capacity=20, low_water=5, batch_size=5)
+    second = ScenarioPool(generate_batch, path, capacity=20, low_water=5, batch_size=5)
+    first.add(generate_batch(20))
+
+    served = []
+    def take_many(pool):
+        for _ in range(10):
+            scenario = pool.take()
+            if scenario is not None:
+                served.append(scenario_fingerprint(scenario))
+    threads = [threading.Thread(target=take_many, args=(pool,)) for pool in (first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(served) == 20
+    assert len(set(served)) == 20
+    assert first.stats()["served_tracked"] == second.stats()["served_tracked"] == 20
+
+
+def test_served_scenario_is_not_restocked_by_other_process(tmp_path):
+    path = str(tmp_path / "scenario_pool.sqlite")
+    first = ScenarioPool(generate_batch, path, capacity=5, low_water=0)
+    second = ScenarioPool(generate_batch, path, capacity=5, low_water=0)
+    scenario = generate_batch(1)[0]
+    first.mark_served_live(scenario)
+
+    # 다른 프로세스가 만든 배치에 같은 시나리오가 섞여 있어도 다시 풀에 넣지 않음
+    assert second.add([scenario]) == 0
+    assert second.stats()["duplicates"] == 1
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from singleflight import SingleFlight
+
+
+def slow_producer(chunks, started):
+    def produce():
+        started.set()
+        for chunk in chunks:
+            time.sleep(0.05)
+            yield chunk
+    return produce
+
+
+def test_unconsumed_stream_does_not_register_or_start():
+    flights = SingleFlight("test", grace=0.05)
+    started = threading.Event()
+    stream = flights.stream("key", slow_producer(["a"], started))
+
+    assert flights.stats()["subscribers"] == 0
+    assert flights.stats()["started"] == 0
+    del stream
+    assert not started.wait(0.2)
+
+
+def test_abandoned_stream_is_cancelled_after_grace():
+    flights = SingleFlight("test", grace=0.05)
+    started = threading.Event()
+    cancelled = []
+    stream = flights.stream("key", slow_producer(["a", "b", "c", "d"], started), cancel=cancelled.append)
+
+    assert next(stream) == "a"
+    assert flights.stats()["subscribers"] == 1
+    stream.close()
+    time.sleep(0.2)
+    assert cancelled == ["abandoned"]
+
+
+def test_concurrent_consumers_share_one_producer():
+    flights = SingleFlight("test", grace=0.05)
+    started = threading.Event()
+    produce = slow_producer(["a", "b"], started)
+    first = flights.stream("key", produce)
+    second = flights.stream("key", produce)
+
+    assert next(first) == "a"
+    assert list(second) == ["a", "b"]
+    assert list(first) == ["b"]
+    assert flights.stats()["started"] == 1
+    assert flights.stats()["coalesced"] == 1
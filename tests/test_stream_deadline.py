@@ -0,0 +1,51 @@
+import threading
+import time
+
+import llm_comp
+
+
+class StalledRunnable:
+    # 첫 토큰을 보내기 전에 멈춘 LLM 호출 흉내
+    def __init__(self, stall):
+        self.stall = stall
+
+    def stream(self, inputs, config=None):
+        time.sleep(self.stall)
+        yield "늦은 응답"
+
+
+def stalled_call(deadline, stall=5.0):
+    return llm_comp.PreparedCall("script", "test-stall", runnable=StalledRunnable(stall),
+                                 inputs={"q": "stall"}, deadline=deadline)
+
+
+def test_sync_stream_stops_at_deadline_before_first_token():
+    started_at = time.perf_counter()
+    chunks = list(llm_comp.stream_response(stalled_call(deadline=0.5)))
+    elapsed = time.perf_counter() - started_at
+
+    assert elapsed < 1.5
+    assert chunks == [llm_comp.TIMEOUT_NOTICE]
+
+
+def test_sync_stream_stops_on_cancel_before_first_token():
+    call = stalled_call(deadline=30)
+    threading.Timer(0.3, call.cancel, args=("session",)).start()
+    started_at = time.perf_counter()
+    chunks = list(llm_comp.stream_response(call))
+
+    assert time.perf_counter() - started_at < 1.5
+    assert chunks == []
+    assert call.cancel_reason == "session"
+
+
+def test_openai_client_does_not_retry_inside_the_sdk(monkeypatch):
+    import model_router
+
+    monkeypatch.setattr(model_router, "LLM_BACKEND", "openai")
+    model_router.get_chat_model.cache_clear()
+    try:
+        client = model_router.get_chat_model("gpt-4.1-mini", None, None, 1.0)
+        assert client.max_retries == 0
+    finally:
+        model_router.get_chat_model.cache_clear()